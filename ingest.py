@@ -0,0 +1,202 @@
+"""
+Build or refresh the vector store and keyword index from a directory of documents.
+
+Only files added or modified since the last run are processed; chunks that
+modified files no longer contain and chunks of removed files are deleted. Example:
+
+    python ingest.py --source ./docs/raw --persist-directory ./data/chromadb --collection aiaa_docs
+"""
+import os
+import argparse
+import logging
+from itertools import islice
+from typing import Any, Dict, List
+
+from src.ingestion.chunker import TextChunker
+from src.ingestion.manifest import IngestionManifest
+from src.ingestion.pipeline import IngestionPipeline
+from src.generation.registry import ResourceRegistry, keyword_index_path
+
+logger = logging.getLogger(__name__)
+
+
+def _batches(items: List[str], size: int):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def ingest(source_dir: str,
+           persist_directory: str = "./data/chromadb",
+           collection_name: str = "aiaa_docs",
+           manifest_path: str = None,
+           pipeline: IngestionPipeline = None,
+           recursive: bool = True,
+           full: bool = False,
+           batch_size: int = 100,
+           embedding_cache_dir: str = None,
+           registry: ResourceRegistry = None,
+           backend: str = "chroma",
+           backend_options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Bring a collection up to date with the files under source_dir.
+
+    :param manifest_path: Where the file manifest is kept, defaults to a file next to the Chroma files.
+    :param pipeline: Loads, cleans and chunks files, defaults to an IngestionPipeline.
+    :param full: Drop the collection and the manifest and ingest everything again.
+    :param backend: Vector store backend, "chroma" or "local".
+    :return: Counts of added, modified, removed and unchanged files and of added,
+        kept (already stored) and deleted chunks.
+    """
+    registry = registry if registry is not None else ResourceRegistry()
+    pipeline = pipeline if pipeline is not None else IngestionPipeline()
+    manifest_path = manifest_path or os.path.join(persist_directory, f"{collection_name}.manifest.json")
+
+    store_options = dict(embedding_cache_dir=embedding_cache_dir,
+                         backend=backend,
+                         backend_options=backend_options)
+    vector_store = registry.vector_store(persist_directory, collection_name, **store_options)
+    # Loading the retriever registers its keyword index as a vector store listener,
+    # so the deletions and additions below update the index incrementally
+    retriever = registry.hybrid_retriever(persist_directory, collection_name, **store_options)
+
+    manifest = IngestionManifest(manifest_path)
+    if full:
+        vector_store._reset_collection()
+        manifest.clear()
+
+    source_dir = os.path.abspath(source_dir)
+    changes = manifest.compare(pipeline.loader.list_directory(source_dir, recursive))
+    logger.info(f"{len(changes.added)} added, {len(changes.modified)} modified, "
+                f"{len(changes.removed)} removed, {len(changes.unchanged)} unchanged files.")
+
+    summary = {
+        "added_files": len(changes.added),
+        "modified_files": len(changes.modified),
+        "removed_files": len(changes.removed),
+        "unchanged_files": len(changes.unchanged),
+        "deleted_chunks": 0,
+        "added_chunks": 0,
+        "kept_chunks": 0,
+        "failed_chunks": 0
+    }
+
+    if changes.changed or changes.removed:
+        for file_paths in _batches(changes.removed, 100):
+            summary["deleted_chunks"] += vector_store.delete_where({"file_path": {"$in": file_paths}})
+
+        # Describe files before reading them so edits made meanwhile show up next run
+        entries = {file_path: manifest.describe(file_path) for file_path in changes.changed}
+
+        if changes.changed:
+            # Chunk ids are content-derived: chunks a modified file still contains
+            # are kept without re-embedding, the ones it lost are deleted afterwards
+            produced = set()
+
+            def track(chunks):
+                for chunk in chunks:
+                    produced.add(chunk.chunk_id)
+                    yield chunk
+
+            result = vector_store.add_documents(track(pipeline.iter_chunks(changes.changed)),
+                                                batch_size=batch_size)
+            summary["added_chunks"] = result["added"] - result["skipped"]
+            summary["kept_chunks"] = result["skipped"]
+            summary["failed_chunks"] = result["failed"]
+
+            # Also covers files new to the manifest, in case a failed run left chunks behind
+            for file_paths in _batches(changes.changed, 100):
+                stale = [chunk_id for chunk_id in vector_store.get_ids({"file_path": {"$in": file_paths}})
+                         if chunk_id not in produced]
+                summary["deleted_chunks"] += vector_store.delete_documents(stale)
+
+        for file_path in changes.removed:
+            manifest.forget(file_path)
+        # After a failed batch the files are left out, so the next run processes them again
+        if summary["failed_chunks"] == 0:
+            for file_path, entry in entries.items():
+                manifest.record(file_path, entry)
+
+        retriever.save_index(keyword_index_path(persist_directory, collection_name),
+                             vector_store.content_version())
+
+    # Saved even without changes, to keep refreshed mtimes of touched files
+    manifest.save()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest documents into the academic tutor's index.")
+    parser.add_argument("--source", default="./docs/raw", help="Directory of documents to ingest.")
+    parser.add_argument("--persist-directory", default="./data/chromadb")
+    parser.add_argument("--collection", default="aiaa_docs")
+    parser.add_argument("--manifest", default=None, help="Manifest file, defaults to one next to the Chroma files.")
+    parser.add_argument("--embedding-cache-dir", default="./data/embedding_cache")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "local"],
+                        help="Vector store backend; local keeps memory-mapped files searched in process.")
+    parser.add_argument("--index", default="exact", choices=["exact", "ivf"],
+                        help="Search index of the local backend.")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--min-chunk-size", type=int, default=100)
+    parser.add_argument("--size-unit", default="chars", choices=["chars", "tokens"],
+                        help="Measure chunk sizes in characters or in embedding model tokens.")
+    parser.add_argument("--chunk-method", default="sliding_window",
+                        choices=["sliding_window", "paragraph_boundary", "semantic"])
+    parser.add_argument("--no-preprocess", action="store_true", help="Skip text cleaning before chunking.")
+    parser.add_argument("--no-recursive", action="store_true", help="Only ingest the top level of --source.")
+    parser.add_argument("--workers", type=int, default=4, help="File reader threads.")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Processes cleaning and chunking documents (0 uses a thread).")
+    parser.add_argument("--process-chunksize", type=int, default=4,
+                        help="Documents sent to a worker process per task.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Chunks embedded per batch.")
+    parser.add_argument("--full", action="store_true", help="Rebuild the collection from scratch.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    registry = ResourceRegistry()
+    # Semantic chunking embeds sentences with the vector store's model and stores the pooled vectors
+    embedding_model = None
+    if args.chunk_method == "semantic":
+        embedding_model = registry.embedding_model(cache_dir=args.embedding_cache_dir)
+    # Token sizes are counted with the tokenizer of the model that embeds the chunks
+    tokenizer = None
+    if args.size_unit == "tokens":
+        tokenizer = registry.embedding_model(cache_dir=args.embedding_cache_dir).tokenizer
+
+    pipeline = IngestionPipeline(chunker=TextChunker(chunk_size=args.chunk_size,
+                                                     overlap=args.overlap,
+                                                     min_chunk_size=args.min_chunk_size,
+                                                     embedding_model=embedding_model,
+                                                     size_unit=args.size_unit,
+                                                     tokenizer=tokenizer),
+                                 chunk_method=args.chunk_method,
+                                 preprocess=not args.no_preprocess,
+                                 num_workers=args.workers,
+                                 num_processes=args.processes,
+                                 process_chunksize=args.process_chunksize,
+                                 ordered=True)
+
+    summary = ingest(args.source,
+                     persist_directory=args.persist_directory,
+                     collection_name=args.collection,
+                     manifest_path=args.manifest,
+                     pipeline=pipeline,
+                     recursive=not args.no_recursive,
+                     full=args.full,
+                     batch_size=args.batch_size,
+                     embedding_cache_dir=args.embedding_cache_dir,
+                     registry=registry,
+                     backend=args.backend,
+                     backend_options={"index": args.index} if args.backend == "local" else None)
+
+    print(f"Files: {summary['added_files']} added, {summary['modified_files']} modified, "
+          f"{summary['removed_files']} removed, {summary['unchanged_files']} unchanged.")
+    print(f"Chunks: {summary['added_chunks']} added, {summary['kept_chunks']} kept, "
+          f"{summary['deleted_chunks']} deleted, {summary['failed_chunks']} failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
 import streamlit as st
 from src.generation.rag_chain import RAGChain
+from src.generation.registry import default_registry
 
 st.title("Hello, Streamlit!")
 
 if st.session_state.get("rag_chain") is None:
     st.session_state.rag_chain = RAGChain(persist_directory="./data/chromadb",
-                                      collection_name="aiaa_docs",)
+                                      collection_name="aiaa_docs",
+                                      embedding_cache_dir="./data/embedding_cache",
+                                      registry=default_registry,
+                                      answer_cache=True,
+                                      top_k=8,
+                                      context_max_tokens=1024)
 
 def response_generator(query):
-    response = st.session_state.rag_chain.ask_hybrid(query)
-    yield response.answer
+    response = st.session_state.rag_chain.ask_hybrid_stream(query)
+    yield from response.answer_stream
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -1,33 +1,25 @@
-from src.ingestion.document import DocumentLoader
 from src.ingestion.chunker import TextChunker
 from src.ingestion.embedding import EmbeddingModel
+from src.ingestion.pipeline import IngestionPipeline
 from src.retrieval.vector_store import VectorStore
 
-# Load documents 
-doc_loader = DocumentLoader()
-documents = doc_loader.load_directory('./docs/raw', recursive=True)
-print(f"Loaded {len(documents)} documents.")
-
-# Chunk documents
+# Files are read, chunked and embedded as a stream, so loading overlaps embedding
 chunker = TextChunker(chunk_size=500, overlap=50, min_chunk_size=100)
-chunks = [] 
-
-for document in documents:
-    chunks += chunker.chunk_document(document=document,
-                                         chunk_method="sliding_window")
-
-print(f"Created {len(chunks)} chunks from documents.")
+pipeline = IngestionPipeline(chunker=chunker,
+                             chunk_method="sliding_window",
+                             preprocess=False)
 
 # Store them
-embedding_model = EmbeddingModel()
+embedding_model = EmbeddingModel(cache_dir='./data/embedding_cache')
 vector_store = VectorStore(persist_directory='./data/chromadb/',
                            collection_name='aiaa_docs',
                            embedding_model=embedding_model)
 vector_store._reset_collection()
 
-result = vector_store.add_documents(chunks, batch_size=100)
+result = pipeline.run('./docs/raw', vector_store, recursive=True, batch_size=100)
+print(f"Loaded {result['documents']} documents.")
+print(f"Created {pipeline.stats['chunks']} chunks from documents.")
 print(f"Added {result['added']} chunks to the vector store.")
 print(f"Failed to add {result['failed']} chunks to the vector store.")
-print(f"Total chunks {result['total']} in the vector store.")
+print(f"Total chunks {result.get('total', result['added'])} in the vector store.")
 print("Ingestion complete.")
-
@@ -1,5 +1,11 @@
 from .rag_chain import RAGChain
 from .prompt_template import PromptTemplate
 from .llm_client import LLMClient
+from .batch_scheduler import BatchScheduler
+from .answer_cache import AnswerCache
+from .prefix_cache import PrefixCache
+from .context_builder import ContextBuilder, PackedContext
+from .registry import ResourceRegistry, default_registry
 
-__all__ = ["RAGChain", "PromptTemplate", "LLMClient"]
+__all__ = ["RAGChain", "PromptTemplate", "LLMClient", "BatchScheduler", "AnswerCache",
+           "PrefixCache", "ContextBuilder", "PackedContext", "ResourceRegistry", "default_registry"]
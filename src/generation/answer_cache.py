@@ -0,0 +1,142 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    embedding: np.ndarray
+    chunk_ids: Tuple[str, ...]
+    response: Any
+    created_at: float
+
+
+class AnswerCache:
+    """
+    Caches generated answers for questions that are worded alike and were
+    answered from the same retrieved chunks.
+
+    A lookup only hits when the retrieved chunk ids match exactly (the prompt
+    would be built from the same context) and the cosine similarity between
+    the query embeddings reaches the threshold. Entries expire after ttl
+    seconds, the least recently used ones are evicted beyond max_entries, and
+    entries that used a chunk are dropped when that chunk is written or deleted.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024, ttl: float = 3600.0):
+        """
+        :param threshold: Minimum cosine similarity between query embeddings for a hit.
+        :param max_entries: Maximum number of cached answers.
+        :param ttl: Seconds an answer stays valid, or None to keep answers until evicted.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._by_chunks: Dict[Tuple[str, ...], List[int]] = {}
+        self._by_chunk_id: Dict[str, Set[int]] = {}
+        self._next_key = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, query_embedding: np.ndarray, chunk_ids: Sequence[str]) -> Optional[Any]:
+        """Return a cached response for a similar query over the same chunks, or None."""
+        chunk_ids = tuple(chunk_ids)
+        with self._lock:
+            keys = [key for key in self._by_chunks.get(chunk_ids, []) if not self._expired(key)]
+            if not keys:
+                return None
+
+            embeddings = np.stack([self._entries[key].embedding for key in keys])
+            similarities = embeddings @ _normalize(query_embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]].response
+
+    def store(self, query_embedding: np.ndarray, chunk_ids: Sequence[str], response: Any):
+        """Cache the response generated for a query and its retrieved chunk ids."""
+        chunk_ids = tuple(chunk_ids)
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+
+            self._entries[key] = _CacheEntry(embedding=_normalize(query_embedding),
+                                             chunk_ids=chunk_ids,
+                                             response=response,
+                                             created_at=time.monotonic())
+            self._by_chunks.setdefault(chunk_ids, []).append(key)
+            for chunk_id in chunk_ids:
+                self._by_chunk_id.setdefault(chunk_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, chunk_ids: Sequence[str]):
+        """Drop every cached answer that was generated from any of the given chunks."""
+        with self._lock:
+            keys = set()
+            for chunk_id in chunk_ids:
+                keys.update(self._by_chunk_id.get(chunk_id, ()))
+            for key in keys:
+                self._remove(key)
+            if keys:
+                logger.info(f"Invalidated {len(keys)} cached answers.")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+            self._by_chunk_id.clear()
+
+    def _expired(self, key: int) -> bool:
+        if self.ttl is None or time.monotonic() - self._entries[key].created_at <= self.ttl:
+            return False
+        self._remove(key)
+        return True
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        siblings = self._by_chunks[entry.chunk_ids]
+        siblings.remove(key)
+        if not siblings:
+            del self._by_chunks[entry.chunk_ids]
+
+        for chunk_id in entry.chunk_ids:
+            keys = self._by_chunk_id[chunk_id]
+            keys.discard(key)
+            if not keys:
+                del self._by_chunk_id[chunk_id]
+
+    # VectorStore listener hooks
+
+    def on_documents_added(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        # Re-adding an id replaces its content
+        self.invalidate(ids)
+
+    def on_documents_deleted(self, ids: List[str]):
+        self.invalidate(ids)
+
+    def on_collection_reset(self):
+        self.clear()
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
@@ -0,0 +1,111 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Iterator, List
+
+from .llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """
+    Collects prompts submitted from many threads and runs them through the
+    LLM as batched generations.
+
+    A batch is closed when it reaches max_batch_size or when max_wait seconds
+    have passed since its first prompt arrived, whichever comes first. Each
+    caller receives its own answer through a Future.
+    """
+
+    def __init__(self, llm_client: LLMClient, max_batch_size: int = 8, max_wait: float = 0.05):
+        """
+        :param llm_client: Client used to run batched generations.
+        :param max_batch_size: Maximum number of prompts per generation call.
+        :param max_wait: Seconds to wait for more prompts after the first one of a batch.
+        """
+        self.llm_client = llm_client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str) -> Future:
+        """Queue a prompt and return a Future that resolves to its answer."""
+        if self._closed:
+            raise RuntimeError("BatchScheduler is closed")
+        future = Future()
+        self._queue.put((prompt, future))
+        return future
+
+    @property
+    def tokenizer(self):
+        return self.llm_client.tokenizer
+
+    def get_response(self, prompt: str) -> str:
+        """Blocking equivalent of LLMClient.get_response that goes through the batcher."""
+        return self.submit(prompt).result()
+
+    def get_responses(self, prompts: List[str]) -> List[str]:
+        futures = [self.submit(prompt) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def stream_response(self, prompt: str) -> Iterator[str]:
+        # Token streams cannot share a batch, so they go straight to the client
+        return self.llm_client.stream_response(prompt)
+
+    def close(self):
+        """Finish the queued prompts and stop the worker thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _collect_batch(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            # Skip prompts whose callers cancelled while they were queued
+            batch = [(prompt, future) for prompt, future in self._collect_batch(first)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                answers = self.llm_client.get_responses([prompt for prompt, _ in batch])
+            except Exception as e:
+                logger.error(f"Batched generation failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            logger.debug(f"Generated a batch of {len(batch)} responses.")
+            for (_, future), answer in zip(batch, answers):
+                future.set_result(answer)
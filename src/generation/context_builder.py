@@ -0,0 +1,169 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+_SENTENCE_ENDINGS = re.compile(r'(?<=[.!?]) +')
+
+
+@dataclass
+class PackedContext:
+    """The documents that fit the token budget, ready for PromptTemplate.generate_prompt."""
+    documents: List[Dict]
+    token_count: int
+    dropped: int = 0
+    truncated: bool = False
+
+
+@dataclass
+class _Candidate:
+    doc: Dict
+    content: str
+    source: Optional[str] = None
+    span: Optional[Tuple[int, int]] = None
+    shingles: set = field(default_factory=set)
+
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into a context of at most max_tokens tokens.
+
+    Candidates are taken best first. Text already in the context is dropped:
+    overlapping chunks of the same file are trimmed using their chunk_start and
+    chunk_end offsets, and chunks whose word shingles are mostly in the context
+    already are skipped. The chunk that does not fit is cut at the last
+    sentence boundary within the budget, and packing stops there.
+    """
+
+    def __init__(self,
+                 tokenizer=None,
+                 max_tokens: int = 1024,
+                 duplicate_threshold: float = 0.8,
+                 shingle_size: int = 5):
+        """
+        :param tokenizer: The LLM's Hugging Face tokenizer. Without one, tokens
+            are estimated as whitespace-separated words.
+        :param max_tokens: Token budget of the context, excluding the separators
+            between documents and the rest of the prompt.
+        :param duplicate_threshold: Fraction of a candidate already in the context
+            above which it is dropped.
+        :param shingle_size: Words per shingle when comparing texts.
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Token count of each text, tokenized in one batch."""
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [len(text.split()) for text in texts]
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+    def build(self, candidates: List[Dict]) -> PackedContext:
+        """
+        :param candidates: Documents with a 'content' key and optionally 'metadata'
+            and 'similarity'. They are ranked by similarity when all have one,
+            otherwise taken in the given order.
+        """
+        ranked = list(candidates)
+        if ranked and all('similarity' in doc for doc in ranked):
+            ranked.sort(key=lambda doc: doc['similarity'], reverse=True)
+
+        unique = self._deduplicate(ranked)
+        dropped = len(ranked) - len(unique)
+
+        documents = []
+        token_count = 0
+        truncated = False
+        for candidate, tokens in zip(unique, self.count_tokens([c.content for c in unique])):
+            remaining = self.max_tokens - token_count
+            if tokens <= remaining:
+                documents.append({**candidate.doc, 'content': candidate.content})
+                token_count += tokens
+                continue
+
+            truncated = True
+            content, tokens = self._truncate(candidate.content, remaining)
+            if content:
+                documents.append({**candidate.doc, 'content': content})
+                token_count += tokens
+            break
+
+        dropped += len(unique) - len(documents)
+        return PackedContext(documents=documents, token_count=token_count,
+                             dropped=dropped, truncated=truncated)
+
+    def _deduplicate(self, ranked: List[Dict]) -> List[_Candidate]:
+        kept: List[_Candidate] = []
+        seen = set()
+        for doc in ranked:
+            candidate = self._candidate(doc)
+            if candidate.span is not None:
+                candidate = self._trim_overlap(candidate, kept)
+                if candidate is None:
+                    continue
+
+            if not candidate.shingles:
+                continue
+            if len(candidate.shingles & seen) >= self.duplicate_threshold * len(candidate.shingles):
+                continue
+            kept.append(candidate)
+            seen |= candidate.shingles
+        return kept
+
+    def _candidate(self, doc: Dict) -> _Candidate:
+        content = doc['content']
+        metadata = doc.get('metadata') or {}
+        source = metadata.get('file_path') or metadata.get('source')
+        span = None
+        if source is not None and 'chunk_start' in metadata and 'chunk_end' in metadata:
+            start, end = int(metadata['chunk_start']), int(metadata['chunk_end'])
+            # Offsets are only trusted when they describe this exact text
+            if end - start == len(content):
+                span = (start, end)
+        return _Candidate(doc=doc, content=content, source=source, span=span,
+                          shingles=self._shingles(content))
+
+    def _trim_overlap(self, candidate: _Candidate, kept: List[_Candidate]) -> Optional[_Candidate]:
+        """Cut the text that chunks of the same file in the context already cover."""
+        start, end = candidate.span
+        for other in kept:
+            if other.source != candidate.source or other.span is None:
+                continue
+            other_start, other_end = other.span
+            if other_start <= start < other_end:
+                start = min(other_end, end)
+            if other_start < end <= other_end:
+                end = max(other_start, start)
+
+        original_start, original_end = candidate.span
+        if end - start <= (1 - self.duplicate_threshold) * (original_end - original_start):
+            return None
+        if (start, end) != candidate.span:
+            content = candidate.content[start - original_start:end - original_start].strip()
+            candidate = _Candidate(doc=candidate.doc, content=content, source=candidate.source,
+                                   span=(start, end), shingles=self._shingles(content))
+        return candidate
+
+    def _shingles(self, text: str) -> set:
+        words = text.lower().split()
+        if len(words) <= self.shingle_size:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def _truncate(self, content: str, max_tokens: int) -> Tuple[str, int]:
+        """The leading sentences of content that fit in max_tokens, and their token count."""
+        breaks = list(_SENTENCE_ENDINGS.finditer(content))
+        starts = [0] + [match.end() for match in breaks]
+        ends = [match.start() for match in breaks] + [len(content)]
+        sentences = [content[start:end] for start, end in zip(starts, ends)]
+
+        cut, total = 0, 0
+        for end, tokens in zip(ends, self.count_tokens(sentences)):
+            if total + tokens > max_tokens:
+                break
+            cut = end
+            total += tokens
+        return content[:cut], total
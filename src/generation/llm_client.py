@@ -2,17 +2,47 @@ import warnings
 warnings.filterwarnings("ignore", message="builtin type SwigPyPacked has no __module__ attribute")
 warnings.filterwarnings("ignore", message="builtin type SwigPyObject has no __module__ attribute")
 
-from transformers import pipeline
+import copy
+from threading import Event, Lock, Thread
+from typing import Iterator, List, Optional, Sequence
+from transformers import pipeline, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 import torch
 
+from .prefix_cache import PrefixCache
+from .prompt_template import PromptTemplate
+
+class _Cancelled(StoppingCriteria):
+    """Stops generation once the event is set."""
+
+    def __init__(self, event: Event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
 class LLMClient:
-    def __init__(self, model_name: str = "mistralai/Mistral-7B-Instruct-v0.3"):
+    def __init__(self, model_name: str = "mistralai/Mistral-7B-Instruct-v0.3",
+                 prefix_cache_size: int = 8,
+                 static_prefixes: Sequence[str] = (PromptTemplate.PREAMBLE,)):
+        """
+        :param prefix_cache_size: Number of prompt prefixes whose attention
+            key/values are kept, so prompts starting with one only prefill the
+            rest. 0 disables the cache. Batched generation with get_responses
+            does not use it, except for a batch of one prompt.
+        :param static_prefixes: Prefixes cached up front with cache_prefix.
+        """
         self.model_name = model_name
+        self.prefix_cache = None
+
+        # The pipeline is shared between sessions, so generate one request at a time
+        self._lock = Lock()
 
         # For tesging purposes, we can use a mock model or a lightweight model
         if self.model_name == "MockModel":
             # Placeholder for a mock model for testing purposes
-            self.pipe = lambda prompt, **kwargs: [{"generated_text": "This is a placeholder response from the LLM."}]
+            placeholder = [{"generated_text": "This is a placeholder response from the LLM."}]
+            self.pipe = lambda prompt, **kwargs: [placeholder for _ in prompt] if isinstance(prompt, list) else placeholder
             # mock tokenizer = lambda x: x
             self.pipe.tokenizer = lambda x: x
             self.pipe.tokenizer.eos_token_id = 0
@@ -25,13 +55,148 @@ class LLMClient:
                 device_map="auto",
             )
 
-    def get_response(self, prompt: str) -> str:
-        response = self.pipe(
-            prompt,
+            # Batched generation pads prompts on the left so they all end at the same position
+            if self.pipe.tokenizer.pad_token is None:
+                self.pipe.tokenizer.pad_token = self.pipe.tokenizer.eos_token
+            self.pipe.tokenizer.padding_side = "left"
+
+            if prefix_cache_size > 0:
+                self.prefix_cache = PrefixCache(prefix_cache_size)
+                for prefix in static_prefixes:
+                    self.cache_prefix(prefix)
+
+    @property
+    def tokenizer(self):
+        """The model's tokenizer, or None for the mock model."""
+        if self.model_name == "MockModel":
+            return None
+        return self.pipe.tokenizer
+
+    def _generation_kwargs(self) -> dict:
+        return dict(
             max_new_tokens=512,
             temperature=0.7,
             do_sample=True,
             pad_token_id=self.pipe.tokenizer.eos_token_id,
         )
 
+    def cache_prefix(self, prefix: str):
+        """
+        Prefill a prompt prefix, such as the template preamble or a context
+        chunk that many prompts start with, and cache its key/values.
+        """
+        if self.prefix_cache is None:
+            return
+        token_ids = self.pipe.tokenizer(prefix, return_tensors="pt").input_ids
+        # The last token may merge with the text that follows it in a full prompt,
+        # so only the ones before it are sure to match the prompt's tokens
+        token_ids = token_ids[:, :-1]
+        if token_ids.shape[1] == 0 or token_ids[0].tolist() in self.prefix_cache:
+            return
+
+        with self._lock, torch.no_grad():
+            output = self.pipe.model(input_ids=token_ids.to(self.pipe.model.device), use_cache=True)
+            self.prefix_cache.put(token_ids[0].tolist(), output.past_key_values)
+
+    def _generate_from_prefix(self, prompt: str, streamer=None, stopping_criteria=None) -> Optional[str]:
+        """
+        Generate starting from the cached key/values of the prompt's longest
+        cached prefix. Call with the lock held.
+
+        :return: The answer, or None if no cached prefix matches.
+        """
+        if self.prefix_cache is None:
+            return None
+        token_ids = self.pipe.tokenizer(prompt, return_tensors="pt").input_ids
+        prefix_length, past_key_values = self.prefix_cache.get(token_ids[0].tolist())
+        if past_key_values is None:
+            return None
+
+        token_ids = token_ids.to(self.pipe.model.device)
+        # generate appends to the cache it is given, so the shared one is copied
+        output = self.pipe.model.generate(input_ids=token_ids,
+                                          attention_mask=torch.ones_like(token_ids),
+                                          past_key_values=copy.deepcopy(past_key_values),
+                                          streamer=streamer,
+                                          stopping_criteria=stopping_criteria,
+                                          **self._generation_kwargs())
+        completion = self.pipe.tokenizer.decode(output[0, token_ids.shape[1]:], skip_special_tokens=True)
+        return completion.split('Answer:')[-1].strip()
+
+    def get_response(self, prompt: str) -> str:
+        with self._lock:
+            answer = self._generate_from_prefix(prompt)
+            if answer is None:
+                answer = self._extract_answer(self.pipe(prompt, **self._generation_kwargs()))
+
+        return answer
+
+    def get_responses(self, prompts: List[str]) -> List[str]:
+        """
+        Generate responses for several prompts in one padded, batched pipeline call.
+
+        The prefix cache is not used: left padding shifts each prompt's prefix
+        to a different position, so the whole batch is prefilled. A single
+        prompt goes through get_response and still uses it.
+        """
+        if not prompts:
+            return []
+        if len(prompts) == 1:
+            return [self.get_response(prompts[0])]
+
+        with self._lock:
+            responses = self.pipe(list(prompts), batch_size=len(prompts), **self._generation_kwargs())
+
+        return [self._extract_answer(response) for response in responses]
+
+    @staticmethod
+    def _extract_answer(response: list) -> str:
         return response[0]['generated_text'].split('Answer:')[-1].strip()
+
+    def stream_response(self, prompt: str) -> Iterator[str]:
+        """
+        Generate a response and yield text fragments as tokens are produced.
+
+        Generation runs on a background thread that feeds a TextIteratorStreamer,
+        so the first fragment is available as soon as the first token is decoded.
+        Closing the iterator early stops generation at the next token, which
+        releases the pipeline for other requests.
+        """
+        if self.model_name == "MockModel":
+            words = self.get_response(prompt).split(" ")
+            for i, word in enumerate(words):
+                yield word if i == len(words) - 1 else word + " "
+            return
+
+        streamer = TextIteratorStreamer(self.pipe.tokenizer,
+                                        skip_prompt=True,
+                                        skip_special_tokens=True)
+        errors = []
+        cancelled = Event()
+        stopping_criteria = StoppingCriteriaList([_Cancelled(cancelled)])
+
+        def generate():
+            try:
+                with self._lock:
+                    if self._generate_from_prefix(prompt, streamer, stopping_criteria) is None:
+                        self.pipe(prompt, **self._generation_kwargs(), streamer=streamer,
+                                  stopping_criteria=stopping_criteria)
+            except Exception as e:
+                # Unblock the consumer, then re-raise on its thread
+                errors.append(e)
+                streamer.end()
+
+        thread = Thread(target=generate, daemon=True)
+        thread.start()
+
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            # Also runs when the consumer closes the generator before the end
+            cancelled.set()
+
+        thread.join()
+        if errors:
+            raise errors[0]
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Any, Optional, Sequence, Tuple
+
+
+class PrefixCache:
+    """
+    Bounded LRU of attention key/value caches keyed by the token ids of a
+    prompt prefix.
+
+    get returns the longest cached prefix of a prompt, so generation only has
+    to prefill the tokens after it. Entries are shared: callers must copy a
+    value before generating with it, since generation extends it in place.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        """
+        :param max_entries: Maximum number of cached prefixes.
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, ...], Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, token_ids: Sequence[int]) -> bool:
+        return tuple(token_ids) in self._entries
+
+    def get(self, token_ids: Sequence[int]) -> Tuple[int, Optional[Any]]:
+        """
+        Find the longest cached proper prefix of token_ids.
+
+        :return: The prefix length and its cache, or (0, None) on a miss.
+        """
+        token_ids = tuple(token_ids)
+        best = None
+        for key in self._entries:
+            # A proper prefix leaves at least one token for generation to feed the model
+            if len(key) < len(token_ids) and (best is None or len(key) > len(best)) \
+                    and token_ids[:len(key)] == key:
+                best = key
+
+        if best is None:
+            return 0, None
+        self._entries.move_to_end(best)
+        return len(best), self._entries[best]
+
+    def put(self, token_ids: Sequence[int], past_key_values: Any):
+        key = tuple(token_ids)
+        self._entries[key] = past_key_values
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -1,14 +1,16 @@
 from typing import List
 
 class PromptTemplate:
+    # Every prompt starts with this, so LLMClient keeps its attention cache around
+    PREAMBLE = "Use the following context to answer the question:\n\n"
+
     @staticmethod
     def generate_prompt(question: str, relevant_docs: List) -> str:
         context = "\n\n".join([doc['content'] for doc in relevant_docs])
         prompt = (
-            f"Use the following context to answer the question:\n\n"
+            f"{PromptTemplate.PREAMBLE}"
             f"{context}\n\n"
             f"Question: {question}\n"
             f"Answer:"
         )
         return prompt
-
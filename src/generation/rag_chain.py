@@ -1,72 +1,414 @@
-from src.retrieval.vector_store import VectorStore
-from src.retrieval.hybrid_retriever import HybridRetriever
-from src.ingestion.embedding import EmbeddingModel
 from .prompt_template import PromptTemplate
-from .llm_client import LLMClient
+from .context_builder import ContextBuilder
+from .registry import ResourceRegistry, keyword_index_path
 
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 @dataclass
 class RAGResponse:
     answer: str
     source_documents: List
+    # Tokens of context in the prompt, when the chain packs it to a budget
+    context_tokens: Optional[int] = None
+
+
+@dataclass
+class RAGStreamResponse:
+    """
+    Sources are known up front; the answer arrives through answer_stream, an
+    async iterator when returned by aask_hybrid_stream.
+    """
+    answer_stream: Iterator[str]
+    source_documents: List
+    context_tokens: Optional[int] = None
 
 
 class RAGChain:
     def __init__(self, model_name: str = "mistralai/Mistral-7B-Instruct-v0.3",
                  persist_directory: str = "./data/chroma_db",
-                 collection_name: str = "academic_docs"):
-        self.vector_store = VectorStore(persist_directory=persist_directory,
-                                        collection_name=collection_name, 
-                                        embedding_model=EmbeddingModel())
+                 collection_name: str = "academic_docs",
+                 embedding_cache_dir: str = None,
+                 registry: ResourceRegistry = None,
+                 batch_generation: bool = False,
+                 answer_cache: bool = False,
+                 answer_cache_threshold: float = 0.95,
+                 answer_cache_ttl: float = 3600.0,
+                 top_k: int = 3,
+                 context_max_tokens: int = None,
+                 retrieval_workers: int = 4,
+                 generation_workers: int = 4,
+                 vector_backend: str = "chroma",
+                 vector_backend_options: Dict = None):
+        """
+        :param registry: Where to get the LLM, embedding model, vector store and
+            keyword index from. Pass the shared default_registry to reuse them
+            across chains in the same process; by default the chain loads its own.
+        :param batch_generation: Route blocking generations through the registry's
+            BatchScheduler so concurrent questions are answered in shared batches.
+            Batches of more than one prompt do not reuse the LLMClient's cached
+            prompt prefixes and prefill their prompts in full.
+        :param answer_cache: Reuse the answer of an earlier, similar question that
+            retrieved the same chunks instead of generating a new one.
+        :param answer_cache_threshold: Minimum cosine similarity between questions
+            for a cached answer to be reused.
+        :param answer_cache_ttl: Seconds a cached answer stays valid.
+        :param top_k: Number of chunks retrieved per question.
+        :param context_max_tokens: Pack the retrieved chunks into a context of at
+            most this many LLM tokens with a ContextBuilder, dropping duplicate
+            text. Raise top_k along with it so the budget, not the count, limits
+            the context. By default every retrieved chunk is used as is.
+        :param retrieval_workers: Threads running the blocking retrieval steps of
+            the async methods; each question uses two at once.
+        :param generation_workers: Threads waiting on the LLM for the async
+            methods. Generations are serialized by the LLMClient unless
+            batch_generation lets concurrent ones share batches.
+        :param vector_backend: Vector store backend, "chroma" or "local".
+        :param vector_backend_options: Options of the local backend, e.g. {"index": "ivf"}.
+        """
+        registry = registry if registry is not None else ResourceRegistry()
+
+        store_options = dict(embedding_cache_dir=embedding_cache_dir,
+                             backend=vector_backend,
+                             backend_options=vector_backend_options)
+        self.vector_store = registry.vector_store(persist_directory, collection_name, **store_options)
+
+        if batch_generation:
+            self.llm_client = registry.batch_scheduler(model_name)
+        else:
+            self.llm_client = registry.llm_client(model_name)
+
+        self.top_k = top_k
+        self.context_builder = None
+        if context_max_tokens is not None:
+            self.context_builder = ContextBuilder(tokenizer=self.llm_client.tokenizer,
+                                                  max_tokens=context_max_tokens)
 
-        self.llm_client = LLMClient(model_name=model_name)
+        # Loads the keyword index snapshot, or builds it, the first time it is requested
+        self.hybrid_retriever = registry.hybrid_retriever(persist_directory, collection_name, **store_options)
 
-        self.hybrid_retriever = HybridRetriever(vector_store=self.vector_store)
+        self.keyword_index_path = keyword_index_path(persist_directory, collection_name)
 
-        self._index_for_hybrid_search()
+        self.answer_cache = None
+        if answer_cache:
+            self.answer_cache = registry.answer_cache(persist_directory, collection_name,
+                                                      threshold=answer_cache_threshold,
+                                                      ttl=answer_cache_ttl,
+                                                      **store_options)
 
+        # Bounded, so many questions in flight queue up instead of piling up threads
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=retrieval_workers,
+                                                      thread_name_prefix="rag-retrieval")
+        self._generation_executor = ThreadPoolExecutor(max_workers=generation_workers,
+                                                       thread_name_prefix="rag-generation")
 
-    def _index_for_hybrid_search(self):
+    def close(self):
+        """Save the keyword index if it changed and stop the threads used by the async methods."""
+        self.save_index()
+        self._retrieval_executor.shutdown(wait=False)
+        self._generation_executor.shutdown(wait=False)
+
+    def add_documents(self, chunks, batch_size: int = 100):
+        """
+        Add chunks to the vector store. The hybrid retriever listens to the
+        vector store, so new chunks become searchable by keyword immediately.
+        The keyword index snapshot is not rewritten; call save_index (or close)
+        once the documents of a bulk ingest are added.
         """
-        Index documents in the vector store for hybrid search.
+        return self.vector_store.add_documents(chunks, batch_size=batch_size)
+
+    def save_index(self) -> bool:
+        """
+        Save the keyword index snapshot if the collection changed since it was
+        last saved or loaded, so the next start memory-maps it instead of
+        rebuilding the index.
+
+        :return: True if a snapshot was written.
         """
-        all_docs = self.vector_store.get_all_documents()
-        print(f"Indexing {len(all_docs)} documents for hybrid search.")
-        contents = [doc['content'] for doc in all_docs]
-        doc_ids = [doc['id'] for doc in all_docs]
-        self.hybrid_retriever.index_documents(contents, doc_ids)
+        return self.hybrid_retriever.save_index_if_changed(self.keyword_index_path)
 
-    def ask_hybrid(self, question: str) -> RAGResponse:
-        """Process a question and return a response using the hybrid RAG approach."""
+    def ask_hybrid(self, question: str, where: Dict = None) -> RAGResponse:
+        """
+        Process a question and return a response using the hybrid RAG approach.
+
+        :param where: Optional Chroma where filter restricting retrieval to
+            matching chunks, e.g. {"file_name": "lecture3.pdf"}.
+        """
         # Step 1: Retrieve relevand docs using hybrid retriever
-        search_response = self.hybrid_retriever.search(question, top_k=3)
-        relevant_docs = [{'content': doc.content} for doc in search_response]
+        query_embedding = self._query_embedding(question)
+        search_response = self.hybrid_retriever.search(question, top_k=self.top_k, where=where,
+                                                       query_embedding=query_embedding)
+
+        # A similar question answered from the same chunks skips generation
+        cache_key, cached = self._cached_answer(query_embedding, search_response)
+        if cached is not None:
+            return cached
 
         # Step 2: Generate prompts using the docs
+        relevant_docs, context_tokens = self._pack_context(self._hybrid_docs(search_response))
         prompt = PromptTemplate.generate_prompt(question, relevant_docs)
 
         # Step 3: Get response from LLM
         llm_response = self.llm_client.get_response(prompt)
 
-        return RAGResponse(answer=llm_response,
-                           source_documents=search_response)
+        response = RAGResponse(answer=llm_response,
+                               source_documents=search_response,
+                               context_tokens=context_tokens)
+        if cache_key is not None:
+            self.answer_cache.store(*cache_key, response)
+        return response
+
+    async def aask_hybrid(self, question: str, where: Dict = None) -> RAGResponse:
+        """
+        Async ask_hybrid. The vector and keyword searches run concurrently and
+        every blocking step runs on the chain's executors, so one event loop can
+        serve many questions at once.
+        """
+        query_embedding = await self._offload(self._retrieval_executor, self._query_embedding, question)
+        search_response = await self.hybrid_retriever.asearch(question, top_k=self.top_k,
+                                                              executor=self._retrieval_executor,
+                                                              where=where, query_embedding=query_embedding)
+
+        cache_key, cached = await self._offload(self._retrieval_executor, self._cached_answer,
+                                                query_embedding, search_response)
+        if cached is not None:
+            return cached
+
+        relevant_docs, context_tokens = await self._offload(self._retrieval_executor, self._pack_context,
+                                                            self._hybrid_docs(search_response))
+        prompt = PromptTemplate.generate_prompt(question, relevant_docs)
+
+        llm_response = await self._offload(self._generation_executor, self.llm_client.get_response, prompt)
+
+        response = RAGResponse(answer=llm_response,
+                               source_documents=search_response,
+                               context_tokens=context_tokens)
+        if cache_key is not None:
+            self.answer_cache.store(*cache_key, response)
+        return response
+
+    def ask_batch(self, questions: List[str], batch_size: int = 8, where: Dict = None) -> List[RAGResponse]:
+        """
+        Answer many questions with the hybrid RAG approach, e.g. for offline
+        evaluation. Retrieval for all questions is done in one batched search
+        and answers are generated batch_size prompts at a time, without the
+        LLMClient's prefix cache.
+
+        :param where: Optional metadata filter applied to every question, see ask_hybrid.
+        :return: One response per question, in order.
+        """
+        if not questions:
+            return []
+
+        query_embeddings = None
+        if self.answer_cache is not None:
+            query_embeddings = self.vector_store.embedding_model.encode_batch(questions)
+        search_responses = self.hybrid_retriever.search_batch(questions, top_k=self.top_k, where=where,
+                                                              query_embeddings=query_embeddings)
+
+        cache_keys = [None] * len(questions)
+        if query_embeddings is not None:
+            cache_keys = [(query_embedding, [doc.id for doc in search_response])
+                          for query_embedding, search_response in zip(query_embeddings, search_responses)]
+
+        responses = [None] * len(questions)
+        pending = []
+        for i, (question, search_response) in enumerate(zip(questions, search_responses)):
+            if cache_keys[i] is not None:
+                responses[i] = self.answer_cache.lookup(*cache_keys[i])
+            if responses[i] is None:
+                relevant_docs, context_tokens = self._pack_context(self._hybrid_docs(search_response))
+                pending.append((i, PromptTemplate.generate_prompt(question, relevant_docs), context_tokens))
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            answers = self.llm_client.get_responses([prompt for _, prompt, _ in batch])
+            for (i, _, context_tokens), answer in zip(batch, answers):
+                responses[i] = RAGResponse(answer=answer,
+                                           source_documents=search_responses[i],
+                                           context_tokens=context_tokens)
+                if cache_keys[i] is not None:
+                    self.answer_cache.store(*cache_keys[i], responses[i])
+
+        return responses
 
+    @staticmethod
+    async def _offload(executor, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
 
+    @staticmethod
+    def _hybrid_docs(search_response) -> List[Dict]:
+        return [{'content': doc.content, 'metadata': doc.metadata} for doc in search_response]
 
-    def ask(self, question: str) -> RAGResponse:
-        """Process a question and return a response using the RAG approach."""
+    def _cached_answer(self, query_embedding, search_response) -> Tuple[Optional[tuple], Optional[RAGResponse]]:
+        """The answer cache key of a question and its cached answer, if any."""
+        cache_key = self._answer_cache_key(query_embedding, search_response)
+        if cache_key is None:
+            return None, None
+        return cache_key, self.answer_cache.lookup(*cache_key)
+
+    def _pack_context(self, relevant_docs: List[Dict]) -> Tuple[List[Dict], Optional[int]]:
+        """The documents to put in the prompt and their token count, if packed to a budget."""
+        if self.context_builder is None:
+            return relevant_docs, None
+        packed = self.context_builder.build(relevant_docs)
+        return packed.documents, packed.token_count
+
+    def _query_embedding(self, question: str):
+        """
+        The question's embedding when it is needed for the answer cache key, else None.
+        Retrieval is given the same embedding, so the question is encoded once.
+        """
+        if self.answer_cache is None or not question:
+            return None
+        return self.vector_store.embedding_model.encode(question)
+
+    def _answer_cache_key(self, query_embedding, search_response):
+        """(query embedding, retrieved chunk ids), or None without an answer cache."""
+        if query_embedding is None:
+            return None
+        return query_embedding, [doc.id for doc in search_response]
+
+
+    def ask_hybrid_stream(self, question: str, where: Dict = None) -> RAGStreamResponse:
+        """
+        Like ask_hybrid, but return as soon as retrieval is done and stream the
+        answer tokens as the LLM produces them.
+        """
+        query_embedding = self._query_embedding(question)
+        search_response = self.hybrid_retriever.search(question, top_k=self.top_k, where=where,
+                                                       query_embedding=query_embedding)
+
+        cache_key, cached = self._cached_answer(query_embedding, search_response)
+        if cached is not None:
+            return RAGStreamResponse(answer_stream=iter([cached.answer]),
+                                     source_documents=search_response)
+
+        relevant_docs, context_tokens = self._pack_context(self._hybrid_docs(search_response))
+        prompt = PromptTemplate.generate_prompt(question, relevant_docs)
+        answer_stream = self.llm_client.stream_response(prompt)
+        if cache_key is not None:
+            answer_stream = self._cache_stream(answer_stream, cache_key, search_response)
+
+        return RAGStreamResponse(answer_stream=answer_stream,
+                                 source_documents=search_response,
+                                 context_tokens=context_tokens)
+
+    async def aask_hybrid_stream(self, question: str, where: Dict = None) -> RAGStreamResponse:
+        """
+        Async ask_hybrid_stream: returns once retrieval is done, with an
+        answer_stream to consume with async for.
+        """
+        query_embedding = await self._offload(self._retrieval_executor, self._query_embedding, question)
+        search_response = await self.hybrid_retriever.asearch(question, top_k=self.top_k,
+                                                              executor=self._retrieval_executor,
+                                                              where=where, query_embedding=query_embedding)
+
+        cache_key, cached = await self._offload(self._retrieval_executor, self._cached_answer,
+                                                query_embedding, search_response)
+        if cached is not None:
+            return RAGStreamResponse(answer_stream=self._astream(iter([cached.answer])),
+                                     source_documents=search_response)
+
+        relevant_docs, context_tokens = await self._offload(self._retrieval_executor, self._pack_context,
+                                                            self._hybrid_docs(search_response))
+        prompt = PromptTemplate.generate_prompt(question, relevant_docs)
+        answer_stream = self.llm_client.stream_response(prompt)
+        if cache_key is not None:
+            answer_stream = self._cache_stream(answer_stream, cache_key, search_response)
+
+        return RAGStreamResponse(answer_stream=self._astream(answer_stream),
+                                 source_documents=search_response,
+                                 context_tokens=context_tokens)
+
+    async def _astream(self, answer_stream: Iterator[str]) -> AsyncIterator[str]:
+        """
+        Iterate a blocking token stream on a generation thread and hand the
+        tokens to the event loop. Closing the async iterator early closes the
+        token stream, which stops LLMClient generation at its next token.
+        """
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def pump():
+            try:
+                for token in answer_stream:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(tokens.put_nowait, token)
+            except BaseException as e:
+                loop.call_soon_threadsafe(tokens.put_nowait, e)
+            else:
+                loop.call_soon_threadsafe(tokens.put_nowait, done)
+            finally:
+                # Runs the stream's cleanup on this thread rather than whenever it is collected
+                if hasattr(answer_stream, "close"):
+                    answer_stream.close()
+
+        pumping = loop.run_in_executor(self._generation_executor, pump)
+        try:
+            while True:
+                token = await tokens.get()
+                if token is done:
+                    break
+                if isinstance(token, BaseException):
+                    raise token
+                yield token
+        finally:
+            stop.set()
+            await pumping
+
+    def _cache_stream(self, answer_stream, cache_key, search_response) -> Iterator[str]:
+        """Pass tokens through and cache the answer once the stream completes."""
+        parts = []
+        try:
+            for token in answer_stream:
+                parts.append(token)
+                yield token
+        finally:
+            answer_stream.close()
+        self.answer_cache.store(*cache_key, RAGResponse(answer="".join(parts),
+                                                        source_documents=search_response))
+
+    async def aask(self, question: str, where: Dict = None) -> RAGResponse:
+        """Async ask, with the vector search and generation on the chain's executors."""
+        search_response = await self._offload(self._retrieval_executor, self.vector_store.search,
+                                               question, self.top_k, where)
+        relevant_docs = search_response['results'] if search_response else []
+
+        context_docs, context_tokens = await self._offload(self._retrieval_executor, self._pack_context,
+                                                           relevant_docs)
+        prompt = PromptTemplate.generate_prompt(question, context_docs)
+
+        llm_response = await self._offload(self._generation_executor, self.llm_client.get_response, prompt)
+
+        return RAGResponse(answer=llm_response,
+                           source_documents=relevant_docs,
+                           context_tokens=context_tokens)
+
+    def ask(self, question: str, where: Dict = None) -> RAGResponse:
+        """
+        Process a question and return a response using the RAG approach.
+
+        :param where: Optional metadata filter restricting retrieval, see ask_hybrid.
+        """
         # Step 1: Retrieve relevant documents 
-        search_response = self.vector_store.search(question, top_k=3)
-        relevant_docs = search_response['results']
+        search_response = self.vector_store.search(question, top_k=self.top_k, where=where)
+        relevant_docs = search_response['results'] if search_response else []
 
         # Step 2: Generate prompt
-        prompt = PromptTemplate.generate_prompt(question, relevant_docs)
+        context_docs, context_tokens = self._pack_context(relevant_docs)
+        prompt = PromptTemplate.generate_prompt(question, context_docs)
 
         # Step 3: Get response from LLM
         llm_response = self.llm_client.get_response(prompt)
 
         return RAGResponse(answer=llm_response,
-                           source_documents=relevant_docs)
+                           source_documents=relevant_docs,
+                           context_tokens=context_tokens)
 
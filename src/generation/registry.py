@@ -0,0 +1,164 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.hybrid_retriever import HybridRetriever
+from src.ingestion.embedding import EmbeddingModel
+from .llm_client import LLMClient
+from .batch_scheduler import BatchScheduler
+from .answer_cache import AnswerCache
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceRegistry:
+    """
+    Loads heavy resources once and hands the same instance to every caller
+    asking for the same configuration.
+
+    A Streamlit server runs every browser session in the same process, so
+    sessions that share the module-level default_registry share one LLM,
+    one embedding model, one Chroma client and one keyword index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources: Dict[Hashable, Any] = {}
+        self._creation_locks: Dict[Hashable, threading.Lock] = {}
+
+    def _get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._resources:
+                return self._resources[key]
+            creation_lock = self._creation_locks.setdefault(key, threading.Lock())
+
+        # Loading one model must not block lookups of resources that already exist
+        with creation_lock:
+            with self._lock:
+                if key in self._resources:
+                    return self._resources[key]
+
+            logger.info(f"Loading shared resource: {key}")
+            resource = factory()
+
+            with self._lock:
+                self._resources[key] = resource
+            return resource
+
+    def llm_client(self, model_name: str) -> LLMClient:
+        return self._get_or_create(("llm_client", model_name),
+                                   lambda: LLMClient(model_name=model_name))
+
+    def batch_scheduler(self, model_name: str, max_batch_size: int = 8,
+                        max_wait: float = 0.05) -> BatchScheduler:
+        """A micro-batching front for the shared LLMClient of model_name."""
+        return self._get_or_create(("batch_scheduler", model_name, max_batch_size, max_wait),
+                                   lambda: BatchScheduler(self.llm_client(model_name),
+                                                          max_batch_size=max_batch_size,
+                                                          max_wait=max_wait))
+
+    def embedding_model(self, model_name: str = "all-MiniLM-L6-v2",
+                        cache_dir: str = None) -> EmbeddingModel:
+        cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+        return self._get_or_create(("embedding_model", model_name, cache_dir),
+                                   lambda: EmbeddingModel(model_name=model_name, cache_dir=cache_dir))
+
+    def vector_store(self, persist_directory: str, collection_name: str,
+                     embedding_model_name: str = "all-MiniLM-L6-v2",
+                     embedding_cache_dir: str = None,
+                     backend: str = "chroma",
+                     backend_options: Dict[str, Any] = None) -> VectorStore:
+        """
+        :param backend: "chroma" or "local", see VectorStore.
+        :param backend_options: Options of the local backend, e.g. {"index": "ivf"}.
+        """
+        persist_directory = os.path.abspath(persist_directory)
+        embedding_cache_dir = os.path.abspath(embedding_cache_dir) if embedding_cache_dir else None
+        return self._get_or_create(
+            ("vector_store", persist_directory, collection_name, embedding_model_name,
+             embedding_cache_dir, backend, _options_key(backend_options)),
+            lambda: VectorStore(persist_directory=persist_directory,
+                                collection_name=collection_name,
+                                embedding_model=self.embedding_model(embedding_model_name,
+                                                                     embedding_cache_dir),
+                                backend=backend,
+                                backend_options=backend_options)
+        )
+
+    def hybrid_retriever(self, persist_directory: str, collection_name: str,
+                         embedding_model_name: str = "all-MiniLM-L6-v2",
+                         embedding_cache_dir: str = None,
+                         backend: str = "chroma",
+                         backend_options: Dict[str, Any] = None) -> HybridRetriever:
+        """
+        Return the keyword-indexed retriever for a collection, loading or
+        building its index the first time it is requested.
+        """
+        persist_directory = os.path.abspath(persist_directory)
+        embedding_cache_dir = os.path.abspath(embedding_cache_dir) if embedding_cache_dir else None
+
+        def create():
+            retriever = HybridRetriever(vector_store=self.vector_store(persist_directory,
+                                                                      collection_name,
+                                                                      embedding_model_name,
+                                                                      embedding_cache_dir,
+                                                                      backend,
+                                                                      backend_options))
+            retriever.load_or_build_index(keyword_index_path(persist_directory, collection_name))
+            return retriever
+
+        return self._get_or_create(
+            ("hybrid_retriever", persist_directory, collection_name, embedding_model_name,
+             embedding_cache_dir, backend, _options_key(backend_options)),
+            create
+        )
+
+    def answer_cache(self, persist_directory: str, collection_name: str,
+                     embedding_model_name: str = "all-MiniLM-L6-v2",
+                     embedding_cache_dir: str = None,
+                     threshold: float = 0.95, max_entries: int = 1024,
+                     ttl: float = 3600.0,
+                     backend: str = "chroma",
+                     backend_options: Dict[str, Any] = None) -> AnswerCache:
+        """
+        Return the answer cache of a collection. It listens to the collection's
+        vector store so answers built from changed chunks are dropped.
+        """
+        persist_directory = os.path.abspath(persist_directory)
+        embedding_cache_dir = os.path.abspath(embedding_cache_dir) if embedding_cache_dir else None
+
+        def create():
+            cache = AnswerCache(threshold=threshold, max_entries=max_entries, ttl=ttl)
+            self.vector_store(persist_directory, collection_name, embedding_model_name,
+                              embedding_cache_dir, backend, backend_options).add_listener(cache)
+            return cache
+
+        return self._get_or_create(
+            ("answer_cache", persist_directory, collection_name, embedding_model_name,
+             embedding_cache_dir, threshold, max_entries, ttl, backend, _options_key(backend_options)),
+            create
+        )
+
+    def clear(self):
+        """Forget every resource so the next request loads it again."""
+        with self._lock:
+            for resource in self._resources.values():
+                if isinstance(resource, BatchScheduler):
+                    resource.close()
+            self._resources.clear()
+            self._creation_locks.clear()
+
+
+def _options_key(options: Dict[str, Any]) -> tuple:
+    return tuple(sorted((options or {}).items()))
+
+
+def keyword_index_path(persist_directory: str, collection_name: str) -> str:
+    """The keyword index snapshot lives next to the Chroma files."""
+    return os.path.join(persist_directory, f"{collection_name}.kwindex")
+
+
+# Shared by every RAGChain created with registry=default_registry in this process
+default_registry = ResourceRegistry()
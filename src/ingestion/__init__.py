@@ -2,8 +2,11 @@ from .document import Document, DocumentLoader
 from .preprocessor import DocumentPreprocessor
 from .chunker import TextChunker, TextChunk
 from .embedding import EmbeddingModel
+from .embedding_cache import EmbeddingCache
+from .pipeline import IngestionPipeline
 
 __all__ = ['Document', 
            'DocumentLoader', 'DocumentPreprocessor', 
            'TextChunker', 'TextChunk',
-           'EmbeddingModel']
+           'EmbeddingModel', 'EmbeddingCache',
+           'IngestionPipeline']
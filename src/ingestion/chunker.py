@@ -1,25 +1,106 @@
 import re
+import hashlib
 import logging
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import field
+from itertools import accumulate
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+
+import numpy as np
+
 from .document import Document
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class TextChunk:
     content: str
     metadata: Dict[str, Any]
+    # Set by semantic chunking, which pools the sentence embeddings it already computed
+    embedding: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+
+    @property
+    def chunk_id(self) -> str:
+        """
+        A stable id derived from the source path, the chunk offsets and the
+        content hash, so ingesting the same chunk twice yields the same id.
+        """
+        source = self.metadata.get('file_path', self.metadata.get('source', ''))
+        content_hash = hashlib.blake2b(self.content.encode('utf-8'), digest_size=16).hexdigest()
+        key = f"{source}\0{self.metadata.get('chunk_start')}\0{self.metadata.get('chunk_end')}\0{content_hash}"
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+class _Units(NamedTuple):
+    """
+    Consecutive units (sentences, paragraphs, ...) of a text.
+
+    starts/ends are character offsets used to slice chunks. lo/hi are the
+    positions chunk sizes are measured on: the character offsets themselves,
+    or running token counts when sizing by tokens.
+    """
+    starts: List[int]
+    ends: List[int]
+    lo: List[int]
+    hi: List[int]
+
 
 class TextChunker:
+    """
+    Splits documents into chunks of whole sentences or paragraphs.
+
+    Boundaries are found once as offset arrays over the original text and
+    every chunk is a single slice of it, so chunk_start and chunk_end in the
+    metadata are exact: document.content[chunk_start:chunk_end] == chunk.content.
+    """
+
+    SIZE_UNITS = ("chars", "tokens")
+
     def __init__(self, 
                  chunk_size: int = 500, 
                  overlap: int = 50,
-                 min_chunk_size: int = 100):
+                 min_chunk_size: int = 100,
+                 embedding_model=None,
+                 breakpoint_percentile: float = 95.0,
+                 size_unit: str = "chars",
+                 tokenizer=None,
+                 token_cache_size: int = 100_000):
+        """
+        :param chunk_size: Maximum chunk length, in size_unit.
+        :param overlap: Length of the previous chunk repeated at the start of
+            the next one, rounded up to whole units when they fit.
+        :param min_chunk_size: Chunks shorter than this, such as the tail of a
+            document, are extended back into the previous chunk's text.
+        :param embedding_model: EmbeddingModel used by semantic chunking. Use the
+            vector store's model, since the pooled chunk embeddings are stored as is.
+            Without one, semantic chunking falls back to sentence windows.
+        :param breakpoint_percentile: Semantic chunking starts a new chunk where the
+            similarity drop between adjacent sentences is above this percentile.
+        :param size_unit: "chars", or "tokens" to measure lengths with tokenizer.
+            Token lengths exclude special tokens, so to fit an encoder window use
+            e.g. chunk_size=embedding_model.max_seq_length - 2.
+        :param tokenizer: A Hugging Face (fast) tokenizer, required for "tokens".
+        :param token_cache_size: Number of sentence token counts kept between calls.
+        """
+        if size_unit not in self.SIZE_UNITS:
+            raise ValueError(f"Unsupported size unit: {size_unit}")
+        if size_unit == "tokens" and tokenizer is None:
+            raise ValueError("Token sizing needs a tokenizer")
+
         self.chunk_size = chunk_size
         self.overlap = overlap
         self.min_chunk_size = min_chunk_size
+        self.embedding_model = embedding_model
+        self.breakpoint_percentile = breakpoint_percentile
+        self.size_unit = size_unit
+        self.tokenizer = tokenizer
+        self.token_cache_size = token_cache_size
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
 
         self.sentence_endings = re.compile(r'(?<=[.!?]) +')
         self.paragraph_breaks = re.compile(r'\n+')
+        self.word_breaks = re.compile(r'\s+')
 
 
     def chunk_document(self, document: Document, chunk_method: str = "sliding_window") -> List[TextChunk]:
@@ -33,86 +114,253 @@ class TextChunker:
             raise ValueError(f"Unsupported chunking method: {chunk_method}")
 
     def _sliding_window_chunk(self, document: Document) -> List[TextChunk]:
-        content = document.content
-        chunks = []
-
         # Split into sentences for boundary-aware chunking
-        sentences = self.sentence_endings.split(content)
-        current_chunk = ""
-        current_start = 0
-        chunk_counter = 0
-
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 1 <= self.chunk_size:
-                current_chunk += (sentence + " ")
-            else:
-                if len(current_chunk) >= self.min_chunk_size:
-                    chunk_metadata = {
-                        **document.metadata,
-                        'chunk_index': chunk_counter,
-                        'chunk_start': current_start,
-                        'chunk_end': current_start + len(current_chunk)
-                    }
-                    chunks.append(TextChunk(content=current_chunk.strip(), metadata=chunk_metadata))
-                    chunk_counter += 1
-                    current_start += len(current_chunk) - self.overlap
-
-                current_chunk = sentence + " "
-
-        return chunks
+        units = self._units(document.content, [self.sentence_endings])
+        return self._build_chunks(document, units)
 
     def _paragraph_boundary_chunk(self, document: Document) -> List[TextChunk]:
+        # Paragraphs too long for one chunk fall back to sentence boundaries
+        units = self._units(document.content, [self.paragraph_breaks, self.sentence_endings])
+        return self._build_chunks(document, units)
+
+    def _semantic_chunking(self, document: Document) -> List[TextChunk]:
+        """
+        Break chunks where adjacent sentences stop being similar.
+
+        Sentences are embedded in one batch; a topic boundary is placed after
+        each sentence whose similarity to the next drops below the
+        breakpoint_percentile of drops in the document. Segments longer than
+        chunk_size are packed into several chunks. Each chunk's embedding is the
+        normalized mean of its sentence embeddings, so it is not encoded again.
+        """
+        units = self._units(document.content, [self.sentence_endings])
+        if self.embedding_model is None:
+            return self._build_chunks(document, units)
+        if not units.starts:
+            return []
+
         content = document.content
-        chunks = []
+        embeddings = self.embedding_model.encode_batch([content[start:end]
+                                                        for start, end in zip(units.starts, units.ends)])
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        ranges = []
+        for first, last in self._semantic_segments(units, embeddings):
+            # Positions within the segment, packed like any other run of sentences
+            for seg_first, seg_last in self._pack(units.lo[first:last + 1], units.hi[first:last + 1],
+                                                  self.chunk_size, self.overlap, self.min_chunk_size):
+                ranges.append((first + seg_first, first + seg_last))
 
-        paragraphs = self.paragraph_breaks.split(content)
-        current_chunk = ""
-        current_start = 0
-        chunk_counter = 0
-
-        for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) + 1 <= self.chunk_size:
-                current_chunk += (paragraph + "\n")
-            else:
-                if len(current_chunk) >= self.min_chunk_size:
-                    chunk_metadata = {
-                        **document.metadata,
-                        'chunk_index': chunk_counter,
-                        'chunk_start': current_start,
-                        'chunk_end': current_start + len(current_chunk)
-                    }
-                    chunks.append(TextChunk(content=current_chunk.strip(), metadata=chunk_metadata))
-                    chunk_counter += 1
-                    current_start += len(current_chunk) - self.overlap
-
-                current_chunk = paragraph + "\n"
+        # Sum of the sentence embeddings of any range from two rows of the prefix sums
+        prefix = np.vstack([np.zeros((1, embeddings.shape[1]), dtype=np.float64),
+                            np.cumsum(embeddings, axis=0, dtype=np.float64)])
+        firsts = np.fromiter((first for first, _ in ranges), dtype=np.int64, count=len(ranges))
+        lasts = np.fromiter((last for _, last in ranges), dtype=np.int64, count=len(ranges))
+        pooled = prefix[lasts + 1] - prefix[firsts]
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        pooled = (pooled / np.where(norms > 0, norms, 1.0)).astype(np.float32)
 
+        chunks = self._build_chunks(document, units, ranges)
+        for chunk, embedding in zip(chunks, pooled):
+            chunk.embedding = embedding
         return chunks
 
-    def _semantic_chunking(self, document: Document) -> List[TextChunk]:
+    def _semantic_segments(self, units: _Units, embeddings: np.ndarray) -> List[Tuple[int, int]]:
+        """Split the sentences into topic segments, as (first, last) index pairs."""
+        lo, hi = units.lo, units.hi
+        n = len(lo)
+        if n < 2:
+            return [(0, n - 1)]
+
+        # Embeddings are normalized, so the row-wise dot product is the cosine similarity
+        similarities = np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+        threshold = np.percentile(similarities, 100 - self.breakpoint_percentile)
+        breaks = np.flatnonzero(similarities < threshold)
+
+        segments = []
+        first = 0
+        for breakpoint in breaks:
+            # Don't cut off a segment shorter than min_chunk_size
+            if hi[breakpoint] - lo[first] >= self.min_chunk_size:
+                segments.append((first, int(breakpoint)))
+                first = int(breakpoint) + 1
+        if segments and hi[n - 1] - lo[first] < self.min_chunk_size:
+            first = segments.pop()[0]
+        segments.append((first, n - 1))
+        return segments
+
+    def _units(self, content: str, separators: List[re.Pattern]) -> _Units:
+        """
+        Find the units of content, with surrounding whitespace trimmed and
+        empty units dropped.
+
+        Units longer than chunk_size are split again with the next separator,
+        and finally at word breaks (or hard) within chunk_size. Each level
+        measures all of its new units in one batch.
+        """
+        spans = self._split_on(content, 0, len(content), separators[0])
+        sizes = self._measure(content, spans)
+
+        for separator in separators[1:] + [None]:
+            if all(size <= self.chunk_size for size in sizes):
+                break
+
+            next_spans, next_sizes, unmeasured = [], [], []
+            for (start, end), size in zip(spans, sizes):
+                if size <= self.chunk_size:
+                    next_spans.append((start, end))
+                    next_sizes.append(size)
+                elif separator is not None:
+                    for span in self._split_on(content, start, end, separator):
+                        unmeasured.append(len(next_spans))
+                        next_spans.append(span)
+                        next_sizes.append(None)
+                else:
+                    for span, span_size in self._split_oversize(content, start, end):
+                        next_spans.append(span)
+                        next_sizes.append(span_size)
+
+            for i, size in zip(unmeasured, self._measure(content, [next_spans[i] for i in unmeasured])):
+                next_sizes[i] = size
+            spans, sizes = next_spans, next_sizes
+
+        starts = [start for start, _ in spans]
+        ends = [end for _, end in spans]
+        if self.size_unit == "chars":
+            return _Units(starts, ends, starts, ends)
+
+        positions = [0, *accumulate(sizes)]
+        return _Units(starts, ends, positions[:-1], positions[1:])
+
+    def _split_on(self, content: str, start: int, end: int, separator: re.Pattern) -> List[Tuple[int, int]]:
+        spans = []
+        unit_start = start
+        for match in separator.finditer(content, start, end):
+            self._add_span(content, unit_start, match.start(), spans)
+            unit_start = match.end()
+        self._add_span(content, unit_start, end, spans)
+        return spans
+
+    @staticmethod
+    def _add_span(content: str, start: int, end: int, spans: List[Tuple[int, int]]):
+        while start < end and content[start].isspace():
+            start += 1
+        while end > start and content[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+
+    def _measure(self, content: str, spans: List[Tuple[int, int]]) -> List[int]:
+        """Length of each span in size_unit. Token counts are cached per text."""
+        if self.size_unit == "chars":
+            return [end - start for start, end in spans]
+
+        texts = [content[start:end] for start, end in spans]
+        counts = [self._token_counts.get(text) for text in texts]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            encoded = self.tokenizer([texts[i] for i in missing], add_special_tokens=False)["input_ids"]
+            for i, ids in zip(missing, encoded):
+                counts[i] = len(ids)
+                self._token_counts[texts[i]] = len(ids)
+            while len(self._token_counts) > self.token_cache_size:
+                self._token_counts.popitem(last=False)
+        return counts
+
+    def _split_oversize(self, content: str, start: int, end: int) -> List[Tuple[Tuple[int, int], int]]:
+        """
+        Split a span with no separator left into pieces of at most chunk_size,
+        cutting at the last word break that fits, or hard if there is none.
+
+        :return: ((start, end), size) of each piece.
+        """
+        if self.size_unit == "chars":
+            # A piece's size is its length, so piece boundaries are the positions
+            positions = list(range(start, end))
+        else:
+            offsets = self.tokenizer(content[start:end], add_special_tokens=False,
+                                     return_offsets_mapping=True)["offset_mapping"]
+            positions = [start + token_start for token_start, _ in offsets]
+
+        pieces = []
+        first = 0
+        while len(positions) - first > self.chunk_size:
+            piece_start, limit = positions[first], positions[first + self.chunk_size]
+            cut = limit
+            for match in self.word_breaks.finditer(content, piece_start + 1, limit + 1):
+                cut = match.start()
+            following = bisect_left(positions, cut, first + 1)
+            self._add_piece(content, piece_start, cut, following - first, pieces)
+            first = following
+            # Tokens and characters don't start inside the whitespace after a cut
+            while first < len(positions) and content[positions[first]].isspace():
+                first += 1
+        if first < len(positions):
+            self._add_piece(content, positions[first], end, len(positions) - first, pieces)
+        return pieces
+
+    @staticmethod
+    def _add_piece(content: str, start: int, end: int, size: int, pieces: List):
+        spans = []
+        TextChunker._add_span(content, start, end, spans)
+        if spans:
+            pieces.append((spans[0], size))
+
+    def _pack(self, lo: List[int], hi: List[int], chunk_size: int, overlap: int,
+              min_chunk_size: int) -> List[Tuple[int, int]]:
+        """
+        Group consecutive units into chunks.
+
+        Sizes are measured as hi[last] - lo[first], so lo/hi can be character
+        offsets or running token counts. Every unit must fit in chunk_size on its own.
+
+        :return: (first unit, last unit) index pairs, both inclusive.
+        """
+        n = len(lo)
+        ranges = []
+        first = 0
+        while first < n:
+            # The furthest unit that still fits
+            last = max(bisect_right(hi, lo[first] + chunk_size) - 1, first)
+
+            # Pull a short chunk's start back into the previous chunk
+            if ranges and hi[last] - lo[first] < min_chunk_size:
+                earliest = bisect_left(lo, hi[last] - chunk_size)
+                first = max(min(first, earliest), ranges[-1][0] + 1)
+            ranges.append((first, last))
+            if last == n - 1:
+                break
+
+            # Repeat the fewest trailing units that cover overlap, if the next unit still fits
+            following = last + 1
+            if overlap > 0:
+                repeat = bisect_right(lo, hi[last] - overlap) - 1
+                fits = bisect_left(lo, hi[following] - chunk_size)
+                following = min(max(repeat, fits, first + 1), following)
+            first = following
+
+        return ranges
+
+    def _build_chunks(self, document: Document, units: _Units,
+                      ranges: List[Tuple[int, int]] = None) -> List[TextChunk]:
+        """
+        :param ranges: (first unit, last unit) pairs of each chunk, packed
+            from all units with _pack by default.
+        """
         content = document.content
         chunks = []
 
-        sentences = self.sentence_endings.split(content)
-        current_chunk = ""
-        current_start = 0
-        chunk_counter = 0
-
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 1 <= self.chunk_size:
-                current_chunk += (sentence + " ")
-            else:
-                if len(current_chunk) >= self.min_chunk_size:
-                    chunk_metadata = {
-                        **document.metadata,
-                        'chunk_index': chunk_counter,
-                        'chunk_start': current_start,
-                        'chunk_end': current_start + len(current_chunk)
-                    }
-                    chunks.append(TextChunk(content=current_chunk.strip(), metadata=chunk_metadata))
-                    chunk_counter += 1
-                    current_start += len(current_chunk) - self.overlap
-
-                current_chunk = sentence + " "
+        if ranges is None:
+            ranges = self._pack(units.lo, units.hi, self.chunk_size, self.overlap, self.min_chunk_size)
+
+        for chunk_counter, (first, last) in enumerate(ranges):
+            chunk_start, chunk_end = units.starts[first], units.ends[last]
+            chunk_metadata = {
+                **document.metadata,
+                'chunk_index': chunk_counter,
+                'chunk_start': chunk_start,
+                'chunk_end': chunk_end
+            }
+            chunks.append(TextChunk(content=content[chunk_start:chunk_end], metadata=chunk_metadata))
 
         return chunks
@@ -1,7 +1,9 @@
 import os
 import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dataclasses import dataclass
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List
 
 
 @dataclass
@@ -45,8 +47,40 @@ class DocumentLoader:
             documents.append(self.load_document(file_path))
         return documents
 
-    def load_directory(self, dir_path: str, recursive: bool) -> [Document]:
-        """Load all supported documents from a directory."""
+    def iter_documents(self, file_paths: Iterable[str], num_workers: int = 4,
+                       max_pending: int = None, ordered: bool = False) -> Iterator[Document]:
+        """
+        Read files on a thread pool and yield each Document as soon as it is read.
+
+        At most max_pending files are read ahead of the consumer, so the corpus
+        is never held in memory at once.
+
+        :param file_paths: Paths of the files to load.
+        :param num_workers: Number of reader threads.
+        :param max_pending: Files read ahead of the consumer, defaults to 2 * num_workers.
+        :param ordered: Yield documents in the order of file_paths instead of
+            the order in which they finish loading.
+        """
+        max_pending = max_pending or 2 * num_workers
+        file_paths = iter(file_paths)
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            pending = deque()
+            try:
+                for file_path in file_paths:
+                    pending.append(executor.submit(self.load_document, file_path))
+                    if len(pending) >= max_pending:
+                        yield from _take_loaded(pending, ordered)
+
+                while pending:
+                    yield from _take_loaded(pending, ordered)
+            finally:
+                # Don't start reading files nobody will consume
+                for future in pending:
+                    future.cancel()
+
+    def list_directory(self, dir_path: str, recursive: bool) -> List[str]:
+        """List the paths of all supported files in a directory."""
         file_paths = []
 
         for root, _, files in os.walk(dir_path):
@@ -56,4 +90,31 @@ class DocumentLoader:
             if not recursive:
                 break
 
+        return file_paths
+
+    def load_directory(self, dir_path: str, recursive: bool, stream: bool = False,
+                       num_workers: int = 4):
+        """
+        Load all supported documents from a directory.
+
+        :param stream: Return a generator that reads files in parallel and yields
+            Documents as they become ready, instead of a list.
+        :param num_workers: Number of reader threads when streaming.
+        """
+        file_paths = self.list_directory(dir_path, recursive)
+
+        if stream:
+            return self.iter_documents(file_paths, num_workers=num_workers)
         return self.load_documents(file_paths)
+
+
+def _take_loaded(pending: deque, ordered: bool) -> Iterator[Document]:
+    """Yield the oldest pending document, or every one that has finished loading."""
+    if ordered:
+        yield pending.popleft().result()
+        return
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+        yield future.result()
@@ -1,22 +1,132 @@
+import os
 import torch
 from transformers import AutoTokenizer, AutoModel
 import numpy as np
 from sentence_transformers import SentenceTransformer
 from typing import List
+from .embedding_cache import EmbeddingCache
 
 class EmbeddingModel:
-    """ 
+    """
     A class to handle text embeddings and similarity calculations using a pre-trained model.
     """
 
-    def __init__(self):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self,
+                 model_name: str = "all-MiniLM-L6-v2",
+                 batch_size: int = 64,
+                 num_workers: int = 0,
+                 cache_dir: str = None,
+                 cache_memory_size: int = 4096):
+        """
+        :param model_name: Name of the sentence-transformers model to load.
+        :param batch_size: Default number of texts per forward pass in encode_batch.
+        :param num_workers: Number of CPU worker processes used by encode_batch (0 or 1 disables the pool).
+        :param cache_dir: Directory for the persistent embedding cache, or None to disable it.
+        :param cache_memory_size: Number of vectors kept in the cache's in-memory LRU.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.model = SentenceTransformer(model_name)
+        self._pool = None
+
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = EmbeddingCache(os.path.join(cache_dir, model_name.replace("/", "_")),
+                                        dimension=self.dimension,
+                                        memory_size=cache_memory_size)
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def tokenizer(self):
+        """The model's tokenizer, e.g. for TextChunker(size_unit="tokens")."""
+        return self.model.tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        """Tokens the model reads per text, including special tokens; the rest is truncated."""
+        return self.model.max_seq_length
 
     def encode(self, text: str) -> np.ndarray:
-        return self.model.encode(text, 
+        if self.cache is None:
+            return self._encode(text)
+
+        key = EmbeddingCache.key(self.model_name, text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self._encode(text)
+            self.cache.put(key, embedding)
+        return embedding
+
+    def _encode(self, text: str) -> np.ndarray:
+        return self.model.encode(text,
                                  normalize_embeddings=True,
                                  convert_to_numpy=True)
 
+    def encode_batch(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """
+        Encode a list of texts in batched forward passes.
+
+        :param texts: Texts to encode.
+        :param batch_size: Texts per forward pass, defaults to self.batch_size.
+        :return: A (len(texts), dimension) float32 matrix of normalized embeddings.
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+
+        if self.cache is None:
+            return self._encode_batch(texts, batch_size)
+
+        # Only run the model on texts the cache has not seen
+        keys = [EmbeddingCache.key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, embedding in enumerate(cached):
+            if embedding is not None:
+                embeddings[i] = embedding
+
+        if missing:
+            computed = self._encode_batch([texts[i] for i in missing], batch_size)
+            embeddings[missing] = computed
+            self.cache.put_many([keys[i] for i in missing], computed)
+
+        return embeddings
+
+    def _encode_batch(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        batch_size = batch_size or self.batch_size
+
+        if self.num_workers > 1:
+            embeddings = self.model.encode_multi_process(list(texts),
+                                                         self._get_pool(),
+                                                         batch_size=batch_size,
+                                                         normalize_embeddings=True)
+        else:
+            embeddings = self.model.encode(list(texts),
+                                           batch_size=batch_size,
+                                           normalize_embeddings=True,
+                                           convert_to_numpy=True)
+
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _get_pool(self):
+        """Start the multi-process pool on first use."""
+        if self._pool is None:
+            self._pool = self.model.start_multi_process_pool(
+                target_devices=["cpu"] * self.num_workers
+            )
+        return self._pool
+
+    def close(self):
+        """Stop the multi-process pool if one was started."""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
     def similarity(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
         # Cosine similarity
         return float(np.dot(emb1, emb2)) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
@@ -0,0 +1,186 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed cache of embedding vectors.
+
+    Vectors are appended to a raw float32 file that is memory-mapped for
+    reads, and their keys to a parallel file of fixed-size digests. A small
+    LRU dictionary in front of the memory map serves hot entries.
+    """
+
+    KEY_SIZE = 16
+
+    # Appends are serialized per directory so instances sharing one stay aligned
+    _dir_locks: Dict[str, threading.Lock] = {}
+    _dir_locks_guard = threading.Lock()
+
+    def __init__(self, cache_dir: str, dimension: int, memory_size: int = 4096):
+        """
+        :param cache_dir: Directory holding the cache files (created if missing).
+        :param dimension: Length of the cached vectors.
+        :param memory_size: Maximum number of vectors kept in the in-memory LRU.
+        """
+        self.cache_dir = cache_dir
+        self.dimension = dimension
+        self.memory_size = memory_size
+
+        self._keys_path = os.path.join(cache_dir, "keys.bin")
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._meta_path = os.path.join(cache_dir, "meta.json")
+
+        self._lock = threading.RLock()
+        with EmbeddingCache._dir_locks_guard:
+            self._append_lock = EmbeddingCache._dir_locks.setdefault(
+                os.path.realpath(cache_dir), threading.Lock()
+            )
+        self._rows: Dict[bytes, int] = {}
+        self._num_rows = 0
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._vectors = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._append_lock:
+            self._load()
+
+    @staticmethod
+    def key(model_name: str, text: str) -> bytes:
+        """Hash the model name and whitespace-normalized text into a cache key."""
+        normalized = " ".join(text.split())
+        digest = hashlib.blake2b(digest_size=EmbeddingCache.KEY_SIZE)
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalized.encode("utf-8"))
+        return digest.digest()
+
+    def _load(self):
+        """Read the key file and memory-map the vectors written so far."""
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("dimension") != self.dimension:
+                raise ValueError(
+                    f"Embedding cache at {self.cache_dir} has dimension "
+                    f"{meta.get('dimension')}, expected {self.dimension}"
+                )
+        else:
+            with open(self._meta_path, "w") as f:
+                json.dump({"dimension": self.dimension}, f)
+
+        keys = b""
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb") as f:
+                keys = f.read()
+
+        row_bytes = self.dimension * 4
+        vector_rows = 0
+        if os.path.exists(self._vectors_path):
+            vector_rows = os.path.getsize(self._vectors_path) // row_bytes
+
+        # A crash between the two appends can leave a key without its vector
+        num_rows = min(len(keys) // self.KEY_SIZE, vector_rows)
+        for row in range(num_rows):
+            self._rows[keys[row * self.KEY_SIZE:(row + 1) * self.KEY_SIZE]] = row
+
+        # Drop any torn tail so later appends stay aligned
+        if os.path.exists(self._keys_path):
+            os.truncate(self._keys_path, num_rows * self.KEY_SIZE)
+        if os.path.exists(self._vectors_path):
+            os.truncate(self._vectors_path, num_rows * row_bytes)
+
+        self._num_rows = num_rows
+        self._remap()
+        logger.info(f"Embedding cache loaded {num_rows} vectors from {self.cache_dir}")
+
+    def _remap(self):
+        """(Re)open the memory map so it covers every row written to disk."""
+        if self._num_rows == 0:
+            self._vectors = np.empty((0, self.dimension), dtype=np.float32)
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                  shape=(self._num_rows, self.dimension))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._memory or key in self._rows
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return the cached vector for key, or None on a miss."""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            if row >= len(self._vectors):
+                self._remap()
+
+            vector = np.array(self._vectors[row])
+            self._remember(key, vector)
+            return vector
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Look up several keys at once, returning None for each miss."""
+        with self._lock:
+            return [self.get(key) for key in keys]
+
+    def put(self, key: bytes, vector: np.ndarray):
+        """Store a single vector under key."""
+        self.put_many([key], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Append vectors for keys not already cached."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dimension)
+
+        with self._lock:
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(vector)
+                self._remember(key, vector.copy())
+
+            if not new_keys:
+                return
+
+            with self._append_lock:
+                # Another instance may have appended since we loaded
+                first_row = 0
+                if os.path.exists(self._keys_path):
+                    first_row = os.path.getsize(self._keys_path) // self.KEY_SIZE
+
+                # Vectors go first so a partial write never exposes a key without data
+                with open(self._vectors_path, "ab") as f:
+                    f.write(np.ascontiguousarray(np.stack(new_rows)).tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.write(b"".join(new_keys))
+
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = first_row + offset
+            self._num_rows = first_row + len(new_keys)
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Insert into the in-memory LRU, evicting the least recently used entry."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
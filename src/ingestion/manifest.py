@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ManifestChanges:
+    """Files that differ between the manifest and the source tree."""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> List[str]:
+        """Files whose chunks must be (re)built."""
+        return self.added + self.modified
+
+
+class IngestionManifest:
+    """
+    Records the path, mtime, size and content hash of every ingested file.
+
+    Comparing a source tree against the manifest only hashes files whose
+    mtime or size moved, so an unchanged corpus is checked with one stat
+    call per file.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: JSON file the manifest is stored in. It is created on save.
+        """
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)["files"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Ignoring unreadable ingestion manifest {path}: {e}")
+                self.entries = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def compare(self, file_paths: Iterable[str]) -> ManifestChanges:
+        """
+        Classify file_paths against the manifest. Files that were touched but
+        kept their content are reported unchanged and get their stat refreshed.
+        """
+        changes = ManifestChanges()
+        seen = set()
+
+        for file_path in file_paths:
+            seen.add(file_path)
+            entry = self.entries.get(file_path)
+            if entry is None:
+                changes.added.append(file_path)
+                continue
+
+            stat = os.stat(file_path)
+            if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                changes.unchanged.append(file_path)
+            elif entry["sha256"] == self.hash_file(file_path):
+                entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                changes.unchanged.append(file_path)
+            else:
+                changes.modified.append(file_path)
+
+        changes.removed = [file_path for file_path in self.entries if file_path not in seen]
+        return changes
+
+    @classmethod
+    def describe(cls, file_path: str) -> Dict:
+        """The manifest entry for a file as it is on disk now."""
+        stat = os.stat(file_path)
+        return {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": cls.hash_file(file_path)
+        }
+
+    def record(self, file_path: str, entry: Dict = None):
+        """
+        Store the entry of an ingested file.
+
+        :param entry: An entry taken with describe before the file was read, so an
+            edit made during ingestion is detected on the next run. Defaults to
+            describing the file now.
+        """
+        self.entries[file_path] = entry if entry is not None else self.describe(file_path)
+
+    def forget(self, file_path: str):
+        self.entries.pop(file_path, None)
+
+    def clear(self):
+        self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run leaves the old one intact."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,234 @@
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from .document import Document, DocumentLoader
+from .preprocessor import DocumentPreprocessor, DEFAULT_STEPS
+from .chunker import TextChunker, TextChunk
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _StageError:
+    """Carries an exception raised in a stage thread to the consumer."""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class IngestionPipeline:
+    """
+    Streams files through loading, preprocessing and chunking.
+
+    Files are read on a thread pool, cleaned and chunked on a second thread
+    (or sharded across a process pool with num_processes > 1), and handed to
+    the consumer (typically VectorStore.add_documents, which embeds them batch
+    by batch). Bounded queues between the stages let I/O, text processing and
+    embedding overlap while keeping at most a few documents and chunks in memory.
+    """
+
+    def __init__(self,
+                 loader: DocumentLoader = None,
+                 chunker: TextChunker = None,
+                 chunk_method: str = "sliding_window",
+                 preprocess: bool = True,
+                 preprocess_steps: Sequence[str] = DEFAULT_STEPS,
+                 num_workers: int = 4,
+                 queue_size: int = 64,
+                 num_processes: int = 0,
+                 process_chunksize: int = 4,
+                 ordered: bool = False):
+        """
+        :param loader: Reads the files, defaults to a DocumentLoader.
+        :param chunker: Splits documents into chunks, defaults to a TextChunker.
+        :param chunk_method: Chunking method passed to TextChunker.chunk_document.
+        :param preprocess: Clean documents with DocumentPreprocessor before chunking.
+        :param preprocess_steps: Cleaning steps to run, see DocumentPreprocessor.clean_document.
+        :param num_workers: Number of file reader threads.
+        :param queue_size: Capacity of each queue between stages.
+        :param num_processes: Number of processes cleaning and chunking documents
+            (0 or 1 processes them on a thread of this process).
+        :param process_chunksize: Documents sent to a worker process per task.
+        :param ordered: Yield chunks in the order of the input files instead of
+            the order in which files finish loading.
+        """
+        self.loader = loader if loader is not None else DocumentLoader()
+        self.chunker = chunker if chunker is not None else TextChunker()
+        self.chunk_method = chunk_method
+        self.preprocess = preprocess
+        self.preprocess_steps = tuple(preprocess_steps)
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.num_processes = num_processes
+        self.process_chunksize = process_chunksize
+        self.ordered = ordered
+
+        if num_processes > 1 and chunk_method == "semantic" and self.chunker.embedding_model is not None:
+            raise ValueError("Semantic chunking with an embedding model cannot run in worker processes")
+
+        self.stats = {"documents": 0, "chunks": 0}
+
+    def process_document(self, document: Document) -> List[TextChunk]:
+        """Clean and chunk a single document."""
+        return _clean_and_chunk(self._processing_config(), document)
+
+    def process_documents(self, documents: Iterable[Document]) -> Iterator[TextChunk]:
+        """
+        Clean and chunk documents, in this process or sharded across a process
+        pool. Chunks come out in the order of the input documents either way.
+        """
+        if self.num_processes <= 1:
+            for document in documents:
+                yield from self.process_document(document)
+            return
+
+        documents = iter(documents)
+        with ProcessPoolExecutor(max_workers=self.num_processes,
+                                 initializer=_init_worker,
+                                 initargs=(self._processing_config(),)) as executor:
+            # A bounded window of tasks keeps the workers busy without reading
+            # ahead of the consumer; results are taken in submission order
+            pending = deque()
+            try:
+                while True:
+                    while len(pending) < 2 * self.num_processes:
+                        batch = list(islice(documents, self.process_chunksize))
+                        if not batch:
+                            break
+                        pending.append(executor.submit(_process_batch, batch))
+                    if not pending:
+                        break
+                    yield from pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _processing_config(self) -> tuple:
+        steps = self.preprocess_steps if self.preprocess else None
+        return self.chunker, self.chunk_method, steps
+
+    def iter_chunks(self, file_paths: Iterable[str]) -> Iterator[TextChunk]:
+        """
+        Yield the chunks of every file as soon as they are produced.
+
+        Closing the generator early stops the stage threads.
+        """
+        self.stats = {"documents": 0, "chunks": 0}
+        documents = queue.Queue(maxsize=self.queue_size)
+        chunks = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def load():
+            try:
+                for document in self.loader.iter_documents(file_paths, num_workers=self.num_workers,
+                                                           ordered=self.ordered):
+                    if not _put(documents, document, stop):
+                        return
+                _put(documents, _DONE, stop)
+            except BaseException as e:
+                _put(documents, _StageError(e), stop)
+
+        def received():
+            while True:
+                document = _get(documents, stop)
+                if document is None or document is _DONE:
+                    return
+                if isinstance(document, _StageError):
+                    raise document.error
+                self.stats["documents"] += 1
+                yield document
+
+        def process():
+            try:
+                for chunk in self.process_documents(received()):
+                    if not _put(chunks, chunk, stop):
+                        return
+                _put(chunks, _DONE, stop)
+            except BaseException as e:
+                _put(chunks, _StageError(e), stop)
+
+        threads = [threading.Thread(target=load, name="ingest-load", daemon=True),
+                   threading.Thread(target=process, name="ingest-process", daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _DONE:
+                    break
+                if isinstance(chunk, _StageError):
+                    logger.error(f"Ingestion failed: {chunk.error}")
+                    raise chunk.error
+                self.stats["chunks"] += 1
+                yield chunk
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def iter_directory(self, dir_path: str, recursive: bool = True) -> Iterator[TextChunk]:
+        """Yield the chunks of every supported file in a directory."""
+        return self.iter_chunks(self.loader.list_directory(dir_path, recursive))
+
+    def run(self, dir_path: str, vector_store, recursive: bool = True,
+            batch_size: int = 100) -> Dict[str, Any]:
+        """
+        Ingest a directory into a vector store.
+
+        :return: The result of vector_store.add_documents plus the document count.
+        """
+        result = vector_store.add_documents(self.iter_directory(dir_path, recursive),
+                                            batch_size=batch_size)
+        return {**result, "documents": self.stats["documents"]}
+
+
+def _clean_and_chunk(config: tuple, document: Document) -> List[TextChunk]:
+    chunker, chunk_method, steps = config
+    if steps is not None:
+        document = Document(content=DocumentPreprocessor.clean_document(document.content, steps),
+                            metadata=document.metadata,
+                            src=document.src)
+    return chunker.chunk_document(document, chunk_method=chunk_method)
+
+
+# Set in each worker process by _init_worker, so the chunker is pickled once per process
+_worker_config = None
+
+
+def _init_worker(config: tuple):
+    global _worker_config
+    _worker_config = config
+
+
+def _process_batch(documents: List[Document]) -> List[TextChunk]:
+    chunks = []
+    for document in documents:
+        chunks.extend(_clean_and_chunk(_worker_config, document))
+    return chunks
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put an item, giving up if the pipeline is stopped. Returns False when stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Get an item, or None if the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
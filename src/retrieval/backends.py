@@ -0,0 +1,92 @@
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreBackend:
+    """
+    Storage behind a VectorStore.
+
+    A backend hands out collections by name. VectorStore only uses the part
+    of Chroma's Collection API listed here, so a collection must provide:
+
+    - id and metadata attributes, and modify(metadata=...)
+    - count()
+    - get(ids=None, where=None, include=[...], limit=None, offset=None)
+      -> {"ids", "metadatas", "documents"}, in a stable order so that
+      limit/offset page through the collection
+    - upsert(ids, metadatas, documents, embeddings)
+    - delete(ids=None, where=None)
+    - query(query_embeddings, n_results, include=[...]) -> one list per query
+      under "ids", "distances", "metadatas" and "documents", with squared L2
+      distances between normalized embeddings unless the collection metadata
+      sets "hnsw:space"
+    """
+
+    @property
+    def client(self):
+        """The underlying client, or the backend itself."""
+        return self
+
+    def get_or_create_collection(self, name: str, metadata: Dict[str, Any] = None):
+        raise NotImplementedError
+
+    def delete_collection(self, name: str):
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorStoreBackend):
+    """Collections of a persistent Chroma client."""
+
+    def __init__(self, persist_directory: str):
+        import chromadb
+        from chromadb.config import Settings
+
+        try:
+            self._client = chromadb.PersistentClient(
+                path=persist_directory,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
+            )
+            logger.info(f"Chroma client initialized with persistence at: {persist_directory}")
+        except Exception as e:
+            logger.error(f"Failed to initialize Chroma client: {e}")
+            raise RuntimeError(f"Chroma client initialization error: {e}")
+
+    @property
+    def client(self):
+        return self._client
+
+    def get_or_create_collection(self, name: str, metadata: Dict[str, Any] = None):
+        # Try to get the existing collection
+        try:
+            collection = self._client.get_collection(name=name)
+            logger.info(f"Using existing collection: {name}")
+        except Exception:
+            # If it doesn't exist, create a new one
+            collection = self._client.create_collection(name=name, metadata=metadata)
+            logger.info(f"Created new collection: {name}")
+        return collection
+
+    def delete_collection(self, name: str):
+        self._client.delete_collection(name=name)
+
+
+BACKENDS = ("chroma", "local")
+
+
+def create_backend(backend: str, persist_directory: str, **options) -> VectorStoreBackend:
+    """
+    :param backend: "chroma", or "local" for a LocalBackend.
+    :param options: Passed to the LocalBackend, e.g. index="ivf".
+    """
+    if backend == "chroma":
+        return ChromaBackend(persist_directory)
+    elif backend == "local":
+        from .local_store import LocalBackend
+        return LocalBackend(persist_directory, **options)
+    else:
+        raise ValueError(f"Unsupported vector store backend: {backend}")
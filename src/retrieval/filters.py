@@ -0,0 +1,210 @@
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+
+class MetadataIndex:
+    """
+    Per-field postings of metadata values, to evaluate Chroma where filters
+    without decoding any metadata.
+
+    Each (field, value) pair maps to the slots whose metadata holds that
+    value. A filter becomes a boolean mask over slots: equality and $in read
+    the postings of their values, and range operators slice the field's
+    postings ordered by value. Deleting a document leaves its slot in the
+    postings, so callers combine the mask with their own liveness mask.
+
+    Postings can also be loaded from a read-only base segment (see load),
+    e.g. the memory-mapped sections of a keyword index snapshot. Its keys are
+    only decoded when a filter first needs them.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._base_source = None
+        # Per field: value -> index of the value's slots in the base offsets
+        self._base_keys: Dict[str, Dict[Any, int]] = {}
+        self._base_offsets = self._base_slots = None
+        self._postings: Dict[str, Dict[Any, array]] = {}
+        # Per field and kind of value: (sorted values, postings offsets, slots in value order)
+        self._ranges: Dict[Tuple[str, bool], Tuple[List[Any], np.ndarray, np.ndarray]] = {}
+
+    def add(self, slot: int, metadata: Dict[str, Any]):
+        """Index the scalar values of one document's metadata."""
+        for field, value in (metadata or {}).items():
+            if not isinstance(value, (str, int, float)):
+                continue
+            values = self._postings.setdefault(field, {})
+            postings = values.get(value)
+            if postings is None:
+                postings = values[value] = array('i')
+            postings.append(slot)
+            self._ranges.pop((field, False), None)
+            self._ranges.pop((field, True), None)
+
+    def load(self, keys: bytes, offsets: np.ndarray, slots: np.ndarray):
+        """
+        Use the postings of a base segment, replacing the current contents.
+
+        :param keys: JSON list of the (field, value) pairs, as returned by items.
+        :param offsets: (len(keys) + 1) start offsets of each pair's slots.
+        :param slots: Concatenated slots of every pair.
+        """
+        self.clear()
+        self._base_source = keys
+        self._base_offsets = offsets
+        self._base_slots = slots
+
+    def _base(self) -> Dict[str, Dict[Any, int]]:
+        if self._base_source is not None:
+            for i, (field, value) in enumerate(json.loads(bytes(self._base_source))):
+                self._base_keys.setdefault(field, {})[value] = i
+            self._base_source = None
+        return self._base_keys
+
+    def retain(self, live: np.ndarray):
+        """Drop slots that are False in live from the in-memory postings."""
+        for field, values in self._postings.items():
+            for value, postings in list(values.items()):
+                slots = np.frombuffer(postings, dtype=np.intc)
+                kept = slots[live[slots]]
+                if len(kept):
+                    values[value] = array('i', kept.tobytes())
+                else:
+                    del values[value]
+        self._ranges.clear()
+
+    def postings(self, field: str, value: Any) -> np.ndarray:
+        """Slots whose metadata has field == value, from both segments."""
+        parts = []
+        base = self._base().get(field, {}).get(value)
+        if base is not None:
+            parts.append(self._base_slots[self._base_offsets[base]:self._base_offsets[base + 1]])
+        postings = self._postings.get(field, {}).get(value)
+        if postings is not None:
+            parts.append(np.frombuffer(postings, dtype=np.intc))
+        if not parts:
+            return np.empty(0, dtype=np.intc)
+        # Concatenating copies, so no view of the growable arrays escapes
+        return np.concatenate(parts)
+
+    def values(self, field: str) -> List[Any]:
+        return list(dict.fromkeys([*self._base().get(field, {}), *self._postings.get(field, {})]))
+
+    def items(self) -> Iterator[Tuple[str, Any, np.ndarray]]:
+        """(field, value, slots) for every indexed pair."""
+        for field in dict.fromkeys([*self._base(), *self._postings]):
+            for value in self.values(field):
+                yield field, value, self.postings(field, value)
+
+    def mask(self, where: Dict[str, Any], num_slots: int) -> np.ndarray:
+        """
+        Evaluate a where filter over slots 0 .. num_slots - 1, with the same
+        semantics as matches_where.
+
+        :return: A boolean array of length num_slots.
+        """
+        mask = np.ones(num_slots, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.mask(clause, num_slots)
+            elif key == "$or":
+                matched = np.zeros(num_slots, dtype=bool)
+                for clause in condition:
+                    matched |= self.mask(clause, num_slots)
+                mask &= matched
+            elif isinstance(condition, dict):
+                for operator, operand in condition.items():
+                    mask &= self._match(key, operator, operand, num_slots)
+            else:
+                mask &= self._match(key, "$eq", condition, num_slots)
+        return mask
+
+    def _match(self, field: str, operator: str, operand, num_slots: int) -> np.ndarray:
+        if operator in ("$eq", "$ne"):
+            operand = [operand]
+        elif operator in RANGE_OPERATORS:
+            return self._match_range(field, operator, operand, num_slots)
+        elif operator not in ("$in", "$nin"):
+            raise ValueError(f"Unsupported where operator: {operator}")
+
+        mask = np.zeros(num_slots, dtype=bool)
+        for value in operand:
+            mask[self.postings(field, value)] = True
+        return ~mask if operator in ("$ne", "$nin") else mask
+
+    def _match_range(self, field: str, operator: str, operand, num_slots: int) -> np.ndarray:
+        # Strings only compare with strings and numbers with numbers
+        values, offsets, slots = self._range(field, isinstance(operand, str))
+        lo, hi = 0, len(values)
+        if operator == "$gt":
+            lo = bisect_right(values, operand)
+        elif operator == "$gte":
+            lo = bisect_left(values, operand)
+        elif operator == "$lt":
+            hi = bisect_left(values, operand)
+        else:
+            hi = bisect_right(values, operand)
+
+        mask = np.zeros(num_slots, dtype=bool)
+        if lo < hi:
+            mask[slots[offsets[lo]:offsets[hi]]] = True
+        return mask
+
+    def _range(self, field: str, strings: bool) -> Tuple[List[Any], np.ndarray, np.ndarray]:
+        key = (field, strings)
+        if key not in self._ranges:
+            values = sorted(value for value in self.values(field) if isinstance(value, str) == strings)
+            postings = [self.postings(field, value) for value in values]
+            offsets = np.concatenate([[0], np.cumsum([len(slots) for slots in postings])]).astype(np.int64)
+            slots = np.concatenate(postings) if postings else np.empty(0, dtype=np.intc)
+            self._ranges[key] = (values, offsets, slots)
+        return self._ranges[key]
+
+
+def matches_where(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluate a Chroma where filter, e.g. {"file_path": {"$in": [...]}}, on one metadata dict."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if not _compare(metadata.get(key), operator, operand, key in metadata):
+                    return False
+        elif metadata.get(key) != condition or key not in metadata:
+            return False
+    return True
+
+
+def _compare(value, operator: str, operand, present: bool) -> bool:
+    if operator == "$eq":
+        return present and value == operand
+    if operator == "$ne":
+        return not present or value != operand
+    if operator == "$in":
+        return present and value in operand
+    if operator == "$nin":
+        return not present or value not in operand
+    if operator in RANGE_OPERATORS:
+        if not present or isinstance(value, str) != isinstance(operand, str):
+            return False
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        return value <= operand
+    raise ValueError(f"Unsupported where operator: {operator}")
@@ -0,0 +1,82 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def _select_top_k(ids: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick the top_k scores with a partial sort, then order just those."""
+    if top_k <= 0:
+        return ids[:0], scores[:0]
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+def _union(dense_ids: Sequence[str], sparse_ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Map both candidate lists onto one array of unique ids.
+
+    :return: (unique ids, positions of dense_ids in it, positions of sparse_ids in it)
+    """
+    all_ids = np.asarray(list(dense_ids) + list(sparse_ids), dtype=object)
+    if not len(all_ids):
+        return all_ids, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    unique_ids, inverse = np.unique(all_ids, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return unique_ids, inverse[:len(dense_ids)], inverse[len(dense_ids):]
+
+
+def weighted_fusion(dense_ids: Sequence[str], dense_scores: np.ndarray,
+                    sparse_ids: Sequence[str], sparse_scores: np.ndarray,
+                    alpha: float, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Combine dense similarities and keyword scores with a weighted sum.
+
+    Dense scores are expected to be similarities (higher is better) and keyword
+    scores are divided by their maximum so both legs fall in a comparable range.
+    A document missing from one leg contributes 0 for it.
+
+    :param dense_ids: Ids returned by vector search.
+    :param dense_scores: Similarities for dense_ids.
+    :param sparse_ids: Ids returned by keyword search.
+    :param sparse_scores: BM25 scores for sparse_ids.
+    :param alpha: Weight of the dense leg (0 <= alpha <= 1).
+    :param top_k: Number of results to keep.
+    :return: (ids, fused scores) sorted by descending score.
+    """
+    unique_ids, dense_pos, sparse_pos = _union(dense_ids, sparse_ids)
+
+    sparse_scores = np.asarray(sparse_scores, dtype=np.float64)
+    max_sparse = sparse_scores.max() if len(sparse_scores) and sparse_scores.max() > 0 else 1.0
+
+    fused = np.zeros(len(unique_ids), dtype=np.float64)
+    np.add.at(fused, dense_pos, alpha * np.asarray(dense_scores, dtype=np.float64))
+    np.add.at(fused, sparse_pos, (1 - alpha) * sparse_scores / max_sparse)
+
+    return _select_top_k(unique_ids, fused, top_k)
+
+
+def reciprocal_rank_fusion(dense_ids: Sequence[str], sparse_ids: Sequence[str],
+                           top_k: int, k: int = 60, alpha: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Combine two ranked lists with (weighted) reciprocal-rank fusion.
+
+    Each document scores alpha / (k + dense rank) + (1 - alpha) / (k + sparse rank),
+    so only the order of each leg matters, not the scale of its scores.
+
+    :param dense_ids: Ids returned by vector search, best first.
+    :param sparse_ids: Ids returned by keyword search, best first.
+    :param top_k: Number of results to keep.
+    :param k: Rank smoothing constant.
+    :param alpha: Weight of the dense leg (0.5 gives standard RRF up to a constant factor).
+    :return: (ids, fused scores) sorted by descending score.
+    """
+    unique_ids, dense_pos, sparse_pos = _union(dense_ids, sparse_ids)
+
+    fused = np.zeros(len(unique_ids), dtype=np.float64)
+    np.add.at(fused, dense_pos, alpha / (k + np.arange(1, len(dense_pos) + 1)))
+    np.add.at(fused, sparse_pos, (1 - alpha) / (k + np.arange(1, len(sparse_pos) + 1)))
+
+    return _select_top_k(unique_ids, fused, top_k)
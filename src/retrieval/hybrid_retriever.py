@@ -1,98 +1,281 @@
+import os
+import asyncio
+import logging
+import numpy as np
+from itertools import islice
+from concurrent.futures import Executor
 from .vector_store import VectorStore
-from rank_bm25 import BM25Okapi
-from typing import List
+from .keyword_index import KeywordIndex
+from .fusion import weighted_fusion, reciprocal_rank_fusion
+from typing import Dict, List, Optional
 from dataclasses import dataclass
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class RetrievalResult:
     id: str
     content: str
     score: float
+    # Only known for chunks the vector search also returned
+    metadata: Optional[Dict] = None
 
 class HybridRetriever:
-    def __init__(self, vector_store: VectorStore, alpha: int = 0.5):
+    FUSION_STRATEGIES = ("weighted", "rrf")
+
+    def __init__(self, vector_store: VectorStore, alpha: float = 0.5, keyword_candidates: int = 50,
+                 fusion: str = "weighted", rrf_k: int = 60):
         """
         Initialize the HybridRetriever with a vector store and alpha parameter.
 
         :param vector_store: An instance of VectorStore for vector-based retrieval.
         :param alpha: Weighting factor between vector and keyword search (0 <= alpha <= 1).
+        :param keyword_candidates: Number of top BM25 documents considered for fusion.
+        :param fusion: Score fusion strategy, "weighted" (weighted sum) or "rrf" (reciprocal rank).
+        :param rrf_k: Rank smoothing constant for reciprocal-rank fusion.
         """
+        if fusion not in self.FUSION_STRATEGIES:
+            raise ValueError(f"Unsupported fusion strategy: {fusion}")
+
         self.vector_store = vector_store
         self.alpha = alpha
-        self.documents = []
-        self.doc_ids = []
-        self.bm25 = None
+        self.keyword_candidates = keyword_candidates
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.keyword_index = KeywordIndex()
+        # Content version of the last saved or loaded snapshot
+        self._index_version = None
+
+        # Keep the keyword index in sync with writes to the vector store
+        self.vector_store.add_listener(self)
 
-    def index_documents(self, documents: List[str], doc_ids: List[str]):
+    @property
+    def documents(self) -> List[str]:
+        return self.keyword_index.documents()
+
+    @property
+    def doc_ids(self) -> List[str]:
+        return self.keyword_index.doc_ids()
+
+    def index_documents(self, documents: List[str], doc_ids: List[str], metadatas: List[Dict] = None):
         """
-        Index documents for BM25 keyword search.
+        Replace the BM25 keyword index with the given documents.
 
         :param documents: List of document texts to index.
         :param doc_ids: List of document IDs corresponding to the texts.
+        :param metadatas: Optional chunk metadata, needed for filtered searches.
+        """
+        self.keyword_index.clear()
+        self.keyword_index.add(doc_ids, documents, metadatas)
+
+    def add_documents(self, documents: List[str], doc_ids: List[str], metadatas: List[Dict] = None):
+        """
+        Add documents to the keyword index without rebuilding it.
+
+        :param documents: List of document texts to index.
+        :param doc_ids: List of document IDs corresponding to the texts.
+        :param metadatas: Optional chunk metadata, needed for filtered searches.
+        """
+        self.keyword_index.add(doc_ids, documents, metadatas)
+
+    def delete_documents(self, doc_ids: List[str]):
+        """
+        Remove documents from the keyword index.
+
+        :param doc_ids: List of document IDs to remove.
+        """
+        self.keyword_index.delete(doc_ids)
+
+    def save_index(self, path: str, version: str):
+        """
+        Save the keyword index to a binary snapshot.
+
+        :param path: Snapshot file path.
+        :param version: Version of the indexed contents, see VectorStore.content_version.
+        """
+        self.keyword_index.save(path, version)
+        self._index_version = version
+
+    def save_index_if_changed(self, path: str) -> bool:
+        """
+        Save the keyword index unless the vector store's contents are the ones
+        of the last snapshot saved or loaded.
+
+        :return: True if a snapshot was written.
+        """
+        version = self.vector_store.content_version()
+        if version == self._index_version:
+            return False
+        self.save_index(path, version)
+        return True
+
+    def load_index(self, path: str, version: str) -> bool:
+        """
+        Memory-map a keyword index snapshot if it matches the expected version.
+
+        :param path: Snapshot file path.
+        :param version: Version the snapshot must have been saved with.
+        :return: True if the snapshot was loaded, False if it is missing or stale.
         """
-        self.documents = documents
-        self.doc_ids = doc_ids
+        if not os.path.exists(path):
+            return False
+
+        try:
+            snapshot_version = self.keyword_index.load(path)
+        except Exception as e:
+            logger.warning(f"Failed to load keyword index snapshot {path}: {e}")
+            self.keyword_index.clear()
+            return False
 
-        tokenized_docs = [doc.lower().split() for doc in documents]
-        self.bm25 = BM25Okapi(tokenized_docs)
+        if snapshot_version != version:
+            logger.info(f"Keyword index snapshot {path} is stale, it will be rebuilt.")
+            self.keyword_index.clear()
+            return False
+
+        self._index_version = version
+        return True
+
+    def load_or_build_index(self, path: str, page_size: int = 1000):
+        """
+        Memory-map the snapshot at path if it matches the vector store's
+        contents; otherwise index every stored document and save a new snapshot.
 
-    def search(self, query: str, top_k: int = 5) -> List[RetrievalResult]:
+        Documents are read and indexed page_size at a time, and the new
+        snapshot is then memory-mapped in place of the in-memory index.
+        """
+        version = self.vector_store.content_version()
+        if self.load_index(path, version):
+            logger.info(f"Loaded keyword index snapshot {path}")
+            return
+
+        self.keyword_index.clear()
+        documents = self.vector_store.iter_documents(page_size=page_size)
+        total = 0
+        while True:
+            page = list(islice(documents, page_size))
+            if not page:
+                break
+            self.add_documents([doc['content'] for doc in page],
+                               [doc['id'] for doc in page],
+                               [doc['metadata'] for doc in page])
+            total += len(page)
+        logger.info(f"Indexed {total} documents for hybrid search.")
+
+        self.save_index(path, version)
+        self.load_index(path, version)
+
+    def on_documents_added(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        """VectorStore listener hook, called after a batch is written."""
+        self.add_documents(documents, ids, metadatas)
+
+    def on_documents_deleted(self, ids: List[str]):
+        """VectorStore listener hook, called after documents are deleted."""
+        self.delete_documents(ids)
+
+    def on_collection_reset(self):
+        """VectorStore listener hook, called after the collection is recreated."""
+        self.keyword_index.clear()
+
+    def search(self, query: str, top_k: int = 5, where: Dict = None,
+               query_embedding: np.ndarray = None) -> List[RetrievalResult]:
         """
         Perform a hybrid search using both vector and keyword-based retrieval.
 
         :param query: The search query string.
         :param top_k: Number of top results to return.
+        :param where: Optional Chroma where filter on chunk metadata, e.g.
+            {"file_name": "lecture3.pdf"} or {"chunk_index": {"$lt": 20}}.
+            Both searches apply it before ranking, so every result matches it.
+        :param query_embedding: The query's embedding, if the caller already has it.
         :return: List of RetrievalResult objects containing the top_k results.
         """
+        return self._fuse(self._dense_search(query, top_k, where, query_embedding),
+                          self._sparse_search(query, top_k, where), top_k)
 
-        # Vector search
-        vector_results = self.vector_store.search(query, top_k)
+    async def asearch(self, query: str, top_k: int = 5, executor: Executor = None,
+                      where: Dict = None, query_embedding: np.ndarray = None) -> List[RetrievalResult]:
+        """
+        Like search, but run the vector and keyword searches concurrently on
+        executor (the event loop's default executor if None), so retrieval takes
+        as long as the slower of the two.
+        """
+        loop = asyncio.get_running_loop()
+        dense, sparse = await asyncio.gather(
+            loop.run_in_executor(executor, self._dense_search, query, top_k, where, query_embedding),
+            loop.run_in_executor(executor, self._sparse_search, query, top_k, where)
+        )
+        return self._fuse(dense, sparse, top_k)
 
-        # BM25 Search
-        bm25_scores = self.bm25.get_scores(query.lower().split())
+    def search_batch(self, queries: List[str], top_k: int = 5, where: Dict = None,
+                     query_embeddings: np.ndarray = None) -> List[List[RetrievalResult]]:
+        """
+        Hybrid search for many queries, with one batched vector search and one
+        batched BM25 scoring pass.
 
-        # Combine results
-        hybrid_scores = {}
+        :param where: Optional metadata filter applied to every query, see search.
+        :param query_embeddings: Embeddings of the queries, if the caller already has them.
+        :return: The results of each query, in order, as returned by search.
+        """
+        dense = [response['results'] if response else []
+                 for response in self.vector_store.search_batch(queries, top_k, where, query_embeddings)]
+        sparse = [self._live_sparse(slots, scores) for slots, scores in
+                  self.keyword_index.top_n_batch(queries, max(top_k, self.keyword_candidates), where)]
+        return [self._fuse(dense_results, sparse_results, top_k)
+                for dense_results, sparse_results in zip(dense, sparse)]
 
-        for result in vector_results['results']:
-            doc_id = result['id']
-            vector_score = result.get('score', 0)
+    def _dense_search(self, query: str, top_k: int, where: Dict = None,
+                      query_embedding: np.ndarray = None) -> List[Dict]:
+        vector_results = self.vector_store.search(query, top_k, where, query_embedding)
+        return vector_results['results'] if vector_results else []
 
-            hybrid_scores[doc_id] = {
-                'vector_score': vector_score,
-                'bm25_score': 0,
-                'content': result.get('content', ''),
-            }
+    def _sparse_search(self, query: str, top_k: int, where: Dict = None):
+        """BM25 search, scoring only documents that contain a query term."""
+        bm25_slots, bm25_scores = self.keyword_index.top_n(query, max(top_k, self.keyword_candidates), where)
+        return self._live_sparse(bm25_slots, bm25_scores)
 
-        max_bm25 = max(bm25_scores) if max(bm25_scores) > 0 else 1
+    def _live_sparse(self, bm25_slots: np.ndarray, bm25_scores: np.ndarray):
+        """(ids, slots, scores) of the BM25 hits whose documents still exist."""
+        sparse_ids = [self.keyword_index.doc_id(slot) for slot in bm25_slots]
 
-        for i, score in enumerate(bm25_scores):
-            doc_ids = self.doc_ids[i]
-            normalized_score = score / max_bm25
+        # A concurrent delete can empty a slot between scoring and lookup
+        if None in sparse_ids:
+            keep = np.array([doc_id is not None for doc_id in sparse_ids])
+            bm25_slots, bm25_scores = bm25_slots[keep], bm25_scores[keep]
+            sparse_ids = [doc_id for doc_id in sparse_ids if doc_id is not None]
 
-            if doc_id in hybrid_scores:
-                hybrid_scores[doc_id]['bm25_score'] = normalized_score
-            else:
-                hybrid_scores[doc_id] = {
-                    'vector_score': 0,
-                    'bm25_score': normalized_score,
-                    'content': self.documents[i],
-                }
+        return sparse_ids, bm25_slots, bm25_scores
+
+    def _fuse(self, dense: List[Dict], sparse, top_k: int) -> List[RetrievalResult]:
+        dense_ids = [result['id'] for result in dense]
+        dense_scores = np.array([result['similarity'] for result in dense], dtype=np.float64)
+        sparse_ids, bm25_slots, bm25_scores = sparse
+
+        # Combine results
+        if self.fusion == "rrf":
+            fused_ids, fused_scores = reciprocal_rank_fusion(dense_ids, sparse_ids, top_k,
+                                                             k=self.rrf_k, alpha=self.alpha)
+        else:
+            fused_ids, fused_scores = weighted_fusion(dense_ids, dense_scores,
+                                                      sparse_ids, bm25_scores,
+                                                      alpha=self.alpha, top_k=top_k)
+
+        # Only the winners need their content looked up
+        dense_content = {result['id']: result.get('content', '') for result in dense}
+        dense_metadata = {result['id']: result.get('metadata') for result in dense}
+        sparse_slots = dict(zip(sparse_ids, bm25_slots))
 
-        # Calculate final scores and prepare results
         results = []
-        for doc_id, scores in hybrid_scores.items():
-            final_score = (
-                self.alpha * scores['vector_score'] +
-                (1 - self.alpha) * scores['bm25_score']
-            )
+        for doc_id, score in zip(fused_ids, fused_scores):
+            if doc_id in dense_content:
+                content = dense_content[doc_id]
+            else:
+                content = self.keyword_index.text(sparse_slots[doc_id]) or ''
 
             results.append(RetrievalResult(
                 id=doc_id,
-                content=scores['content'],
-                score=final_score
+                content=content,
+                score=float(score),
+                metadata=dense_metadata.get(doc_id)
             ))
 
-        # Sort and return top_k results
-        results.sort(key=lambda x: x.score, reverse=True)
-        return results[:top_k]
+        return results
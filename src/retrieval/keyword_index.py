@@ -0,0 +1,718 @@
+import os
+import json
+import math
+import logging
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .filters import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"KWIDX002"
+
+# Upper bound on the cells of a (queries x candidates) score matrix in top_n_batch
+_MAX_BATCH_CELLS = 1 << 22
+
+
+class _Snapshot:
+    """
+    A read-only, memory-mapped keyword index segment written by KeywordIndex.save.
+
+    Nothing is decoded up front: terms and document ids are found by binary
+    search over sorted blobs, and postings, lengths and texts are sliced out
+    of the memory map only when a query or lookup touches them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+        magic_size = len(SNAPSHOT_MAGIC)
+        if bytes(self._buffer[:magic_size]) != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a keyword index snapshot: {path}")
+
+        header_size = int(self._buffer[magic_size:magic_size + 8].view("<u8")[0])
+        header_start = magic_size + 8
+        self.header = json.loads(bytes(self._buffer[header_start:header_start + header_size]))
+
+        self.version = self.header["version"]
+        self.num_slots = self.header["num_slots"]
+        self.num_terms = self.header["num_terms"]
+        self.total_length = self.header["total_length"]
+
+        self.term_offsets = self._section("term_offsets")
+        self.term_blob = self._section("term_blob")
+        self.postings_offsets = self._section("postings_offsets")
+        self.postings_slots = self._section("postings_slots")
+        self.postings_tfs = self._section("postings_tfs")
+        self.lengths = self._section("lengths")
+        self.id_offsets = self._section("id_offsets")
+        self.id_blob = self._section("id_blob")
+        self.id_order = self._section("id_order")
+        self.text_offsets = self._section("text_offsets")
+        self.text_blob = self._section("text_blob")
+        self.doc_term_offsets = self._section("doc_term_offsets")
+        self.doc_terms = self._section("doc_terms")
+        self.filter_keys = self._section("filter_keys")
+        self.filter_offsets = self._section("filter_offsets")
+        self.filter_slots = self._section("filter_slots")
+
+    def _section(self, name: str) -> np.ndarray:
+        offset, dtype, count = self.header["sections"][name]
+        dtype = np.dtype(dtype)
+        return self._buffer[offset:offset + count * dtype.itemsize].view(dtype)
+
+    def term(self, term_index: int) -> str:
+        start, end = self.term_offsets[term_index], self.term_offsets[term_index + 1]
+        return self.term_blob[start:end].tobytes().decode("utf-8")
+
+    def find_term(self, term: str) -> int:
+        """Return the index of term in the sorted vocabulary, or -1."""
+        target = term.encode("utf-8")
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = self.term_offsets[mid], self.term_offsets[mid + 1]
+            candidate = self.term_blob[start:end].tobytes()
+            if candidate < target:
+                lo = mid + 1
+            elif candidate > target:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def postings(self, term_index: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.postings_offsets[term_index], self.postings_offsets[term_index + 1]
+        return self.postings_slots[start:end], self.postings_tfs[start:end]
+
+    def doc_frequency(self, term_index: int) -> int:
+        return int(self.postings_offsets[term_index + 1] - self.postings_offsets[term_index])
+
+    def _id_bytes(self, slot: int) -> bytes:
+        start, end = self.id_offsets[slot], self.id_offsets[slot + 1]
+        return self.id_blob[start:end].tobytes()
+
+    def doc_id(self, slot: int) -> str:
+        return self._id_bytes(slot).decode("utf-8")
+
+    def find_slot(self, doc_id: str) -> int:
+        """Return the slot holding doc_id, or -1."""
+        target = doc_id.encode("utf-8")
+        lo, hi = 0, self.num_slots
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = self._id_bytes(int(self.id_order[mid]))
+            if candidate < target:
+                lo = mid + 1
+            elif candidate > target:
+                hi = mid
+            else:
+                return int(self.id_order[mid])
+        return -1
+
+    def text(self, slot: int) -> str:
+        start, end = self.text_offsets[slot], self.text_offsets[slot + 1]
+        return self.text_blob[start:end].tobytes().decode("utf-8")
+
+    def terms_of(self, slot: int) -> List[str]:
+        start, end = self.doc_term_offsets[slot], self.doc_term_offsets[slot + 1]
+        return [self.term(int(term_index)) for term_index in self.doc_terms[start:end]]
+
+
+class KeywordIndex:
+    """
+    An incremental BM25 inverted index.
+
+    Documents live in integer slots. Each term maps to a postings list of
+    (slot, term frequency) pairs, and document-frequency and length
+    statistics are updated as documents are added or deleted, so the index
+    never has to be rebuilt from the whole corpus.
+
+    The index can be saved to a single binary snapshot. A loaded snapshot
+    becomes a read-only, memory-mapped base segment occupying the first
+    slots; later additions go to an in-memory segment after it, and
+    deletions of base documents are recorded as tombstones.
+
+    Documents added with metadata can be searched with a Chroma-style where
+    filter. The filter is evaluated on per-field postings (see MetadataIndex)
+    before scoring, so only the postings of matching documents are scored.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        :param k1: BM25 term-frequency saturation parameter.
+        :param b: BM25 document-length normalization parameter.
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return text.lower().split()
+
+    def clear(self):
+        """Remove every document from the index."""
+        with self._lock:
+            self._reset(base=None)
+
+    def _reset(self, base: Optional[_Snapshot]):
+        self._base = base
+        self._base_slots = base.num_slots if base is not None else 0
+        self._base_alive = None
+        self._base_terms: Dict[str, int] = {}
+
+        # In-memory segment, indexed by slot - self._base_slots
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._texts: List[Optional[str]] = []
+        self._terms: List[Optional[Tuple[str, ...]]] = []
+        self._lengths = array('i')
+        self._alive = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._filters = MetadataIndex()
+        if base is not None:
+            self._filters.load(base.filter_keys, base.filter_offsets, base.filter_slots)
+
+        # Document frequencies on top of the base segment's (may be negative)
+        self._df: Dict[str, int] = {}
+        self._num_docs = self._base_slots
+        self._total_length = base.total_length if base is not None else 0
+        self._num_deleted = 0
+
+    def __len__(self) -> int:
+        return self._num_docs
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._find_slot(doc_id) is not None
+
+    @property
+    def num_slots(self) -> int:
+        return self._base_slots + len(self._ids)
+
+    @property
+    def avgdl(self) -> float:
+        return self._total_length / self._num_docs if self._num_docs else 0.0
+
+    def _is_base_alive(self, slot: int) -> bool:
+        return self._base_alive is None or bool(self._base_alive[slot])
+
+    def _find_slot(self, doc_id: str) -> Optional[int]:
+        slot = self._slots.get(doc_id)
+        if slot is not None:
+            return slot
+        if self._base is not None:
+            slot = self._base.find_slot(doc_id)
+            if slot >= 0 and self._is_base_alive(slot):
+                return slot
+        return None
+
+    def doc_id(self, slot: int) -> Optional[str]:
+        """
+        Return the document id stored in slot, or None if it was deleted or
+        the slot no longer exists because the index was cleared or reloaded.
+        """
+        slot = int(slot)
+        with self._lock:
+            if not 0 <= slot < self.num_slots:
+                return None
+            if slot < self._base_slots:
+                return self._base.doc_id(slot) if self._is_base_alive(slot) else None
+            return self._ids[slot - self._base_slots]
+
+    def text(self, slot: int) -> Optional[str]:
+        """Return the text stored in slot, or None like doc_id."""
+        slot = int(slot)
+        with self._lock:
+            if not 0 <= slot < self.num_slots:
+                return None
+            if slot < self._base_slots:
+                return self._base.text(slot) if self._is_base_alive(slot) else None
+            return self._texts[slot - self._base_slots]
+
+    def doc_ids(self) -> List[str]:
+        with self._lock:
+            return [doc_id for doc_id in map(self.doc_id, range(self.num_slots)) if doc_id is not None]
+
+    def documents(self) -> List[str]:
+        with self._lock:
+            return [text for text in map(self.text, range(self.num_slots)) if text is not None]
+
+    def add(self, doc_ids: List[str], documents: List[str], metadatas: List[Dict] = None):
+        """
+        Add documents to the index. Ids that are already indexed are replaced.
+
+        :param doc_ids: Document ids.
+        :param documents: Document texts, parallel to doc_ids.
+        :param metadatas: Optional metadata dicts, parallel to doc_ids, for where filters.
+        """
+        with self._lock:
+            for i, (doc_id, text) in enumerate(zip(doc_ids, documents)):
+                if self._find_slot(doc_id) is not None:
+                    self._delete_one(doc_id)
+
+                tokens = self.tokenize(text)
+                counts = Counter(tokens)
+                slot = self.num_slots
+
+                self._slots[doc_id] = slot
+                self._ids.append(doc_id)
+                self._texts.append(text)
+                self._terms.append(tuple(counts))
+                self._lengths.append(len(tokens))
+                self._alive.append(1)
+                if metadatas is not None:
+                    self._filters.add(slot, metadatas[i])
+
+                for term, tf in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('i'), array('i'))
+                    postings[0].append(slot)
+                    postings[1].append(tf)
+                    self._df[term] = self._df.get(term, 0) + 1
+
+                self._num_docs += 1
+                self._total_length += len(tokens)
+
+    def delete(self, doc_ids: List[str]):
+        """Delete documents from the index. Unknown ids are ignored."""
+        with self._lock:
+            for doc_id in doc_ids:
+                if self._find_slot(doc_id) is not None:
+                    self._delete_one(doc_id)
+
+            # Drop tombstoned postings once they make up a large part of the in-memory segment
+            if self._num_deleted > max(1024, len(self._ids) - self._num_deleted):
+                self._compact()
+
+    def _delete_one(self, doc_id: str):
+        slot = self._find_slot(doc_id)
+
+        if slot < self._base_slots:
+            terms = self._base.terms_of(slot)
+            length = int(self._base.lengths[slot])
+            if self._base_alive is None:
+                self._base_alive = np.ones(self._base_slots, dtype=bool)
+            self._base_alive[slot] = False
+        else:
+            local = slot - self._base_slots
+            del self._slots[doc_id]
+            terms = self._terms[local]
+            length = self._lengths[local]
+            self._alive[local] = 0
+            self._ids[local] = None
+            self._texts[local] = None
+            self._terms[local] = None
+            self._num_deleted += 1
+
+        for term in terms:
+            self._df[term] = self._df.get(term, 0) - 1
+
+        self._num_docs -= 1
+        self._total_length -= length
+
+    def _compact(self):
+        """Rewrite in-memory postings lists without slots that have been deleted."""
+        for term, (slots, tfs) in list(self._postings.items()):
+            live = [(slot, tf) for slot, tf in zip(slots, tfs)
+                    if self._alive[slot - self._base_slots]]
+            if live:
+                self._postings[term] = (array('i', (slot for slot, _ in live)),
+                                        array('i', (tf for _, tf in live)))
+            else:
+                del self._postings[term]
+        self._filters.retain(self._live_mask())
+        self._num_deleted = 0
+        logger.info("Compacted keyword index postings.")
+
+    def _base_term(self, term: str) -> int:
+        """Look up (and remember) a term's index in the base segment."""
+        if self._base is None:
+            return -1
+        term_index = self._base_terms.get(term)
+        if term_index is None:
+            term_index = self._base_terms[term] = self._base.find_term(term)
+        return term_index
+
+    def doc_frequency(self, term: str) -> int:
+        df = self._df.get(term, 0)
+        term_index = self._base_term(term)
+        if term_index >= 0:
+            df += self._base.doc_frequency(term_index)
+        return df
+
+    def idf(self, term: str) -> float:
+        df = self.doc_frequency(term)
+        return math.log(1 + (self._num_docs - df + 0.5) / (df + 0.5))
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return all (slots, term frequencies) for term across both segments."""
+        parts_slots = []
+        parts_tfs = []
+
+        term_index = self._base_term(term)
+        if term_index >= 0:
+            slots, tfs = self._base.postings(term_index)
+            parts_slots.append(slots)
+            parts_tfs.append(tfs)
+
+        postings = self._postings.get(term)
+        if postings is not None:
+            parts_slots.append(np.frombuffer(postings[0], dtype=np.intc))
+            parts_tfs.append(np.frombuffer(postings[1], dtype=np.intc))
+
+        if not parts_slots:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        # Concatenating copies, so no view of the growable arrays escapes
+        return np.concatenate(parts_slots), np.concatenate(parts_tfs)
+
+    def _lengths_of(self, slots: np.ndarray) -> np.ndarray:
+        """Document lengths for the given slots."""
+        lengths = np.empty(len(slots), dtype=np.float64)
+        in_base = slots < self._base_slots
+        if in_base.any():
+            lengths[in_base] = self._base.lengths[slots[in_base]]
+        if not in_base.all():
+            lengths[~in_base] = np.frombuffer(self._lengths, dtype=np.intc)[slots[~in_base] - self._base_slots]
+        return lengths
+
+    def _alive_of(self, slots: np.ndarray) -> np.ndarray:
+        """Boolean mask, False where the slot's document has been deleted."""
+        alive = np.ones(len(slots), dtype=bool)
+        in_base = slots < self._base_slots
+        if self._base_alive is not None and in_base.any():
+            alive[in_base] = self._base_alive[slots[in_base]]
+        if not in_base.all():
+            alive[~in_base] = np.frombuffer(self._alive, dtype=np.uint8)[slots[~in_base] - self._base_slots] > 0
+        return alive
+
+    def _slot_lengths(self) -> np.ndarray:
+        return self._lengths_of(np.arange(self.num_slots))
+
+    def _live_mask(self) -> np.ndarray:
+        """Boolean mask over every slot, False for deleted documents."""
+        return self._alive_of(np.arange(self.num_slots))
+
+    def _where_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean mask over every slot for a where filter, or None without one."""
+        return self._filters.mask(where, self.num_slots) if where else None
+
+    def _filtered_postings(self, term: str, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        slots, tfs = self._term_postings(term)
+        if mask is not None and len(slots):
+            keep = mask[slots]
+            slots, tfs = slots[keep], tfs[keep]
+        return slots, tfs
+
+    def top_n(self, query: str, n: int, where: Dict = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score only the documents that contain a query term and keep the best n.
+
+        Work is proportional to the postings of the query terms rather than
+        to the number of indexed documents.
+
+        :param query: The query string.
+        :param n: Maximum number of results.
+        :param where: Optional Chroma where filter on the documents' metadata.
+            Term statistics stay those of the whole index.
+        :return: (slots, scores) arrays sorted by descending score.
+        """
+        with self._lock:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+            if not self._num_docs or n <= 0:
+                return empty
+
+            mask = self._where_mask(where)
+            avgdl = self.avgdl
+            parts_slots = []
+            parts_scores = []
+            for term, query_tf in Counter(self.tokenize(query)).items():
+                slots, tfs = self._filtered_postings(term, mask)
+                if not len(slots):
+                    continue
+                slots = slots.astype(np.int64)
+                tfs = tfs.astype(np.float64)
+                norm = self.k1 * (1 - self.b + self.b * self._lengths_of(slots) / avgdl)
+                parts_slots.append(slots)
+                parts_scores.append(query_tf * self.idf(term) * tfs * (self.k1 + 1) / (tfs + norm))
+
+            if not parts_slots:
+                return empty
+
+            # Sum the per-term contributions of each candidate document
+            candidates, inverse = np.unique(np.concatenate(parts_slots), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(parts_scores))
+
+            # Deleted slots can still appear in postings until they are compacted away
+            alive = self._alive_of(candidates)
+            candidates, scores = candidates[alive], scores[alive]
+
+            if len(scores) > n:
+                best = np.argpartition(-scores, n - 1)[:n]
+                candidates, scores = candidates[best], scores[best]
+
+            order = np.argsort(-scores, kind="stable")
+            return candidates[order], scores[order]
+
+    def top_n_batch(self, queries: List[str], n: int, where: Dict = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        top_n for many queries at once, with the same results.
+
+        Each distinct query term's postings, lengths and idf are read once for
+        the whole batch, and blocks of queries are scored together as a
+        (queries x candidate documents) matrix.
+
+        :param where: Optional metadata filter applied to every query, see top_n.
+        :return: A (slots, scores) pair per query.
+        """
+        with self._lock:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+            if not self._num_docs or n <= 0:
+                return [empty for _ in queries]
+
+            query_terms = [Counter(self.tokenize(query)) for query in queries]
+
+            mask = self._where_mask(where)
+            avgdl = self.avgdl
+            terms = {}
+            for counts in query_terms:
+                for term in counts:
+                    if term in terms:
+                        continue
+                    slots, tfs = self._filtered_postings(term, mask)
+                    terms[term] = None
+                    if len(slots):
+                        slots = slots.astype(np.int64)
+                        tfs = tfs.astype(np.float64)
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths_of(slots) / avgdl)
+                        idf = self.idf(term)
+                        # The weights of a term occurring once in the query, shared by all queries
+                        terms[term] = (slots, tfs, norm, idf, idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+            matched = {term: data for term, data in terms.items() if data is not None}
+            if not matched:
+                return [empty for _ in queries]
+
+            # Columns of the score matrix: every document containing some query term
+            candidates, inverse = np.unique(np.concatenate([data[0] for data in matched.values()]),
+                                            return_inverse=True)
+            columns = dict(zip(matched, np.split(inverse, np.cumsum([len(data[0]) for data in matched.values()])[:-1])))
+            alive = self._alive_of(candidates)
+            num_candidates = len(candidates)
+
+            results = []
+            block_size = max(1, _MAX_BATCH_CELLS // num_candidates)
+            for block_start in range(0, len(queries), block_size):
+                block = query_terms[block_start:block_start + block_size]
+                cells, weights = [], []
+                for row, counts in enumerate(block):
+                    for term, query_tf in counts.items():
+                        if term not in matched:
+                            continue
+                        slots, tfs, norm, idf, single = matched[term]
+                        cells.append(row * num_candidates + columns[term])
+                        # Evaluated like top_n (1 * idf is exact), so the scores are identical
+                        weights.append(single if query_tf == 1 else
+                                       query_tf * idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+                if cells:
+                    scores = np.bincount(np.concatenate(cells), weights=np.concatenate(weights),
+                                         minlength=len(block) * num_candidates)
+                else:
+                    scores = np.zeros(len(block) * num_candidates)
+                scores = scores.reshape(len(block), num_candidates)
+
+                for row in range(len(block)):
+                    # Every term weight is positive, so matching documents score above 0
+                    hits = np.flatnonzero((scores[row] > 0) & alive)
+                    if not len(hits):
+                        results.append(empty)
+                        continue
+                    row_candidates, row_scores = candidates[hits], scores[row, hits]
+
+                    if len(row_scores) > n:
+                        best = np.argpartition(-row_scores, n - 1)[:n]
+                        row_candidates, row_scores = row_candidates[best], row_scores[best]
+
+                    order = np.argsort(-row_scores, kind="stable")
+                    results.append((row_candidates[order], row_scores[order]))
+
+            return results
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        Score every slot against the query.
+
+        :param query: The query string.
+        :return: An array of BM25 scores indexed by slot (deleted slots score 0).
+        """
+        with self._lock:
+            scores = np.zeros(self.num_slots, dtype=np.float64)
+            slots, slot_scores = self.top_n(query, self.num_slots)
+            scores[slots] = slot_scores
+            return scores
+
+    def save(self, path: str, version: str):
+        """
+        Write the live contents of the index to a binary snapshot.
+
+        :param path: Destination file. It is written to a temporary file first
+            and moved into place, so readers never see a partial snapshot.
+        :param version: An opaque string identifying the indexed contents.
+        """
+        with self._lock:
+            live = np.flatnonzero(self._live_mask())
+            remap = np.full(self.num_slots, -1, dtype=np.int64)
+            remap[live] = np.arange(len(live))
+
+            vocabulary = set(self._postings)
+            if self._base is not None:
+                vocabulary.update(self._base.term(i) for i in range(self._base.num_terms))
+            terms = sorted((term for term in vocabulary if self.doc_frequency(term) > 0),
+                           key=lambda term: term.encode("utf-8"))
+
+            postings_slots = [np.empty(0, dtype=np.int32)]
+            postings_tfs = [np.empty(0, dtype=np.int32)]
+            postings_counts = np.zeros(len(terms), dtype=np.int64)
+            for term_index, term in enumerate(terms):
+                slots, tfs = self._term_postings(term)
+                new_slots = remap[slots]
+                keep = new_slots >= 0
+                postings_slots.append(new_slots[keep].astype(np.int32))
+                postings_tfs.append(tfs[keep].astype(np.int32))
+                postings_counts[term_index] = keep.sum()
+
+            postings_slots = np.concatenate(postings_slots)
+            postings_tfs = np.concatenate(postings_tfs)
+
+            # Forward index (slot -> term indices), used to update statistics on delete
+            postings_terms = np.repeat(np.arange(len(terms), dtype=np.int32), postings_counts)
+            doc_terms = postings_terms[np.argsort(postings_slots, kind="stable")]
+            doc_term_counts = np.bincount(postings_slots, minlength=len(live))
+
+            ids = [self.doc_id(slot).encode("utf-8") for slot in live]
+            # Texts are the bulk of the snapshot, so they are copied into the blob once
+            text_offsets, text_blob = _pack(self.text(slot).encode("utf-8") for slot in live)
+            lengths = self._slot_lengths()[live].astype(np.int32)
+            id_order = np.array(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.int32)
+            encoded_terms = [term.encode("utf-8") for term in terms]
+
+            filter_keys = []
+            filter_slots = [np.empty(0, dtype=np.int32)]
+            for field, value, slots in self._filters.items():
+                new_slots = remap[slots]
+                new_slots = np.sort(new_slots[new_slots >= 0]).astype(np.int32)
+                if len(new_slots):
+                    filter_keys.append([field, value])
+                    filter_slots.append(new_slots)
+
+            sections = {
+                "term_offsets": _offsets(encoded_terms),
+                "term_blob": _blob(encoded_terms),
+                "postings_offsets": _offsets_from_counts(postings_counts),
+                "postings_slots": postings_slots,
+                "postings_tfs": postings_tfs,
+                "lengths": lengths,
+                "id_offsets": _offsets(ids),
+                "id_blob": _blob(ids),
+                "id_order": id_order,
+                "text_offsets": text_offsets,
+                "text_blob": text_blob,
+                "doc_term_offsets": _offsets_from_counts(doc_term_counts),
+                "doc_terms": doc_terms,
+                "filter_keys": np.frombuffer(json.dumps(filter_keys).encode("utf-8"), dtype=np.uint8),
+                "filter_offsets": _offsets_from_counts(np.array([len(slots) for slots in filter_slots[1:]],
+                                                                dtype=np.int64)),
+                "filter_slots": np.concatenate(filter_slots),
+            }
+            header = {
+                "version": version,
+                "k1": self.k1,
+                "b": self.b,
+                "num_slots": len(live),
+                "num_terms": len(terms),
+                "total_length": int(lengths.sum()),
+            }
+            _write_snapshot(path, header, sections)
+
+        logger.info(f"Saved keyword index snapshot with {len(live)} documents to {path}")
+
+    def load(self, path: str) -> str:
+        """
+        Replace the contents of the index with a memory-mapped snapshot.
+
+        :param path: A file written by save.
+        :return: The version string the snapshot was saved with.
+        """
+        snapshot = _Snapshot(path)
+        with self._lock:
+            self.k1 = snapshot.header["k1"]
+            self.b = snapshot.header["b"]
+            self._reset(base=snapshot)
+        logger.info(f"Loaded keyword index snapshot with {snapshot.num_slots} documents from {path}")
+        return snapshot.version
+
+
+def _offsets_from_counts(counts: np.ndarray) -> np.ndarray:
+    """Turn per-item counts into an (n + 1) array of start offsets."""
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def _offsets(items: List[bytes]) -> np.ndarray:
+    return _offsets_from_counts(np.fromiter((len(item) for item in items), dtype=np.int64, count=len(items)))
+
+
+def _blob(items: List[bytes]) -> np.ndarray:
+    return np.frombuffer(b"".join(items), dtype=np.uint8)
+
+
+def _pack(items: Iterable[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """(offsets, blob) of items, concatenated in a single pass."""
+    blob = bytearray()
+    ends = array('q', [0])
+    for item in items:
+        blob += item
+        ends.append(len(blob))
+    return np.frombuffer(ends, dtype=np.int64), np.frombuffer(blob, dtype=np.uint8)
+
+
+def _align(position: int, alignment: int = 8) -> int:
+    return (position + alignment - 1) // alignment * alignment
+
+
+def _write_snapshot(path: str, header: Dict, sections: Dict[str, np.ndarray]):
+    """Lay out the sections 8-byte aligned after a JSON header and write them atomically."""
+    layout = {name: [0, array_.dtype.str, int(array_.size)] for name, array_ in sections.items()}
+
+    # Section offsets depend on the header size, so size the header with
+    # placeholder offsets wider than any real one and pad the final header to it.
+    placeholder = json.dumps(dict(header, sections={
+        name: [10 ** 15, dtype, count] for name, (_, dtype, count) in layout.items()
+    })).encode("utf-8")
+
+    position = _align(len(SNAPSHOT_MAGIC) + 8 + len(placeholder))
+    for name, array_ in sections.items():
+        layout[name][0] = position
+        position = _align(position + array_.nbytes)
+
+    header_bytes = json.dumps(dict(header, sections=layout)).encode("utf-8").ljust(len(placeholder))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(np.array([len(header_bytes)], dtype="<u8").tobytes())
+        f.write(header_bytes)
+        for name, array_ in sections.items():
+            f.seek(layout[name][0])
+            f.write(np.ascontiguousarray(array_).data)
+        f.truncate(position)
+    os.replace(tmp_path, path)
@@ -0,0 +1,549 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .backends import VectorStoreBackend
+from .filters import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.json"
+INDEX_TYPES = ("exact", "ivf")
+
+
+class _ArrayColumn:
+    """
+    A column of fixed-size rows appended to a raw file and read through a
+    memory map. Rows past the committed length (left by an interrupted write)
+    are cut off when the column is opened.
+    """
+
+    def __init__(self, path: str, dtype, width: int = None, length: int = 0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.length = length
+        self._row_bytes = self.dtype.itemsize * (width or 1)
+        self._map = None
+
+        with open(path, "ab"):
+            pass
+        size = os.path.getsize(path)
+        if size < length * self._row_bytes:
+            raise ValueError(f"Column file is shorter than its committed length: {path}")
+        if size > length * self._row_bytes:
+            os.truncate(path, length * self._row_bytes)
+
+    def _shape(self, length: int) -> tuple:
+        return (length,) if self.width is None else (length, self.width)
+
+    def view(self) -> np.ndarray:
+        """A read-only view of the committed rows."""
+        if self.length == 0:
+            return np.empty(self._shape(0), dtype=self.dtype)
+        if self._map is None:
+            self._map = np.memmap(self.path, dtype=self.dtype, mode="r", shape=self._shape(self.length))
+        return self._map
+
+    def append(self, values: np.ndarray):
+        values = np.ascontiguousarray(values, dtype=self.dtype).reshape(self._shape(-1))
+        with open(self.path, "ab") as f:
+            f.write(values.tobytes())
+        self.length += len(values)
+        # Remapped on the next read; views handed out before stay valid
+        self._map = None
+
+    def write(self, rows: np.ndarray, values):
+        """Overwrite rows in place."""
+        if not len(rows):
+            return
+        column = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=self._shape(self.length))
+        column[rows] = values
+        column.flush()
+        del column
+
+
+class _BlobColumn:
+    """A column of variable-size byte strings: a data file plus an end-offset column."""
+
+    def __init__(self, path: str, length: int = 0):
+        self.path = path
+        self.offsets = _ArrayColumn(path + ".off", np.int64, length=length)
+        self._end = int(self.offsets.view()[-1]) if length else 0
+        self._map = None
+
+        with open(path, "ab"):
+            pass
+        if os.path.getsize(path) < self._end:
+            raise ValueError(f"Column file is shorter than its committed length: {path}")
+        if os.path.getsize(path) > self._end:
+            os.truncate(path, self._end)
+
+    def __len__(self) -> int:
+        return self.offsets.length
+
+    def append(self, items: List[bytes]):
+        if not items:
+            return
+        ends = self._end + np.cumsum([len(item) for item in items], dtype=np.int64)
+        with open(self.path, "ab") as f:
+            f.write(b"".join(items))
+        self.offsets.append(ends)
+        self._end = int(ends[-1])
+        self._map = None
+
+    def get_many(self, rows: Sequence[int]) -> List[bytes]:
+        if not len(rows):
+            return []
+        if self._map is None:
+            self._map = np.memmap(self.path, dtype=np.uint8, mode="r", shape=(self._end,)) \
+                if self._end else np.empty(0, dtype=np.uint8)
+        data = self._map
+        offsets = self.offsets.view()
+        items = []
+        for row in rows:
+            start = int(offsets[row - 1]) if row else 0
+            items.append(data[start:int(offsets[row])].tobytes())
+        return items
+
+
+class LocalCollection:
+    """
+    A vector collection stored as memory-mapped columns, with the part of
+    Chroma's Collection API that VectorStore uses.
+
+    Normalized float32 embeddings form one row-major matrix; ids, documents
+    and JSON metadata are side columns of the same rows, and a byte per row
+    marks deleted rows. Writes append rows and then commit the row count to
+    state.json, so opening a collection only reads that file and the deletion
+    column, and maps the rest.
+
+    Queries score every live row with blocked matrix products (exact top-k),
+    or with index="ivf" only the rows of the nprobe inverted lists whose
+    k-means centroids are closest to the query (approximate top-k). The lists
+    are trained on first use once there are enough rows, and retrained when
+    the collection has doubled since.
+
+    where filters are evaluated with a MetadataIndex built from the metadata
+    column on first use and kept up to date by later writes, so a filtered
+    query only scores the matching rows.
+    """
+
+    def __init__(self, path: str, name: str, metadata: Dict[str, Any] = None,
+                 index: str = "exact", nlist: int = None, nprobe: int = 8,
+                 block_size: int = 16384):
+        """
+        :param path: Directory of the collection.
+        :param metadata: Collection metadata, used when the collection is created.
+        :param index: "exact", or "ivf" for approximate search over inverted lists.
+        :param nlist: Number of inverted lists, defaults to about sqrt(rows).
+        :param nprobe: Inverted lists scanned per query.
+        :param block_size: Rows scored per matrix product in exact search.
+        """
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index}")
+
+        self.path = path
+        self.name = name
+        self.index = index
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        state_path = os.path.join(path, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+        else:
+            self._state = {
+                "id": uuid.uuid4().hex,
+                "metadata": dict(metadata or {}),
+                "generation": 0,
+                "rows": 0,
+                "dimension": None,
+                "ivf_rows": 0
+            }
+            self._save_state()
+
+        self._open_columns()
+
+    @property
+    def id(self) -> str:
+        return self._state["id"]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self._state["metadata"]
+
+    def modify(self, metadata: Dict[str, Any] = None):
+        with self._lock:
+            if metadata is not None:
+                self._state["metadata"] = dict(metadata)
+            self._save_state()
+
+    def count(self) -> int:
+        return self._num_alive
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"gen-{self._state['generation']}", name)
+
+    def _open_columns(self):
+        rows = self._state["rows"]
+        os.makedirs(os.path.dirname(self._column_path("ids")), exist_ok=True)
+
+        self._ids = _BlobColumn(self._column_path("ids"), rows)
+        self._documents = _BlobColumn(self._column_path("documents"), rows)
+        self._metadatas = _BlobColumn(self._column_path("metadatas"), rows)
+        self._alive_column = _ArrayColumn(self._column_path("alive"), np.uint8, length=rows)
+        self._embeddings = None
+        if self._state["dimension"] is not None:
+            self._embeddings = _ArrayColumn(self._column_path("embeddings"), np.float32,
+                                            width=self._state["dimension"], length=rows)
+
+        self._ivf_lists = None
+        self._centroids = None
+        if self._state["ivf_rows"]:
+            self._ivf_lists = _ArrayColumn(self._column_path("ivf_lists"), np.int32, length=rows)
+            self._centroids = np.load(self._column_path("ivf_centroids.npy"))
+
+        self._alive = np.array(self._alive_column.view(), dtype=bool)
+        self._num_alive = int(self._alive.sum())
+        # Built on first use, so opening the collection does not decode every id
+        self._row_of_id = None
+        self._filters = None
+        self._list_rows = None
+
+    def _save_state(self):
+        state_path = os.path.join(self.path, STATE_FILE)
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, state_path)
+
+    def _rows_by_id(self) -> Dict[str, int]:
+        if self._row_of_id is None:
+            ids = self._ids.get_many(np.flatnonzero(self._alive))
+            self._row_of_id = {doc_id.decode("utf-8"): int(row)
+                               for doc_id, row in zip(ids, np.flatnonzero(self._alive))}
+        return self._row_of_id
+
+    def _metadata_index(self) -> MetadataIndex:
+        if self._filters is None:
+            self._filters = MetadataIndex()
+            rows = np.flatnonzero(self._alive)
+            for row, metadata in zip(rows, self._decode_metadatas(rows)):
+                self._filters.add(int(row), metadata)
+        return self._filters
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask over all rows, True where the metadata matches where."""
+        return self._metadata_index().mask(where, self._state["rows"])
+
+    def _rows(self, ids: Optional[Sequence[str]], where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Live rows with the given ids (in that order) or all live rows, filtered by where."""
+        if ids is not None:
+            rows_by_id = self._rows_by_id()
+            rows = np.array([rows_by_id[doc_id] for doc_id in ids if doc_id in rows_by_id], dtype=np.int64)
+        else:
+            rows = np.flatnonzero(self._alive)
+
+        if where:
+            rows = rows[self._where_mask(where)[rows]]
+        return rows
+
+    def _decode_metadatas(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        return [json.loads(item) for item in self._metadatas.get_many(rows)]
+
+    def _result(self, rows: Sequence[int], include: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "ids": [doc_id.decode("utf-8") for doc_id in self._ids.get_many(rows)],
+            "metadatas": self._decode_metadatas(rows) if "metadatas" in include else None,
+            "documents": [document.decode("utf-8") for document in self._documents.get_many(rows)]
+            if "documents" in include else None,
+            "embeddings": np.array(self._embeddings.view()[rows]) if "embeddings" in include and len(rows) else None
+        }
+
+    def get(self, ids: Sequence[str] = None, where: Dict[str, Any] = None,
+            include: Sequence[str] = ("metadatas", "documents"),
+            limit: int = None, offset: int = None) -> Dict[str, Any]:
+        """Rows in insertion order, or in the order of ids; limit and offset select a page of them."""
+        with self._lock:
+            rows = self._rows(ids, where)
+            start = offset or 0
+            return self._result(rows[start:None if limit is None else start + limit], include)
+
+    def upsert(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+               documents: Sequence[str], embeddings):
+        embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self._embeddings is None:
+                self._state["dimension"] = int(embeddings.shape[1])
+                self._embeddings = _ArrayColumn(self._column_path("embeddings"), np.float32,
+                                                width=self._state["dimension"], length=self._state["rows"])
+            elif embeddings.shape[1] != self._state["dimension"]:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match "
+                                 f"the collection's {self._state['dimension']}")
+
+            # Rows are never rewritten: an upserted id gets a new row and its old one is deleted
+            rows_by_id = self._rows_by_id()
+            self._kill([rows_by_id[doc_id] for doc_id in ids if doc_id in rows_by_id])
+
+            first = self._state["rows"]
+            self._ids.append([doc_id.encode("utf-8") for doc_id in ids])
+            self._documents.append([document.encode("utf-8") for document in documents])
+            self._metadatas.append([json.dumps(metadata).encode("utf-8") for metadata in metadatas])
+            self._embeddings.append(embeddings)
+            self._alive_column.append(np.ones(len(ids), dtype=np.uint8))
+            if self._ivf_lists is not None:
+                self._ivf_lists.append(self._assign(embeddings))
+                self._list_rows = None
+            if self._filters is not None:
+                for offset, metadata in enumerate(metadatas):
+                    self._filters.add(first + offset, metadata)
+
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._num_alive += len(ids)
+            for offset, doc_id in enumerate(ids):
+                rows_by_id[doc_id] = first + offset
+            self._state["rows"] = first + len(ids)
+            self._save_state()
+
+    def delete(self, ids: Sequence[str] = None, where: Dict[str, Any] = None):
+        with self._lock:
+            rows = self._rows(ids, where)
+            self._kill(rows)
+            self._save_state()
+            if self._state["rows"] > 1024 and self._num_alive < self._state["rows"] // 2:
+                self._compact()
+
+    def _kill(self, rows: Sequence[int]):
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        rows = rows[self._alive[rows]]
+        self._alive[rows] = False
+        self._alive_column.write(rows, 0)
+        self._num_alive -= len(rows)
+        if self._row_of_id is not None:
+            for doc_id in self._ids.get_many(rows):
+                self._row_of_id.pop(doc_id.decode("utf-8"), None)
+
+    def _compact(self):
+        """Rewrite the live rows into a new generation of column files."""
+        rows = np.flatnonzero(self._alive)
+        old_dir = os.path.dirname(self._column_path("ids"))
+        old = (self._ids, self._documents, self._metadatas, self._embeddings, self._ivf_lists)
+
+        self._state["generation"] += 1
+        new_dir = os.path.dirname(self._column_path("ids"))
+        shutil.rmtree(new_dir, ignore_errors=True)
+        os.makedirs(new_dir)
+
+        for name, column in zip(("ids", "documents", "metadatas"), old[:3]):
+            _BlobColumn(self._column_path(name)).append(column.get_many(rows))
+        _ArrayColumn(self._column_path("alive"), np.uint8).append(np.ones(len(rows), dtype=np.uint8))
+        if old[3] is not None:
+            embeddings = _ArrayColumn(self._column_path("embeddings"), np.float32, width=self._state["dimension"])
+            for start in range(0, len(rows), self.block_size):
+                embeddings.append(old[3].view()[rows[start:start + self.block_size]])
+        if old[4] is not None:
+            _ArrayColumn(self._column_path("ivf_lists"), np.int32).append(old[4].view()[rows])
+            np.save(self._column_path("ivf_centroids.npy"), self._centroids)
+
+        self._state["rows"] = len(rows)
+        self._save_state()
+        self._open_columns()
+        # Readers may still hold maps of the old files, which stay valid after unlinking
+        shutil.rmtree(old_dir, ignore_errors=True)
+        logger.info(f"Compacted local collection {self.name} to {len(rows)} rows.")
+
+    def query(self, query_embeddings, n_results: int = 10, where: Dict[str, Any] = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+
+        while True:
+            generation, hits = self._score(queries, n_results, where)
+            with self._lock:
+                # A compaction while scoring renumbered the rows, so the hits are stale
+                if self._state["generation"] != generation:
+                    continue
+                result = {"ids": [], "distances": [], "metadatas": [], "documents": []}
+                for rows, scores in hits:
+                    row_result = self._result(rows, include)
+                    result["ids"].append(row_result["ids"])
+                    # Squared L2 distance between normalized vectors, as Chroma reports by default
+                    result["distances"].append((2.0 - 2.0 * scores.astype(np.float64)).tolist())
+                    result["metadatas"].append(row_result["metadatas"])
+                    result["documents"].append(row_result["documents"])
+                return result
+
+    def _score(self, queries: np.ndarray, k: int,
+               where: Optional[Dict[str, Any]]) -> Tuple[int, List[Tuple[np.ndarray, np.ndarray]]]:
+        """(generation, top-k (rows, scores) per query), scoring without holding the lock."""
+        with self._lock:
+            generation = self._state["generation"]
+            matrix = None
+            if self._embeddings is not None and self._num_alive:
+                # Files only grow between compactions and compaction leaves the old
+                # files mapped, so the views stay valid while scoring unlocked
+                matrix = self._embeddings.view()
+                alive = self._alive.copy()
+                candidates = None
+                if where:
+                    alive &= self._where_mask(where)
+                    candidates = np.flatnonzero(alive)
+                lists = self._ivf() if self.index == "ivf" else None
+                # Scanning a selective filter's rows beats probing lists and dropping most of their rows
+                if lists is not None and candidates is not None \
+                        and len(candidates) * len(lists[0]) <= min(self.nprobe, len(lists[0])) * self._num_alive:
+                    lists = None
+
+        if matrix is None:
+            return generation, [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        if lists is not None:
+            return generation, [self._ivf_top_k(matrix, alive, query, k, *lists) for query in queries]
+        return generation, _top_k(matrix, alive, queries, k, self.block_size, candidates)
+
+    def _ivf(self) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(centroids, rows sorted by list, list boundaries), training the lists when due."""
+        nlist = self.nlist or max(1, int(np.sqrt(self._num_alive)))
+        # Too few rows per list would make the centroids meaningless
+        if self._num_alive < 39 * nlist:
+            return None
+        if not self._state["ivf_rows"] or self._num_alive >= 2 * self._state["ivf_rows"]:
+            self._train_ivf(nlist)
+
+        if self._list_rows is None:
+            assignments = np.asarray(self._ivf_lists.view())
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+            self._list_rows = (order, bounds)
+        return (self._centroids, *self._list_rows)
+
+    def _train_ivf(self, nlist: int, iterations: int = 10, sample_size: int = 256):
+        """Spherical k-means on a sample of live rows, then assign every row to a list."""
+        matrix = self._embeddings.view()
+        rows = np.flatnonzero(self._alive)
+        rng = np.random.default_rng(0)
+        sample = np.array(matrix[np.sort(rng.choice(rows, min(len(rows), sample_size * nlist), replace=False))])
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~np.bincount(assignment, minlength=nlist).astype(bool)
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self._centroids = centroids
+        np.save(self._column_path("ivf_centroids.npy"), centroids)
+        assignments = np.concatenate([self._assign(matrix[start:start + self.block_size])
+                                      for start in range(0, len(matrix), self.block_size)])
+        if os.path.exists(self._column_path("ivf_lists")):
+            os.remove(self._column_path("ivf_lists"))
+        self._ivf_lists = _ArrayColumn(self._column_path("ivf_lists"), np.int32)
+        self._ivf_lists.append(assignments)
+        self._list_rows = None
+        self._state["ivf_rows"] = self._num_alive
+        self._save_state()
+        logger.info(f"Trained {nlist} inverted lists for local collection {self.name}.")
+
+    def _assign(self, embeddings: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(embeddings) @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _ivf_top_k(self, matrix, alive, query, k, centroids, order, bounds) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(self.nprobe, len(centroids))
+        probed = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.sort(np.concatenate([order[bounds[i]:bounds[i + 1]] for i in probed]))
+        return _top_k(matrix, alive, query[None, :], k, self.block_size, rows)[0]
+
+
+class LocalBackend(VectorStoreBackend):
+    """
+    Collections stored as memory-mapped files under persist_directory/local,
+    searched in process. See LocalCollection.
+    """
+
+    def __init__(self, persist_directory: str, **options):
+        """
+        :param options: Passed to every LocalCollection, e.g. index="ivf", nprobe=16.
+        """
+        self.root = os.path.join(persist_directory, "local")
+        self.options = options
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_or_create_collection(self, name: str, metadata: Dict[str, Any] = None) -> LocalCollection:
+        path = os.path.join(self.root, name)
+        if os.path.exists(os.path.join(path, STATE_FILE)):
+            logger.info(f"Using existing collection: {name}")
+        else:
+            logger.info(f"Created new collection: {name}")
+        return LocalCollection(path, name, metadata=metadata, **self.options)
+
+    def delete_collection(self, name: str):
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            raise ValueError(f"Collection {name} does not exist.")
+        shutil.rmtree(path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+
+def _top_k(matrix: np.ndarray, alive: np.ndarray, queries: np.ndarray, k: int, block_size: int,
+           rows: np.ndarray = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Exact top-k rows by inner product for each query, scoring block_size rows
+    per matrix product and keeping a running top-k.
+
+    :param rows: Candidate rows, or None for all rows.
+    """
+    if rows is not None:
+        rows = rows[alive[rows]]
+        # Gathering rows costs about three times a contiguous scan of them
+        if 3 * len(rows) >= len(matrix):
+            alive = np.zeros(len(alive), dtype=bool)
+            alive[rows] = True
+            rows = None
+    total = len(matrix) if rows is None else len(rows)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+    for start in range(0, total, block_size):
+        end = min(start + block_size, total)
+        if rows is None:
+            block_rows = np.arange(start, end)
+            scores = queries @ np.asarray(matrix[start:end]).T
+            scores[:, ~alive[start:end]] = -np.inf
+        else:
+            block_rows = rows[start:end]
+            scores = queries @ np.asarray(matrix[block_rows]).T
+
+        block_rows = np.broadcast_to(block_rows, scores.shape)
+        best_rows = np.concatenate([best_rows, block_rows], axis=1)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+    hits = []
+    for query_rows, query_scores in zip(best_rows, best_scores):
+        order = np.argsort(-query_scores, kind="stable")
+        query_rows, query_scores = query_rows[order], query_scores[order]
+        live = np.isfinite(query_scores)
+        hits.append((query_rows[live], query_scores[live]))
+    return hits
+
@@ -1,21 +1,37 @@
-import chromadb
-from chromadb.config import Settings
 import logging
 from pathlib import Path
-from typing import Dict, List, Any
-import uuid
+from itertools import islice
+from typing import Dict, Iterator, List, Any, Sequence, Union
+
+import numpy as np
+
+from .backends import VectorStoreBackend, create_backend
 
 logger = logging.getLogger(__name__)
 
 class VectorStore:
+    # Fields of iter_documents and the collection.get include each is read from
+    DOCUMENT_FIELDS = {"metadata": "metadatas", "content": "documents"}
+
     def __init__(self, 
                  persist_directory: str = None, 
                  collection_name: str = "academic_docs",
-                 embedding_model=None):
-        """Initialize the VectorStore with ChromaDB."""
+                 embedding_model=None,
+                 backend: Union[str, VectorStoreBackend] = "chroma",
+                 backend_options: Dict[str, Any] = None):
+        """
+        Initialize the VectorStore with ChromaDB or another backend.
+
+        :param backend: "chroma", "local" (memory-mapped files searched in
+            process, see LocalBackend) or a VectorStoreBackend instance.
+        :param backend_options: Options of the "local" backend, e.g. {"index": "ivf"}.
+        """
         self.persist_directory = persist_directory
         self.collection_name = collection_name
         self.embedding_model = embedding_model
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self._listeners = []
 
         # Ensure the persistence directory exists
         Path(self.persist_directory).mkdir(parents=True, exist_ok=True)
@@ -27,40 +43,36 @@ class VectorStore:
         logger.info(f"VectorStore initialized with collection: {self.collection_name}")
 
 
+    def add_listener(self, listener):
+        """
+        Register an object to be notified of writes to the collection.
+
+        The listener must implement on_documents_added(ids, documents, metadatas),
+        on_documents_deleted(ids) and on_collection_reset().
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
     def _init_client(self):
-        """Initialize the Chroma client."""
-        try:
-            self.client = chromadb.PersistentClient(
-                path=self.persist_directory,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
-            )
-            logger.info(f"Chroma client initialized with persistence at: {self.persist_directory}")
-        except Exception as e:
-            logger.error(f"Failed to initialize Chroma client: {e}")
-            raise RuntimeError(f"Chroma client initialization error: {e}")
+        """Initialize the storage backend."""
+        if not isinstance(self.backend, VectorStoreBackend):
+            self.backend = create_backend(self.backend, self.persist_directory, **self.backend_options)
+        self.client = self.backend.client
 
 
     def _init_collection(self):
         try:
-            # Try to get the existing collection
-            try: 
-                self.collection = self.client.get_collection(
-                    name=self.collection_name
-                )
-                logger.info(f"Using existing collection: {self.collection_name}")
-            except Exception:
-                # If it doesn't exist, create a new one
-                self.collection = self.client.create_collection(
-                    name=self.collection_name,
-                    metadata={
-                        "description": "Collection for academic documents",
-                        "created_by": "RAG Academic System"
-                    }
-                )
-                logger.info(f"Created new collection: {self.collection_name}")
+            self.collection = self.backend.get_or_create_collection(
+                name=self.collection_name,
+                metadata={
+                    "description": "Collection for academic documents",
+                    "created_by": "RAG Academic System"
+                }
+            )
         except Exception as e:
             # If any other error occurs let's log and raise
             logger.error(f"Failed to initialize or create collection: {e}")
@@ -69,136 +81,322 @@ class VectorStore:
     def _reset_collection(self):
         """Reset the collection by deleting and recreating it."""
         try:
-            self.client.delete_collection(name=self.collection_name)
+            self.backend.delete_collection(name=self.collection_name)
             logger.info(f"Deleted collection: {self.collection_name}")
             self._init_collection()
             logger.info(f"Recreated collection: {self.collection_name}")
+            for listener in self._listeners:
+                listener.on_collection_reset()
         except Exception as e:
             logger.error(f"Failed to reset collection: {e}")
             raise RuntimeError(f"Collection reset error: {e}")
 
+    def _bump_revision(self):
+        """Record a write in the collection metadata so derived indexes can detect staleness."""
+        try:
+            metadata = dict(self.collection.metadata or {})
+            metadata["revision"] = int(metadata.get("revision", 0)) + 1
+            self.collection.modify(metadata=metadata)
+        except Exception as e:
+            logger.warning(f"Failed to update collection revision: {e}")
+
+    def content_version(self) -> str:
+        """
+        Return a string that changes whenever the collection's contents change.
+
+        It combines the collection id (new after a reset), the write revision
+        kept in the collection metadata and the document count.
+        """
+        metadata = self.collection.metadata or {}
+        return f"{self.collection.id}:{metadata.get('revision', 0)}:{self.collection.count()}"
+
+    def distance_to_similarity(self, distance: float) -> float:
+        """
+        Convert a Chroma distance into a cosine similarity (higher is better).
+
+        Embeddings are normalized, so the default squared L2 distance is 2 - 2 * cos,
+        while the cosine and inner-product spaces report 1 - cos.
+        """
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        if space == "l2":
+            return 1.0 - distance / 2.0
+        return 1.0 - distance
+
     def get_all_documents(self) -> List[Dict[str, Any]]:
-        """Retrieve all documents from the database."""
+        """
+        Retrieve all documents from the database.
+
+        Every document is held in memory at once; prefer iter_documents for
+        large collections.
+        """
         try:
-            # Get all documents in the chromadb collection
-            results = self.collection.get(include=["metadatas", "documents"])
-            documents = []
-            if results["ids"]:
-                for i in range(len(results["ids"])):
-                    documents.append({
-                        "id": results["ids"][i],
-                        "metadata": results["metadatas"][i],
-                        "content": results["documents"][i]
-                    })
-            return documents
+            return list(self.iter_documents())
         except Exception as e:
             logger.error(f"Failed to retrieve documents: {e}")
             return []
 
+    def iter_documents(self, page_size: int = 1000, fields: Sequence[str] = ("metadata", "content"),
+                       where: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the stored documents, fetching page_size of them per
+        collection.get call, so memory is bounded by one page. Pages are read
+        by offset, so writes during the iteration can shift documents between
+        pages.
 
-    def add_documents(self, chunks: list, batch_size: int = 100) -> Dict[str, Any]:
-        """Add documents to the vector store in batches."""
-        if not chunks:
-            logger.warning("No chunks provided to add to the vector store.")
-            return {"added": 0, "failed": 0}
+        :param fields: Fields to fetch besides "id": "metadata" and/or "content".
+        :param where: Optional Chroma where filter on the metadata.
+        :return: A generator of {"id", and the requested fields} dicts.
+        """
+        unknown = set(fields) - set(self.DOCUMENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported document fields: {sorted(unknown)}")
+        return self._iter_documents(page_size, list(fields), where)
 
-        total_added = 0
-        total_failed = 0
+    def _iter_documents(self, page_size: int, fields: List[str], where: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        include = [self.DOCUMENT_FIELDS[field] for field in fields]
+        offset = 0
+        while True:
+            try:
+                page = self.collection.get(where=where or None, include=include, limit=page_size, offset=offset)
+            except Exception as e:
+                logger.error(f"Failed to retrieve documents: {e}")
+                raise RuntimeError(f"Document retrieval error: {e}")
 
-        ids = []
-        metadatas = []
-        documents = []
-        embeddings_list = []
+            for i, doc_id in enumerate(page["ids"]):
+                document = {"id": doc_id}
+                for field in fields:
+                    document[field] = page[self.DOCUMENT_FIELDS[field]][i]
+                yield document
 
-        # Prepare data for insertion
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{uuid.uuid4()}"
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
 
-            ## Append the id for this chunk
-            ids.append(chunk_id)
+    def add_documents(self, chunks, batch_size: int = 100) -> Dict[str, Any]:
+        """
+        Add documents to the vector store in batches.
 
-            # Append the document content for this chunk
-            documents.append(chunk.content)
-            metadata = chunk.metadata.copy() 
+        Chunks are consumed lazily: each batch is embedded with a single
+        batched call and written to the collection before the next batch
+        is encoded, so peak memory is bounded by one batch of vectors.
 
-            metadata.update({
-                "chunk_id": chunk_id,
-                "content_length": len(chunk.content)
-            })
+        Ids are derived from each chunk's source, offsets and content (see
+        TextChunk.chunk_id) and written with upsert, so adding the same chunks
+        again is a no-op. Chunks whose id is already stored are not embedded,
+        nor are chunks that carry an embedding from semantic chunking.
 
-            # Append the metadata for this chunk
-            metadatas.append(metadata)
+        :return: "added" counts chunks now stored, "skipped" how many of them
+            were already present, "failed" chunks of batches that failed.
+        """
+        total_added = 0
+        total_skipped = 0
+        total_failed = 0
+        total_seen = 0
 
-            embeddings = self.embedding_model.encode(chunk.content)
+        chunk_iter = iter(chunks)
+        while True:
+            batch = list(islice(chunk_iter, batch_size))
+            if not batch:
+                break
+            total_seen += len(batch)
 
-            embeddings_list.append(embeddings)
+            batch_ids = []
+            batch_metadatas = []
+            batch_documents = []
+            batch_chunk_embeddings = []
+            seen = set()
 
-        # Insert in batches
-        for i in range(0, len(chunks), batch_size):
-            batch_ids = ids[i:i + batch_size]
-            batch_metadatas = metadatas[i:i + batch_size]
-            batch_documents = documents[i:i + batch_size]
-            batch_embeddings = embeddings_list[i:i + batch_size]
+            # Prepare data for insertion
+            for chunk in batch:
+                chunk_id = chunk.chunk_id
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                batch_ids.append(chunk_id)
+                batch_documents.append(chunk.content)
+                batch_chunk_embeddings.append(chunk.embedding)
+
+                metadata = chunk.metadata.copy()
+                metadata.update({
+                    "chunk_id": chunk_id,
+                    "content_length": len(chunk.content)
+                })
+                batch_metadatas.append(metadata)
 
             try:
-                self.collection.add(
-                    ids=batch_ids,
-                    metadatas=batch_metadatas,
-                    documents=batch_documents,
-                    embeddings=batch_embeddings
-                )
-                total_added += len(batch_ids)
-                logger.info(f"Added batch of {len(batch_ids)} documents to the vector store.")
+                existing = set(self.collection.get(ids=batch_ids, include=[])["ids"])
+                new = [i for i, chunk_id in enumerate(batch_ids) if chunk_id not in existing]
+                new_ids = [batch_ids[i] for i in new]
+                new_documents = [batch_documents[i] for i in new]
+                new_metadatas = [batch_metadatas[i] for i in new]
+
+                if new_ids:
+                    batch_embeddings = self._embed(new_documents,
+                                                   [batch_chunk_embeddings[i] for i in new])
+
+                    self.collection.upsert(
+                        ids=new_ids,
+                        metadatas=new_metadatas,
+                        documents=new_documents,
+                        embeddings=batch_embeddings
+                    )
+                total_added += len(batch)
+                total_skipped += len(batch) - len(new_ids)
+                logger.info(f"Added batch of {len(new_ids)} documents to the vector store "
+                            f"({len(batch) - len(new_ids)} already present).")
             except Exception as e:
-                total_failed += len(batch_ids)
+                total_failed += len(batch)
                 logger.error(f"Failed to add batch of documents: {e}")
+            else:
+                if new_ids:
+                    self._bump_revision()
+                    for listener in self._listeners:
+                        listener.on_documents_added(new_ids, new_documents, new_metadatas)
+
+        if total_seen == 0:
+            logger.warning("No chunks provided to add to the vector store.")
+            return {"added": 0, "skipped": 0, "failed": 0}
 
         # Log result
-        logger.info(f"Finished adding documents. Total added: {total_added}, Total failed: {total_failed}")
+        logger.info(f"Finished adding documents. Total added: {total_added}, "
+                    f"Total skipped: {total_skipped}, Total failed: {total_failed}")
 
         # Return summary
         return {
             "added": total_added,
+            "skipped": total_skipped,
             "failed": total_failed, 
             "total": self.collection.count()
         }
 
-    def search(self, query: str, top_k: int = 5) -> Dict[str, Any]:
-        """Search the vector store for similar documents."""
+    def _embed(self, documents: List[str], embeddings: List) -> np.ndarray:
+        """Encode the documents whose embedding is None in one batch and keep the others."""
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if len(missing) == len(documents):
+            return self.embedding_model.encode_batch(documents)
+
+        embeddings = list(embeddings)
+        if missing:
+            encoded = self.embedding_model.encode_batch([documents[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def delete_documents(self, ids: List[str]) -> int:
+        """Delete documents by id and return how many were requested for deletion."""
+        if not ids:
+            return 0
+
+        try:
+            self.collection.delete(ids=ids)
+        except Exception as e:
+            logger.error(f"Failed to delete documents: {e}")
+            raise RuntimeError(f"Document deletion error: {e}")
+
+        self._bump_revision()
+        for listener in self._listeners:
+            listener.on_documents_deleted(ids)
+
+        logger.info(f"Deleted {len(ids)} documents from the vector store.")
+        return len(ids)
+
+    def delete_where(self, where: Dict[str, Any]) -> int:
+        """
+        Delete every document whose metadata matches a Chroma where filter,
+        e.g. {"file_path": path}, and return how many were deleted.
+        """
+        return self.delete_documents(self.get_ids(where))
+
+    def get_ids(self, where: Dict[str, Any] = None) -> List[str]:
+        """Ids of the documents matching a Chroma where filter, or of all documents."""
+        try:
+            return self.collection.get(where=where, include=[])["ids"]
+        except Exception as e:
+            logger.error(f"Failed to look up document ids: {e}")
+            raise RuntimeError(f"Document lookup error: {e}")
+
+    def search(self, query: str, top_k: int = 5, where: Dict[str, Any] = None,
+               query_embedding: np.ndarray = None) -> Dict[str, Any]:
+        """
+        Search the vector store for similar documents.
+
+        :param where: Optional Chroma where filter on chunk metadata, e.g.
+            {"file_name": "lecture3.pdf"}. It is applied by the collection
+            query itself, so all top_k results match it.
+        :param query_embedding: The query's embedding, if the caller already has it.
+        """
         if not query:
             logger.warning("Empty query provided for search.")
             return []
         
         try:
-            query_embedding = self.embedding_model.encode(query)
+            if query_embedding is None:
+                query_embedding = self.embedding_model.encode(query)
             raw_results = self.collection.query(
                 query_embeddings=[query_embedding],
                 n_results=top_k,
+                where=where or None,
                 include=["metadatas", "documents", "distances"]
             )
+            return self._search_response(query, raw_results, 0)
 
-            results = []
+        except Exception as e:
+            logger.error(f"Search failed: {e}")
+            return self._search_response(query)
 
-            if raw_results["ids"] and len(raw_results["ids"][0]) > 0:
-                for i in range(len(raw_results["ids"][0])):
-                    result = {
-                        "id": raw_results["ids"][0][i],
-                        "content": raw_results["documents"][0][i],
-                        "metadata": raw_results["metadatas"][0][i],
-                        "score": raw_results["distances"][0][i]
-                    }
-                    results.append(result)
+    def search_batch(self, queries: List[str], top_k: int = 5, where: Dict[str, Any] = None,
+                     query_embeddings: np.ndarray = None) -> List[Dict[str, Any]]:
+        """
+        Search for many queries at once: the queries are embedded in one
+        encode_batch call and looked up with a single multi-query Chroma request.
 
-            return {
-                "query": query,
-                "results": results,
-                "total_results": len(results)
-            }
+        :param where: Optional metadata filter applied to every query, see search.
+        :param query_embeddings: Embeddings of the queries, if the caller already has them.
+        :return: One search response per query, in order, as returned by search.
+            Empty queries get an empty response.
+        """
+        positions = [i for i, query in enumerate(queries) if query]
+        responses = [self._search_response(query) for query in queries]
+        if not positions:
+            return responses
 
+        try:
+            if query_embeddings is None:
+                query_embeddings = self.embedding_model.encode_batch([queries[i] for i in positions])
+            else:
+                query_embeddings = np.asarray(query_embeddings)[positions]
+            raw_results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                where=where or None,
+                include=["metadatas", "documents", "distances"]
+            )
         except Exception as e:
-            logger.error(f"Search failed: {e}")
-            return {
-                "query": query,
-                "results": [],
-                "total_results": 0
-            }
+            logger.error(f"Batch search failed: {e}")
+            return responses
+
+        for row, i in enumerate(positions):
+            responses[i] = self._search_response(queries[i], raw_results, row)
+        return responses
+
+    def _search_response(self, query: str, raw_results: Dict[str, Any] = None, row: int = 0) -> Dict[str, Any]:
+        """Format one query's row of a Chroma query result, or an empty response."""
+        results = []
+
+        if raw_results is not None and raw_results["ids"] and len(raw_results["ids"][row]) > 0:
+            for i in range(len(raw_results["ids"][row])):
+                distance = raw_results["distances"][row][i]
+                result = {
+                    "id": raw_results["ids"][row][i],
+                    "content": raw_results["documents"][row][i],
+                    "metadata": raw_results["metadatas"][row][i],
+                    "score": distance,
+                    "similarity": self.distance_to_similarity(distance)
+                }
+                results.append(result)
+
+        return {
+            "query": query,
+            "results": results,
+            "total_results": len(results)
+        }
@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from src.generation.answer_cache import AnswerCache
+
+
+class TestAnswerCache:
+    @pytest.fixture
+    def cache(self):
+        return AnswerCache(threshold=0.9, max_entries=2, ttl=60.0)
+
+    def test_similar_query_hits(self, cache):
+        cache.store(np.array([1.0, 0.0]), ["a", "b"], "answer")
+
+        assert cache.lookup(np.array([0.99, 0.05]), ["a", "b"]) == "answer"
+        assert cache.lookup(np.array([0.0, 1.0]), ["a", "b"]) is None
+
+    def test_different_chunks_miss(self, cache):
+        cache.store(np.array([1.0, 0.0]), ["a", "b"], "answer")
+
+        assert cache.lookup(np.array([1.0, 0.0]), ["a", "c"]) is None
+
+    def test_lru_eviction(self, cache):
+        cache.store(np.array([1.0, 0.0]), ["a"], "first")
+        cache.store(np.array([1.0, 0.0]), ["b"], "second")
+        cache.lookup(np.array([1.0, 0.0]), ["a"])
+        cache.store(np.array([1.0, 0.0]), ["c"], "third")
+
+        assert len(cache) == 2
+        assert cache.lookup(np.array([1.0, 0.0]), ["a"]) == "first"
+        assert cache.lookup(np.array([1.0, 0.0]), ["b"]) is None
+
+    def test_ttl_expiry(self):
+        cache = AnswerCache(ttl=0.0)
+        cache.store(np.array([1.0, 0.0]), ["a"], "answer")
+
+        assert cache.lookup(np.array([1.0, 0.0]), ["a"]) is None
+        assert len(cache) == 0
+
+    def test_chunk_changes_invalidate(self, cache):
+        cache.store(np.array([1.0, 0.0]), ["a", "b"], "answer")
+        cache.on_documents_deleted(["b"])
+        assert cache.lookup(np.array([1.0, 0.0]), ["a", "b"]) is None
+
+        cache.store(np.array([1.0, 0.0]), ["a"], "answer")
+        cache.on_documents_added(["a"], ["new text"], [{}])
+        assert len(cache) == 0
+
+        cache.store(np.array([1.0, 0.0]), ["a"], "answer")
+        cache.on_collection_reset()
+        assert len(cache) == 0
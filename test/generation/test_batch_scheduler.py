@@ -0,0 +1,55 @@
+import pytest
+from src.generation.batch_scheduler import BatchScheduler
+
+
+class RecordingClient:
+    """Stands in for LLMClient and records the size of every batch."""
+    def __init__(self):
+        self.batches = []
+
+    def get_responses(self, prompts):
+        self.batches.append(len(prompts))
+        return [f"answer to {prompt}" for prompt in prompts]
+
+
+class TestBatchScheduler:
+    @pytest.fixture
+    def client(self):
+        return RecordingClient()
+
+    def test_get_response(self, client):
+        scheduler = BatchScheduler(client, max_batch_size=4, max_wait=0.01)
+        try:
+            assert scheduler.get_response("q1") == "answer to q1"
+        finally:
+            scheduler.close()
+
+    def test_concurrent_prompts_are_batched(self, client):
+        scheduler = BatchScheduler(client, max_batch_size=4, max_wait=0.5)
+        try:
+            futures = [scheduler.submit(f"q{i}") for i in range(8)]
+            answers = [future.result(timeout=5) for future in futures]
+        finally:
+            scheduler.close()
+
+        assert answers == [f"answer to q{i}" for i in range(8)]
+        assert max(client.batches) <= 4
+        assert len(client.batches) < 8
+
+    def test_errors_reach_callers(self):
+        class FailingClient:
+            def get_responses(self, prompts):
+                raise RuntimeError("out of memory")
+
+        scheduler = BatchScheduler(FailingClient(), max_wait=0.01)
+        try:
+            with pytest.raises(RuntimeError, match="out of memory"):
+                scheduler.get_response("q1")
+        finally:
+            scheduler.close()
+
+    def test_submit_after_close(self, client):
+        scheduler = BatchScheduler(client)
+        scheduler.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            scheduler.submit("q1")
@@ -0,0 +1,54 @@
+import pytest
+from src.generation.context_builder import ContextBuilder
+from src.generation.prompt_template import PromptTemplate
+
+
+def chunk(content, start=None, file_path="notes.txt", **extra):
+    metadata = {}
+    if start is not None:
+        metadata = {"file_path": file_path, "chunk_start": start, "chunk_end": start + len(content)}
+    return {"content": content, "metadata": metadata, **extra}
+
+
+class TestContextBuilder:
+    @pytest.fixture
+    def builder(self):
+        # Without a tokenizer, tokens are counted as words
+        return ContextBuilder(max_tokens=20, duplicate_threshold=0.8, shingle_size=3)
+
+    def test_fits_budget(self, builder):
+        docs = [chunk("Lift is produced by the wing."), chunk("Drag opposes motion through air.")]
+        packed = builder.build(docs)
+
+        assert [doc["content"] for doc in packed.documents] == [doc["content"] for doc in docs]
+        assert packed.token_count == 11
+        assert not packed.truncated
+        # Packed documents drop into the unchanged prompt template
+        prompt = PromptTemplate.generate_prompt("What is lift?", packed.documents)
+        assert "Lift is produced by the wing.\n\nDrag opposes motion through air." in prompt
+
+    def test_truncates_at_sentence_boundary(self, builder):
+        docs = [chunk("One two three four five six seven eight nine ten."),
+                chunk("Alpha beta gamma delta. Epsilon zeta eta theta. Iota kappa lambda mu.")]
+        packed = builder.build(docs)
+
+        assert packed.truncated
+        assert packed.documents[1]["content"] == "Alpha beta gamma delta. Epsilon zeta eta theta."
+        assert packed.token_count == 18
+
+    def test_trims_overlapping_chunks(self, builder):
+        text = "The wing turns air down. The air pushes the wing up. Pilots call it lift."
+        first = chunk(text[:52], start=0)
+        second = chunk(text[25:], start=25)
+        packed = builder.build([first, second])
+
+        assert [doc["content"] for doc in packed.documents] == [text[:52], "Pilots call it lift."]
+
+    def test_drops_near_duplicates(self, builder):
+        docs = [chunk("Boundary layers separate at high angles of attack.", similarity=0.5),
+                chunk("Boundary layers separate at high angles of attack!", similarity=0.9),
+                chunk("Stall follows separation.", similarity=0.1)]
+        packed = builder.build(docs)
+
+        assert [doc["similarity"] for doc in packed.documents] == [0.9, 0.1]
+        assert packed.dropped == 1
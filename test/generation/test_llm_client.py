@@ -0,0 +1,30 @@
+import pytest
+from src.generation.llm_client import LLMClient
+
+class TestLLMClient:
+    @pytest.fixture
+    def llm_client(self):
+        return LLMClient(model_name="MockModel")
+
+    def test_get_response(self, llm_client):
+        response = llm_client.get_response("Question: What is 2 + 2?\nAnswer:")
+        assert response == "This is a placeholder response from the LLM."
+
+    def test_stream_response(self, llm_client):
+        prompt = "Question: What is 2 + 2?\nAnswer:"
+        fragments = list(llm_client.stream_response(prompt))
+        assert len(fragments) > 1
+        assert "".join(fragments) == llm_client.get_response(prompt)
+
+    def test_get_responses(self, llm_client):
+        prompts = ["Question: A?\nAnswer:", "Question: B?\nAnswer:"]
+        responses = llm_client.get_responses(prompts)
+        assert len(responses) == 2
+        assert all(isinstance(response, str) for response in responses)
+
+    def test_get_responses_single_prompt(self, llm_client, monkeypatch):
+        # A lone prompt goes through get_response, which can use the prefix cache
+        prompts = []
+        monkeypatch.setattr(llm_client, "get_response", lambda prompt: prompts.append(prompt) or "answer")
+        assert llm_client.get_responses(["Question: A?\nAnswer:"]) == ["answer"]
+        assert prompts == ["Question: A?\nAnswer:"]
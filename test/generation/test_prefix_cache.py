@@ -0,0 +1,31 @@
+import pytest
+from src.generation.prefix_cache import PrefixCache
+
+
+class TestPrefixCache:
+    @pytest.fixture
+    def cache(self):
+        return PrefixCache(max_entries=2)
+
+    def test_longest_prefix_hits(self, cache):
+        cache.put([1, 2], "short")
+        cache.put([1, 2, 3], "long")
+
+        assert cache.get([1, 2, 3, 4]) == (3, "long")
+        assert cache.get([1, 2, 5]) == (2, "short")
+        assert cache.get([2, 3]) == (0, None)
+
+    def test_whole_prompt_is_not_a_hit(self, cache):
+        # Generation needs at least one token after the cached prefix
+        cache.put([1, 2, 3], "prefix")
+        assert cache.get([1, 2, 3]) == (0, None)
+
+    def test_lru_eviction(self, cache):
+        cache.put([1], "a")
+        cache.put([2], "b")
+        cache.get([1, 9])
+        cache.put([3], "c")
+
+        assert len(cache) == 2
+        assert [1] in cache
+        assert [2] not in cache
@@ -1,4 +1,5 @@
 import pytest
+import asyncio
 from src.generation.rag_chain import RAGChain
 
 class TestRAGChain:
@@ -18,3 +19,72 @@ class TestRAGChain:
         assert hasattr(response, 'source_documents')
         assert isinstance(response.source_documents, list)
         # Let's assume the placeholder answer is returned
+
+    def test_ask_hybrid_stream(self, rag_chain):
+        question = "What is the capital of France?"
+        response = rag_chain.ask_hybrid_stream(question)
+        assert isinstance(response.source_documents, list)
+        answer = "".join(response.answer_stream)
+        assert isinstance(answer, str)
+        assert len(answer) > 0
+
+    def test_aask_hybrid(self, rag_chain):
+        async def ask_all():
+            return await asyncio.gather(*[rag_chain.aask_hybrid(question)
+                                          for question in ["What is lift?", "What is drag?"]])
+
+        responses = asyncio.run(ask_all())
+        assert len(responses) == 2
+        assert all(isinstance(response.answer, str) for response in responses)
+
+    def test_aask_hybrid_stream(self, rag_chain):
+        async def stream():
+            response = await rag_chain.aask_hybrid_stream("What is the capital of France?")
+            return [fragment async for fragment in response.answer_stream]
+
+        assert len("".join(asyncio.run(stream()))) > 0
+
+    def test_ask_batch(self, rag_chain):
+        questions = ["What is lift?", "What is drag?", "What is thrust?"]
+        responses = rag_chain.ask_batch(questions, batch_size=2)
+        assert len(responses) == 3
+        assert all(isinstance(response.answer, str) for response in responses)
+
+    def test_answer_cache_encodes_question_once(self, monkeypatch):
+        rag_chain = RAGChain(answer_cache=True)
+        embedding_model = rag_chain.vector_store.embedding_model
+        calls = []
+        encode = embedding_model.encode
+
+        def counting_encode(text):
+            calls.append(text)
+            return encode(text)
+
+        monkeypatch.setattr(embedding_model, "encode", counting_encode)
+        rag_chain.ask_hybrid("What is lift?")
+        assert calls == ["What is lift?"]
+
+    def test_ask_empty_question(self, rag_chain):
+        assert rag_chain.ask("").source_documents == []
+        assert asyncio.run(rag_chain.aask("")).source_documents == []
+
+    def test_aask_hybrid_stream_close(self, rag_chain, monkeypatch):
+        closed = []
+
+        def stream_response(prompt):
+            try:
+                while True:
+                    yield "token "
+            finally:
+                closed.append(True)
+
+        monkeypatch.setattr(rag_chain.llm_client, "stream_response", stream_response)
+
+        async def stream():
+            response = await rag_chain.aask_hybrid_stream("What is lift?")
+            fragment = await response.answer_stream.__anext__()
+            await response.answer_stream.aclose()
+            assert closed == [True]
+            return fragment
+
+        assert asyncio.run(stream()) == "token "
@@ -0,0 +1,49 @@
+import pytest
+import threading
+from src.generation import registry as registry_module
+from src.generation.registry import ResourceRegistry
+
+class TestResourceRegistry:
+    @pytest.fixture
+    def registry(self):
+        return ResourceRegistry()
+
+    def test_llm_client_is_shared(self, registry):
+        client1 = registry.llm_client("MockModel")
+        client2 = registry.llm_client("MockModel")
+        assert client1 is client2
+
+    def test_factory_runs_once_under_concurrency(self, registry):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry._get_or_create("key", factory)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+
+    def test_clear(self, registry):
+        client = registry.llm_client("MockModel")
+        registry.clear()
+        assert registry.llm_client("MockModel") is not client
+
+    def test_vector_store_per_embedding_cache_dir(self, registry, monkeypatch, tmp_path):
+        monkeypatch.setattr(registry_module, "EmbeddingModel",
+                            lambda model_name, cache_dir: (model_name, cache_dir))
+        monkeypatch.setattr(registry_module, "VectorStore", lambda embedding_model, **kwargs: embedding_model)
+
+        cache1, cache2 = str(tmp_path / "cache1"), str(tmp_path / "cache2")
+        store1 = registry.vector_store(str(tmp_path), "docs", embedding_cache_dir=cache1)
+        store2 = registry.vector_store(str(tmp_path), "docs", embedding_cache_dir=cache2)
+        assert store1 == ("all-MiniLM-L6-v2", cache1)
+        assert store2 == ("all-MiniLM-L6-v2", cache2)
+        assert registry.vector_store(str(tmp_path), "docs", embedding_cache_dir=cache1) is store1
@@ -1,8 +1,46 @@
 import pytest
+import numpy as np
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
 from src.ingestion.chunker import TextChunker, TextChunk
 from src.ingestion.document import Document
 
 
+class TopicModel:
+    """Stands in for EmbeddingModel: embeds a sentence by the topic word it contains."""
+    topics = ["cats", "planets", "rivers"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode_batch(self, texts):
+        self.calls += 1
+        embeddings = np.zeros((len(texts), len(self.topics)), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for j, topic in enumerate(self.topics):
+                if topic in text:
+                    embeddings[i, j] = 1.0
+        return embeddings
+
+
+class CountingTokenizer:
+    """An offline word-level fast tokenizer that counts the texts it tokenizes."""
+
+    def __init__(self, words):
+        vocab = {"[UNK]": 0, **{word: i + 1 for i, word in enumerate(words)}}
+        tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+        self.tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+        self.texts = 0
+
+    def __call__(self, texts, **kwargs):
+        self.texts += 1 if isinstance(texts, str) else len(texts)
+        return self.tokenizer(texts, **kwargs)
+
+    def count(self, text):
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
 class TestTextChunker:
     @pytest.fixture
     def chunker(self):
@@ -40,3 +78,88 @@ class TestTextChunker:
     def test_unsupported_chunking_method(self, chunker, sample_document):
         with pytest.raises(ValueError, match="Unsupported chunking method"):
             chunker.chunk_document(sample_document, chunk_method="unknown_method")
+
+    def test_chunk_id_is_deterministic(self, chunker, sample_document):
+        first = chunker.chunk_document(sample_document, chunk_method="sliding_window")
+        second = chunker.chunk_document(sample_document, chunk_method="sliding_window")
+        assert [chunk.chunk_id for chunk in first] == [chunk.chunk_id for chunk in second]
+        assert len({chunk.chunk_id for chunk in first}) == len(first)
+
+        moved = TextChunk(content=first[0].content,
+                          metadata={**first[0].metadata, "file_path": "other.txt"})
+        assert moved.chunk_id != first[0].chunk_id
+
+    def test_offsets_are_exact(self, chunker, sample_document):
+        for method in ("sliding_window", "paragraph_boundary", "semantic"):
+            for chunk in chunker.chunk_document(sample_document, chunk_method=method):
+                start, end = chunk.metadata["chunk_start"], chunk.metadata["chunk_end"]
+                assert sample_document.content[start:end] == chunk.content
+
+    def test_overlap_and_tail(self):
+        chunker = TextChunker(chunk_size=60, overlap=15, min_chunk_size=10)
+        content = " ".join(f"Sentence number {i} ends here." for i in range(10))
+        chunks = chunker.chunk_document(Document(content=content, metadata={}, src="test.txt"))
+
+        assert chunks[-1].content.endswith("Sentence number 9 ends here.")
+        for previous, chunk in zip(chunks, chunks[1:]):
+            assert chunk.metadata["chunk_start"] < previous.metadata["chunk_end"]
+
+    def test_oversize_sentence_is_split(self):
+        chunker = TextChunker(chunk_size=50, overlap=0, min_chunk_size=10)
+        content = "word " * 40
+        chunks = chunker.chunk_document(Document(content=content, metadata={}, src="test.txt"))
+
+        assert all(len(chunk.content) <= 50 for chunk in chunks)
+        assert " ".join(chunk.content for chunk in chunks) == content.strip()
+
+    def test_semantic_chunking_with_embeddings(self):
+        model = TopicModel()
+        chunker = TextChunker(chunk_size=200, overlap=0, min_chunk_size=10,
+                              embedding_model=model, breakpoint_percentile=30)
+        content = ("Some cats sleep. Many cats purr. The planets orbit. Outer planets are cold. "
+                   "The rivers flow. Long rivers meander.")
+        chunks = chunker.chunk_document(Document(content=content, metadata={}, src="test.txt"),
+                                        chunk_method="semantic")
+
+        assert model.calls == 1
+        assert [chunk.content for chunk in chunks] == ["Some cats sleep. Many cats purr.",
+                                                       "The planets orbit. Outer planets are cold.",
+                                                       "The rivers flow. Long rivers meander."]
+        for chunk, topic in zip(chunks, range(3)):
+            assert np.argmax(chunk.embedding) == topic
+            assert np.isclose(np.linalg.norm(chunk.embedding), 1.0)
+
+    def test_token_sizing(self):
+        tokenizer = CountingTokenizer(["Sentence", "number", "ends", "here"])
+        chunker = TextChunker(chunk_size=20, overlap=5, min_chunk_size=5,
+                              size_unit="tokens", tokenizer=tokenizer)
+        # Each sentence is 6 tokens but only 29 or 30 characters
+        content = " ".join(f"Sentence number {i} ends here." for i in range(12))
+        document = Document(content=content, metadata={}, src="test.txt")
+        chunks = chunker.chunk_document(document)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert tokenizer.count(chunk.content) <= 20
+            assert content[chunk.metadata["chunk_start"]:chunk.metadata["chunk_end"]] == chunk.content
+        assert tokenizer.texts == 12
+
+        # Sentence token counts are cached between documents
+        chunker.chunk_document(document, chunk_method="paragraph_boundary")
+        assert tokenizer.texts == 13
+
+    def test_token_sizing_splits_long_sentences(self):
+        tokenizer = CountingTokenizer(["word"])
+        chunker = TextChunker(chunk_size=8, overlap=0, min_chunk_size=2,
+                              size_unit="tokens", tokenizer=tokenizer)
+        content = "word, " * 30
+        chunks = chunker.chunk_document(Document(content=content, metadata={}, src="test.txt"))
+
+        assert all(tokenizer.count(chunk.content) <= 8 for chunk in chunks)
+        assert " ".join(chunk.content for chunk in chunks) == content.strip()
+
+    def test_token_sizing_needs_a_tokenizer(self):
+        with pytest.raises(ValueError, match="tokenizer"):
+            TextChunker(size_unit="tokens")
+        with pytest.raises(ValueError, match="Unsupported size unit"):
+            TextChunker(size_unit="words")
@@ -66,3 +66,13 @@ class TestDocumentLoader:
 
             docs = loader.load_directory(temp_dir, recursive=False)
             assert len(docs) == 2
+
+    def test_load_directory_stream(self, loader):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(5):
+                with open(os.path.join(temp_dir, f"file{i}.txt"), 'w') as f:
+                    f.write(f"Content of file {i}.")
+
+            docs = loader.load_directory(temp_dir, recursive=False, stream=True, num_workers=2)
+            assert not isinstance(docs, list)
+            assert sorted(doc.content for doc in docs) == [f"Content of file {i}." for i in range(5)]
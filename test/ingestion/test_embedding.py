@@ -20,3 +20,11 @@ class TestEmbeddingModel:
         emb2 = embedding_model.encode(text2)
         sim = embedding_model.similarity(emb1, emb2)
         assert -1.0 <= sim <= 1.0  # Cosine similarity range
+
+    def test_encode_batch(self, embedding_model):
+        texts = ["First sentence.", "Second sentence.", "Third sentence."]
+        embeddings = embedding_model.encode_batch(texts, batch_size=2)
+        assert isinstance(embeddings, np.ndarray)
+        assert embeddings.shape == (3, embedding_model.dimension)
+        assert embeddings.dtype == np.float32
+        assert np.allclose(embeddings[0], embedding_model.encode(texts[0]), atol=1e-5)
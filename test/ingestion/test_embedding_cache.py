@@ -0,0 +1,42 @@
+import pytest
+import tempfile
+import numpy as np
+from src.ingestion.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache:
+    @pytest.fixture
+    def cache_dir(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield temp_dir
+
+    def test_key_normalizes_whitespace(self):
+        key1 = EmbeddingCache.key("model", "Hello   world\n")
+        key2 = EmbeddingCache.key("model", "Hello world")
+        key3 = EmbeddingCache.key("other-model", "Hello world")
+        assert key1 == key2
+        assert key1 != key3
+
+    def test_put_and_get(self, cache_dir):
+        cache = EmbeddingCache(cache_dir, dimension=4)
+        key = EmbeddingCache.key("model", "text")
+        assert cache.get(key) is None
+
+        cache.put(key, np.array([1, 2, 3, 4], dtype=np.float32))
+        assert key in cache
+        assert np.array_equal(cache.get(key), [1, 2, 3, 4])
+
+    def test_persists_across_instances(self, cache_dir):
+        keys = [EmbeddingCache.key("model", f"text {i}") for i in range(3)]
+        vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+        EmbeddingCache(cache_dir, dimension=4).put_many(keys, vectors)
+
+        reopened = EmbeddingCache(cache_dir, dimension=4, memory_size=1)
+        assert len(reopened) == 3
+        assert all(vector is not None for vector in reopened.get_many(keys))
+        assert np.array_equal(reopened.get(keys[2]), vectors[2])
+
+    def test_dimension_mismatch(self, cache_dir):
+        EmbeddingCache(cache_dir, dimension=4)
+        with pytest.raises(ValueError, match="dimension"):
+            EmbeddingCache(cache_dir, dimension=8)
@@ -0,0 +1,55 @@
+import os
+import pytest
+import tempfile
+from src.ingestion.manifest import IngestionManifest
+
+
+class TestIngestionManifest:
+    @pytest.fixture
+    def temp_dir(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield temp_dir
+
+    def write(self, temp_dir, name, content):
+        path = os.path.join(temp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_compare_and_save(self, temp_dir):
+        manifest_path = os.path.join(temp_dir, "manifest.json")
+        a = self.write(temp_dir, "a.txt", "first")
+        b = self.write(temp_dir, "b.txt", "second")
+
+        manifest = IngestionManifest(manifest_path)
+        changes = manifest.compare([a, b])
+        assert changes.added == [a, b]
+        for path in changes.changed:
+            manifest.record(path)
+        manifest.save()
+
+        c = self.write(temp_dir, "c.txt", "third")
+        self.write(temp_dir, "a.txt", "first, edited")
+        os.remove(b)
+
+        changes = IngestionManifest(manifest_path).compare([a, c])
+        assert changes.added == [c]
+        assert changes.modified == [a]
+        assert changes.removed == [b]
+        assert changes.unchanged == []
+
+    def test_touched_file_is_unchanged(self, temp_dir):
+        a = self.write(temp_dir, "a.txt", "content")
+        manifest = IngestionManifest(os.path.join(temp_dir, "manifest.json"))
+        manifest.record(a)
+
+        stat = os.stat(a)
+        os.utime(a, (stat.st_atime, stat.st_mtime + 10))
+
+        changes = manifest.compare([a])
+        assert changes.unchanged == [a]
+        assert manifest.entries[a]["mtime"] == stat.st_mtime + 10
+
+    def test_unreadable_manifest_starts_empty(self, temp_dir):
+        manifest_path = self.write(temp_dir, "manifest.json", "not json")
+        assert len(IngestionManifest(manifest_path)) == 0
@@ -0,0 +1,64 @@
+import os
+import pytest
+import tempfile
+from src.ingestion.chunker import TextChunker
+from src.ingestion.pipeline import IngestionPipeline
+
+
+class RecordingStore:
+    """Stands in for VectorStore and consumes chunks lazily like it does."""
+    def __init__(self):
+        self.chunks = []
+
+    def add_documents(self, chunks, batch_size=100):
+        for chunk in chunks:
+            self.chunks.append(chunk)
+        return {"added": len(self.chunks), "failed": 0, "total": len(self.chunks)}
+
+
+class TestIngestionPipeline:
+    @pytest.fixture
+    def corpus(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(6):
+                with open(os.path.join(temp_dir, f"file{i}.txt"), 'w') as f:
+                    f.write(" ".join(f"Sentence {j} of file {i}." for j in range(40)))
+            yield temp_dir
+
+    @pytest.fixture
+    def pipeline(self):
+        return IngestionPipeline(chunker=TextChunker(chunk_size=100, overlap=10, min_chunk_size=20),
+                                 num_workers=2, queue_size=2)
+
+    def test_iter_directory(self, pipeline, corpus):
+        chunks = list(pipeline.iter_directory(corpus))
+
+        assert pipeline.stats == {"documents": 6, "chunks": len(chunks)}
+        assert {chunk.metadata["file_name"] for chunk in chunks} == {f"file{i}.txt" for i in range(6)}
+
+    def test_run(self, pipeline, corpus):
+        store = RecordingStore()
+        result = pipeline.run(corpus, store)
+
+        assert result["documents"] == 6
+        assert result["added"] == len(store.chunks) > 0
+
+    def test_early_close(self, pipeline, corpus):
+        chunks = pipeline.iter_directory(corpus)
+        next(chunks)
+        chunks.close()
+
+    def test_errors_reach_consumer(self, pipeline, corpus):
+        with pytest.raises(ValueError, match="Unsupported file extension"):
+            list(pipeline.iter_chunks([os.path.join(corpus, "notes.pdf")]))
+
+    def test_process_pool_keeps_order(self, corpus):
+        files = sorted(os.path.join(corpus, name) for name in os.listdir(corpus))
+        serial = IngestionPipeline(chunker=TextChunker(chunk_size=100, overlap=10, min_chunk_size=20),
+                                   ordered=True)
+        parallel = IngestionPipeline(chunker=TextChunker(chunk_size=100, overlap=10, min_chunk_size=20),
+                                     ordered=True, num_processes=2, process_chunksize=2)
+
+        expected = [chunk.content for chunk in serial.iter_chunks(files)]
+        assert [chunk.content for chunk in parallel.iter_chunks(files)] == expected
+        assert parallel.stats == {"documents": 6, "chunks": len(expected)}
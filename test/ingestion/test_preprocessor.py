@@ -38,3 +38,18 @@ class TestPreprocessor:
         text = '“This is a test.” ‘Single quotes’'
         expected = '"This is a test." \'Single quotes\''
         assert DocumentPreprocessor.normalize_quotes(text) == expected
+
+    def test_clean_document(self):
+        text = "Page 1\nThe “entropy” of a sys-\ntem [2] is – by definition (Clausius, 1865) – additive."
+        # Whitespace is normalized first, so removed citations leave their spaces behind
+        expected = 'Page 1 The "entropy" of a system  is - by definition  - additive.'
+        assert DocumentPreprocessor.clean_document(text) == expected
+
+    def test_clean_document_steps(self):
+        text = "A  hyphen-\nated  word [1]."
+        steps = ["merge_hyphenated_words", "normalize_whitespace"]
+        assert DocumentPreprocessor.clean_document(text, steps) == "A hyphenated word [1]."
+
+    def test_clean_document_unsupported_step(self):
+        with pytest.raises(ValueError, match="Unsupported preprocessing step"):
+            DocumentPreprocessor.clean_document("text", ["remove_everything"])
@@ -0,0 +1,80 @@
+import json
+import pytest
+import numpy as np
+from src.retrieval.filters import MetadataIndex, matches_where
+
+
+METADATAS = [
+    {"file_name": "a.pdf", "chunk_index": 0},
+    {"file_name": "a.pdf", "chunk_index": 1},
+    {"file_name": "b.pdf", "chunk_index": 0, "course": "AE101"},
+    {"file_name": "c.txt", "chunk_index": 2.5},
+    {},
+]
+
+WHERES = [
+    {"file_name": "a.pdf"},
+    {"file_name": {"$ne": "a.pdf"}},
+    {"file_name": {"$in": ["b.pdf", "c.txt"]}},
+    {"file_name": {"$nin": ["b.pdf"]}},
+    {"chunk_index": {"$gt": 0}},
+    {"chunk_index": {"$gte": 1, "$lt": 3}},
+    {"chunk_index": {"$lte": 0}},
+    {"file_name": {"$gt": "a.pdf"}},
+    {"course": "AE101"},
+    {"$and": [{"file_name": "a.pdf"}, {"chunk_index": {"$gte": 1}}]},
+    {"$or": [{"course": "AE101"}, {"chunk_index": {"$gt": 2}}]},
+    {"file_name": "missing.pdf"},
+]
+
+
+class TestMatchesWhere:
+    def test_operators(self):
+        metadata = {"file_path": "a.pdf", "chunk_index": 3}
+        assert matches_where(metadata, {"file_path": "a.pdf"})
+        assert matches_where(metadata, {"chunk_index": {"$gt": 2, "$lte": 3}})
+        assert matches_where(metadata, {"$or": [{"file_path": "b.pdf"}, {"chunk_index": {"$in": [3]}}]})
+        assert matches_where(metadata, {"author": {"$ne": "x"}})
+        assert not matches_where(metadata, {"author": "x"})
+        assert not matches_where(metadata, {"file_path": {"$nin": ["a.pdf"]}})
+        with pytest.raises(ValueError, match="Unsupported where operator"):
+            matches_where(metadata, {"chunk_index": {"$near": 3}})
+
+
+class TestMetadataIndex:
+    @pytest.fixture
+    def index(self):
+        index = MetadataIndex()
+        for slot, metadata in enumerate(METADATAS):
+            index.add(slot, metadata)
+        return index
+
+    @pytest.mark.parametrize("where", WHERES)
+    def test_mask_matches_where(self, index, where):
+        expected = [matches_where(metadata, where) for metadata in METADATAS]
+        assert index.mask(where, len(METADATAS)).tolist() == expected
+
+    def test_range_after_add(self, index):
+        assert index.mask({"chunk_index": {"$gt": 1}}, 6).tolist() == [False, False, False, True, False, False]
+        index.add(5, {"chunk_index": 7})
+        assert index.mask({"chunk_index": {"$gt": 1}}, 6).tolist() == [False, False, False, True, False, True]
+
+    def test_load_and_retain(self, index):
+        keys, slots = [], []
+        for field, value, value_slots in index.items():
+            keys.append([field, value])
+            slots.append(value_slots)
+        offsets = np.concatenate([[0], np.cumsum([len(s) for s in slots])])
+
+        loaded = MetadataIndex()
+        loaded.load(json.dumps(keys).encode("utf-8"), offsets, np.concatenate(slots))
+        loaded.add(5, {"file_name": "a.pdf"})
+        assert np.flatnonzero(loaded.mask({"file_name": "a.pdf"}, 6)).tolist() == [0, 1, 5]
+
+        live = np.array([True, True, True, True, True, False])
+        loaded.retain(live)
+        assert np.flatnonzero(loaded.mask({"file_name": "a.pdf"}, 6)).tolist() == [0, 1]
+
+    def test_unsupported_operator(self, index):
+        with pytest.raises(ValueError, match="Unsupported where operator"):
+            index.mask({"chunk_index": {"$near": 3}}, len(METADATAS))
@@ -0,0 +1,31 @@
+import pytest
+import numpy as np
+from src.retrieval.fusion import weighted_fusion, reciprocal_rank_fusion
+
+
+class TestFusion:
+    def test_weighted_fusion(self):
+        ids, scores = weighted_fusion(["a", "b"], np.array([0.9, 0.5]),
+                                      ["b", "c"], np.array([4.0, 2.0]),
+                                      alpha=0.5, top_k=3)
+        assert list(ids) == ["b", "a", "c"]
+        assert scores[0] == pytest.approx(0.5 * 0.5 + 0.5 * 1.0)
+        assert scores[1] == pytest.approx(0.5 * 0.9)
+        assert scores[2] == pytest.approx(0.5 * 0.5)
+
+    def test_weighted_fusion_top_k(self):
+        ids, scores = weighted_fusion(["a", "b", "c"], np.array([0.1, 0.9, 0.5]),
+                                      [], np.array([]),
+                                      alpha=1.0, top_k=2)
+        assert list(ids) == ["b", "c"]
+
+    def test_reciprocal_rank_fusion(self):
+        ids, scores = reciprocal_rank_fusion(["a", "b", "c"], ["c", "b"], top_k=2, k=60)
+        assert list(ids) == ["c", "b"]
+        assert scores[0] == pytest.approx(0.5 / 63 + 0.5 / 61)
+        assert scores[1] == pytest.approx(0.5 / 62 + 0.5 / 62)
+
+    def test_empty_inputs(self):
+        ids, scores = reciprocal_rank_fusion([], [], top_k=5)
+        assert len(ids) == 0
+        assert len(scores) == 0
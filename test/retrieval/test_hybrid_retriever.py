@@ -1,7 +1,9 @@
 import pytest
+import asyncio
 from src.retrieval.hybrid_retriever import HybridRetriever
 from src.retrieval.vector_store import VectorStore
 from src.ingestion.embedding import EmbeddingModel
+from src.ingestion.chunker import TextChunk
 
 class TestHybridRetriever:
     @pytest.fixture
@@ -42,8 +44,65 @@ class TestHybridRetriever:
         results = hybrid_retriever.search("test document", top_k=3)
         assert len(results) == 3
 
+    def test_asearch_matches_search(self, hybrid_retriever):
+        hybrid_retriever.index_documents(
+            ["This is a test document.", "Completely unrelated content here.", "Another test."],
+            ["doc1", "doc2", "doc3"]
+        )
+        results = asyncio.run(hybrid_retriever.asearch("test document", top_k=2))
+        assert [result.id for result in results] == [result.id for result in hybrid_retriever.search("test document", top_k=2)]
+
+    def test_search_batch(self, hybrid_retriever):
+        hybrid_retriever.index_documents(
+            ["This is a test document.", "Completely unrelated content here.", "Another test."],
+            ["doc1", "doc2", "doc3"]
+        )
+        queries = ["test document", "unrelated content"]
+        batch = hybrid_retriever.search_batch(queries, top_k=2)
+        assert [[result.id for result in results] for results in batch] == \
+            [[result.id for result in hybrid_retriever.search(query, top_k=2)] for query in queries]
 
+    def test_add_and_delete_documents(self, hybrid_retriever):
+        hybrid_retriever.index_documents(["This is a test document."], ["doc1"])
+        hybrid_retriever.add_documents(["Lecture notes on entropy."], ["doc2"])
+        assert "doc2" in hybrid_retriever.doc_ids
+        assert len(hybrid_retriever.documents) == 2
+
+        hybrid_retriever.delete_documents(["doc1"])
+        assert hybrid_retriever.doc_ids == ["doc2"]
+
+    def test_search_where(self, hybrid_retriever):
+        hybrid_retriever.index_documents(
+            ["Lecture one on lift.", "Lecture two on lift and drag."],
+            ["doc1", "doc2"],
+            [{"file_name": "one.pdf"}, {"file_name": "two.pdf"}]
+        )
+        results = hybrid_retriever.search("lift", top_k=5, where={"file_name": "two.pdf"})
+        assert [result.id for result in results] == ["doc2"]
 
+    def test_rrf_search(self, hybrid_retriever):
+        hybrid_retriever.fusion = "rrf"
+        # Through the vector store, so the dense search has hits even in an empty collection
+        hybrid_retriever.vector_store.add_documents([
+            TextChunk(content="This is a test document.", metadata={"source": "rrf.txt"}),
+            TextChunk(content="Completely unrelated content here.", metadata={"source": "rrf.txt"})
+        ])
+        results = hybrid_retriever.search("test document", top_k=2)
+        assert len(results) == 2
+        assert results[0].score >= results[1].score
 
+    def test_save_index_if_changed(self, hybrid_retriever, tmp_path):
+        path = str(tmp_path / "index.kwindex")
+        assert hybrid_retriever.save_index_if_changed(path)
+        assert not hybrid_retriever.save_index_if_changed(path)
 
+        hybrid_retriever.vector_store.add_documents([
+            TextChunk(content="Lecture notes on entropy.", metadata={"source": "save.txt"})
+        ])
+        assert hybrid_retriever.save_index_if_changed(path)
+        assert hybrid_retriever.load_index(path, hybrid_retriever.vector_store.content_version())
+        assert not hybrid_retriever.save_index_if_changed(path)
 
+    def test_unsupported_fusion(self, hybrid_retriever):
+        with pytest.raises(ValueError, match="Unsupported fusion strategy"):
+            HybridRetriever(vector_store=hybrid_retriever.vector_store, fusion="max")
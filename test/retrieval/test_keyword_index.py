@@ -0,0 +1,145 @@
+import math
+import pytest
+import numpy as np
+from src.retrieval.keyword_index import KeywordIndex
+
+
+class TestKeywordIndex:
+    @pytest.fixture
+    def index(self):
+        index = KeywordIndex()
+        index.add(["doc1", "doc2", "doc3"],
+                  ["the cat sat on the mat",
+                   "the dog chased the cat",
+                   "quantum mechanics lecture notes"])
+        return index
+
+    def test_add(self, index):
+        assert len(index) == 3
+        assert "doc2" in index
+        assert index.doc_ids() == ["doc1", "doc2", "doc3"]
+
+    def test_get_scores(self, index):
+        scores = index.get_scores("cat")
+        assert scores[0] > 0
+        assert scores[1] > 0
+        assert scores[2] == 0
+
+    def test_top_n(self, index):
+        # Same term counts, but doc2 is shorter
+        slots, scores = index.top_n("the cat", 1)
+        assert len(slots) == 1
+        assert index.doc_id(slots[0]) == "doc2"
+
+        slots, scores = index.top_n("the cat", 10)
+        assert [index.doc_id(slot) for slot in slots] == ["doc2", "doc1"]
+        assert scores[0] >= scores[1] > 0
+        assert np.allclose(index.get_scores("the cat")[slots], scores)
+
+    def test_top_n_no_match(self, index):
+        slots, scores = index.top_n("thermodynamics", 5)
+        assert len(slots) == 0
+        assert len(scores) == 0
+
+    def test_top_n_batch(self, index):
+        index.delete(["doc3"])
+        queries = ["the cat", "cat cat mat", "thermodynamics", "", "quantum"]
+        for query, (slots, scores) in zip(queries, index.top_n_batch(queries, 2)):
+            expected_slots, expected_scores = index.top_n(query, 2)
+            assert np.array_equal(slots, expected_slots)
+            assert np.array_equal(scores, expected_scores)
+
+    def test_delete_updates_statistics(self, index):
+        index.delete(["doc1"])
+        assert len(index) == 2
+        assert "doc1" not in index
+        # One of the two remaining documents still contains "cat"
+        assert index.idf("cat") == pytest.approx(math.log(1 + 1.5 / 1.5))
+        assert index.get_scores("mat")[0] == 0
+        assert index.avgdl == pytest.approx((5 + 4) / 2)
+
+    def test_slots_scored_before_clear(self, index):
+        slots, _ = index.top_n("the cat", 10)
+        index.clear()
+        assert [index.doc_id(slot) for slot in slots] == [None, None]
+        assert [index.text(slot) for slot in slots] == [None, None]
+
+    def test_readding_replaces_document(self, index):
+        index.add(["doc3"], ["cat videos"])
+        assert len(index) == 3
+        assert "cat videos" in index.documents()
+        assert "quantum mechanics lecture notes" not in index.documents()
+
+    def test_save_and_load(self, index, tmp_path):
+        path = str(tmp_path / "index.kwindex")
+        index.save(path, "v1")
+
+        loaded = KeywordIndex()
+        assert loaded.load(path) == "v1"
+        assert len(loaded) == 3
+        assert sorted(loaded.doc_ids()) == ["doc1", "doc2", "doc3"]
+        assert loaded.doc_frequency("cat") == 2
+        assert loaded.avgdl == pytest.approx(index.avgdl)
+
+    def test_modify_loaded_snapshot(self, index, tmp_path):
+        path = str(tmp_path / "index.kwindex")
+        index.save(path, "v1")
+        loaded = KeywordIndex()
+        loaded.load(path)
+
+        loaded.delete(["doc2"])
+        loaded.add(["doc4"], ["a cat on a hot tin roof"])
+        assert "doc2" not in loaded
+        assert "doc4" in loaded
+        assert loaded.doc_frequency("cat") == 2
+
+        scores = loaded.get_scores("cat")
+        scored_ids = {loaded.doc_id(slot) for slot in range(len(scores)) if scores[slot] > 0}
+        assert scored_ids == {"doc1", "doc4"}
+
+    def test_top_n_where(self):
+        index = KeywordIndex()
+        index.add(["doc1", "doc2", "doc3", "doc4"],
+                  ["the cat sat on the mat",
+                   "the dog chased the cat",
+                   "a cat in lecture two",
+                   "dogs without cats"],
+                  [{"file_name": "a.pdf", "chunk_index": 0},
+                   {"file_name": "a.pdf", "chunk_index": 1},
+                   {"file_name": "b.pdf", "chunk_index": 0},
+                   {"file_name": "b.pdf", "chunk_index": 1}])
+
+        slots, scores = index.top_n("cat", 10, where={"file_name": "b.pdf"})
+        assert [index.doc_id(slot) for slot in slots] == ["doc3"]
+        # Term statistics are those of the whole index
+        full_slots, full_scores = index.top_n("cat", 10)
+        assert scores[0] == full_scores[list(full_slots).index(slots[0])]
+
+        slots, _ = index.top_n("cat", 10, where={"chunk_index": {"$gte": 1}})
+        assert [index.doc_id(slot) for slot in slots] == ["doc2"]
+
+        batch = index.top_n_batch(["cat", "the dog"], 10, where={"file_name": "a.pdf"})
+        for (batch_slots, batch_scores), query in zip(batch, ["cat", "the dog"]):
+            slots, scores = index.top_n(query, 10, where={"file_name": "a.pdf"})
+            assert np.array_equal(batch_slots, slots)
+            assert np.array_equal(batch_scores, scores)
+
+        # Documents indexed without metadata never match a filter
+        index.add(["doc5"], ["cat"])
+        slots, _ = index.top_n("cat", 10, where={"chunk_index": {"$gte": 0}})
+        assert "doc5" not in [index.doc_id(slot) for slot in slots]
+
+    def test_where_survives_save_and_delete(self, tmp_path):
+        index = KeywordIndex()
+        index.add(["doc1", "doc2", "doc3"], ["cat one", "cat two", "cat three"],
+                  [{"course": "AE101"}, {"course": "AE202"}, {"course": "AE101"}])
+        index.delete(["doc1"])
+
+        path = str(tmp_path / "index.kwindex")
+        index.save(path, "v1")
+        loaded = KeywordIndex()
+        loaded.load(path)
+        loaded.add(["doc4"], ["cat four"], [{"course": "AE101"}])
+
+        slots, _ = loaded.top_n("cat", 10, where={"course": "AE101"})
+        assert sorted(loaded.doc_id(slot) for slot in slots) == ["doc3", "doc4"]
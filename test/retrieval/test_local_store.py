@@ -0,0 +1,247 @@
+import threading
+import pytest
+import numpy as np
+from src.retrieval import local_store
+from src.retrieval.local_store import LocalBackend, LocalCollection
+from src.retrieval.filters import matches_where
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.hybrid_retriever import HybridRetriever
+from src.ingestion.chunker import TextChunk
+
+
+class WordModel:
+    """Stands in for EmbeddingModel: one dimension per known word."""
+    words = ["lift", "drag", "thrust", "weight"]
+
+    def _vector(self, text):
+        vector = np.array([text.count(word) for word in self.words], dtype=np.float32) + 0.01
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, text):
+        return self._vector(text)
+
+    def encode_batch(self, texts):
+        return np.array([self._vector(text) for text in texts], dtype=np.float32)
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestLocalCollection:
+    @pytest.fixture
+    def collection(self, tmp_path):
+        collection = LocalCollection(str(tmp_path / "coll"), "coll", metadata={"description": "test"})
+        collection.upsert(ids=["a", "b", "c"],
+                          metadatas=[{"file_path": "x", "chunk_index": 0},
+                                     {"file_path": "x", "chunk_index": 1},
+                                     {"file_path": "y", "chunk_index": 0}],
+                          documents=["doc a", "doc b", "doc c"],
+                          embeddings=[unit(1, 0), unit(1, 1), unit(0, 1)])
+        return collection
+
+    def test_query_exact(self, collection):
+        result = collection.query(query_embeddings=[unit(1, 0.1), unit(0, 1)], n_results=2)
+        assert result["ids"] == [["a", "b"], ["c", "b"]]
+        assert result["documents"][0] == ["doc a", "doc b"]
+        # Squared L2 distances of normalized vectors, as Chroma reports them
+        assert result["distances"][1][0] == pytest.approx(0.0, abs=1e-6)
+
+    def test_get_and_where(self, collection):
+        assert collection.count() == 3
+        assert collection.get(ids=["c", "a", "missing"], include=[])["ids"] == ["c", "a"]
+        assert collection.get(where={"file_path": {"$in": ["x"]}})["ids"] == ["a", "b"]
+        assert collection.get(where={"$and": [{"file_path": "x"}, {"chunk_index": {"$gte": 1}}]})["ids"] == ["b"]
+
+    def test_query_where(self, collection):
+        result = collection.query(query_embeddings=[unit(1, 0)], n_results=2, where={"file_path": "y"})
+        assert result["ids"] == [["c"]]
+
+        collection.upsert(ids=["d"], metadatas=[{"file_path": "y", "chunk_index": 1}], documents=["doc d"],
+                          embeddings=[unit(1, 0.2)])
+        result = collection.query(query_embeddings=[unit(1, 0)], n_results=2, where={"file_path": "y"})
+        assert result["ids"] == [["d", "c"]]
+        assert collection.query(query_embeddings=[unit(1, 0)], n_results=2,
+                                where={"chunk_index": {"$gt": 5}})["ids"] == [[]]
+
+    def test_get_pages(self, collection):
+        assert collection.get(include=[], limit=2)["ids"] == ["a", "b"]
+        assert collection.get(include=[], limit=2, offset=2)["ids"] == ["c"]
+        assert collection.get(where={"file_path": "x"}, include=[], offset=1)["ids"] == ["b"]
+
+    def test_upsert_replaces_and_delete(self, collection):
+        collection.upsert(ids=["a"], metadatas=[{"file_path": "z"}], documents=["new a"],
+                          embeddings=[unit(0, 1)])
+        assert collection.count() == 3
+        assert collection.get(ids=["a"])["documents"] == ["new a"]
+
+        collection.delete(where={"file_path": "x"})
+        assert collection.get(include=[])["ids"] == ["c", "a"]
+        assert collection.query(query_embeddings=[unit(1, 0)], n_results=5)["ids"] == [["c", "a"]]
+
+    def test_reopen(self, collection, tmp_path):
+        collection.delete(ids=["b"])
+        collection.modify(metadata={"revision": 2})
+
+        reopened = LocalCollection(str(tmp_path / "coll"), "coll")
+        assert reopened.id == collection.id
+        assert reopened.metadata == {"revision": 2}
+        assert reopened.get(include=[])["ids"] == ["a", "c"]
+        assert reopened.query(query_embeddings=[unit(1, 0)], n_results=1)["ids"] == [["a"]]
+
+    def test_compaction(self, tmp_path):
+        collection = LocalCollection(str(tmp_path / "coll"), "coll")
+        vectors = np.random.default_rng(0).standard_normal((2000, 8)).astype(np.float32)
+        ids = [f"id{i}" for i in range(2000)]
+        collection.upsert(ids=ids, metadatas=[{} for _ in ids], documents=ids, embeddings=vectors)
+        collection.delete(ids=ids[:1500])
+
+        assert collection.count() == 500
+        assert LocalCollection(str(tmp_path / "coll"), "coll").get(include=[])["ids"] == ids[1500:]
+        assert collection.query(query_embeddings=vectors[1700:1701], n_results=1)["ids"] == [["id1700"]]
+
+    def test_compaction_during_query(self, tmp_path, monkeypatch):
+        collection = LocalCollection(str(tmp_path / "coll"), "coll")
+        vectors = np.random.default_rng(0).standard_normal((2000, 8)).astype(np.float32)
+        ids = [f"id{i}" for i in range(2000)]
+        collection.upsert(ids=ids, metadatas=[{} for _ in ids], documents=ids, embeddings=vectors)
+
+        # Delete most rows, forcing a compaction, while the first query is being scored
+        top_k = local_store._top_k
+        calls = []
+
+        def top_k_with_delete(*args, **kwargs):
+            if not calls:
+                collection.delete(ids=ids[:1500])
+            calls.append(1)
+            return top_k(*args, **kwargs)
+
+        monkeypatch.setattr(local_store, "_top_k", top_k_with_delete)
+        result = collection.query(query_embeddings=vectors[1700:1701], n_results=3)
+
+        assert collection._state["generation"] == 1
+        assert result["ids"][0][0] == "id1700"
+        assert result["documents"][0] == result["ids"][0]
+        assert all(int(doc_id[2:]) >= 1500 for doc_id in result["ids"][0])
+
+    def test_concurrent_delete_and_query(self, tmp_path):
+        collection = LocalCollection(str(tmp_path / "coll"), "coll", block_size=256)
+        vectors = np.random.default_rng(0).standard_normal((3000, 8)).astype(np.float32)
+        ids = [f"id{i}" for i in range(3000)]
+        collection.upsert(ids=ids, metadatas=[{} for _ in ids], documents=ids, embeddings=vectors)
+
+        errors = []
+        done = threading.Event()
+
+        def query():
+            try:
+                while not done.is_set():
+                    result = collection.query(query_embeddings=vectors[2900:2901], n_results=5)
+                    assert result["ids"][0][0] == "id2900"
+                    assert result["documents"][0] == result["ids"][0]
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=query)
+        thread.start()
+        try:
+            for start in range(0, 2800, 100):
+                collection.delete(ids=ids[start:start + 100])
+        finally:
+            done.set()
+            thread.join()
+
+        assert not errors
+        assert collection._state["generation"] >= 1
+
+    def test_ivf_finds_nearest(self, tmp_path):
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((10, 16)).astype(np.float32)
+        vectors = centers[rng.integers(0, 10, 2000)] + 0.05 * rng.standard_normal((2000, 16)).astype(np.float32)
+        ids = [f"id{i}" for i in range(2000)]
+
+        collection = LocalCollection(str(tmp_path / "coll"), "coll", index="ivf", nlist=10, nprobe=2)
+        collection.upsert(ids=ids, metadatas=[{} for _ in ids], documents=ids, embeddings=vectors)
+        result = collection.query(query_embeddings=vectors[:20], n_results=1)
+
+        assert [row[0] for row in result["ids"]] == ids[:20]
+        assert collection._state["ivf_rows"] == 2000
+
+    def test_ivf_where(self, tmp_path):
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+        ids = [f"id{i}" for i in range(2000)]
+        metadatas = [{"chunk_index": i % 100} for i in range(2000)]
+
+        collection = LocalCollection(str(tmp_path / "coll"), "coll", index="ivf", nlist=10, nprobe=2)
+        collection.upsert(ids=ids, metadatas=metadatas, documents=ids, embeddings=vectors)
+        for where in ({"chunk_index": 7}, {"chunk_index": {"$lt": 90}}):
+            result = collection.query(query_embeddings=vectors[7:8], n_results=5, where=where)
+            assert result["ids"][0][0] == "id7"
+            assert all(matches_where(metadata, where) for metadata in result["metadatas"][0])
+
+    def test_unsupported_index(self, tmp_path):
+        with pytest.raises(ValueError, match="Unsupported index type"):
+            LocalCollection(str(tmp_path / "coll"), "coll", index="hnsw")
+
+
+class TestLocalVectorStore:
+    @pytest.fixture
+    def vector_store(self, tmp_path):
+        return VectorStore(persist_directory=str(tmp_path), collection_name="test_collection",
+                           embedding_model=WordModel(), backend="local")
+
+    def test_add_search_delete(self, vector_store):
+        chunks = [TextChunk(content=content, metadata={"file_path": path})
+                  for content, path in [("lift lift", "a"), ("drag", "a"), ("thrust", "b")]]
+        result = vector_store.add_documents(chunks)
+        assert result["added"] == 3
+        assert vector_store.add_documents(chunks)["skipped"] == 3
+
+        search = vector_store.search("lift", top_k=2)
+        assert search["results"][0]["content"] == "lift lift"
+        assert search["results"][0]["similarity"] == pytest.approx(1.0, abs=1e-3)
+        assert len(vector_store.get_all_documents()) == 3
+
+        assert vector_store.delete_where({"file_path": "a"}) == 2
+        assert [doc["content"] for doc in vector_store.get_all_documents()] == ["thrust"]
+
+    def test_iter_documents(self, vector_store):
+        chunks = [TextChunk(content=content, metadata={"file_path": "a"})
+                  for content in ["lift", "drag", "thrust", "weight", "lift drag"]]
+        vector_store.add_documents(chunks)
+
+        documents = list(vector_store.iter_documents(page_size=2))
+        assert documents == vector_store.get_all_documents()
+        assert [doc["content"] for doc in documents] == ["lift", "drag", "thrust", "weight", "lift drag"]
+
+        contents = list(vector_store.iter_documents(page_size=2, fields=("content",), where={"file_path": "a"}))
+        assert contents[0].keys() == {"id", "content"}
+        assert len(contents) == 5
+
+        with pytest.raises(ValueError, match="Unsupported document fields"):
+            vector_store.iter_documents(fields=("embedding",))
+
+    def test_load_or_build_index(self, vector_store, tmp_path):
+        vector_store.add_documents([TextChunk(content=f"lift {i}", metadata={"chunk_index": i}) for i in range(5)])
+        path = str(tmp_path / "keyword.kwindex")
+
+        retriever = HybridRetriever(vector_store)
+        retriever.load_or_build_index(path, page_size=2)
+        assert sorted(retriever.doc_ids) == sorted(vector_store.get_ids())
+        slots, _ = retriever.keyword_index.top_n("lift", 10, where={"chunk_index": {"$gte": 3}})
+        assert len(slots) == 2
+
+        reloaded = HybridRetriever(vector_store)
+        assert reloaded.load_index(path, vector_store.content_version())
+
+    def test_reset(self, vector_store):
+        version = vector_store.content_version()
+        vector_store._reset_collection()
+        assert vector_store.content_version() != version
+        assert isinstance(vector_store.backend, LocalBackend)
+
+    def test_unsupported_backend(self, tmp_path):
+        with pytest.raises(ValueError, match="Unsupported vector store backend"):
+            VectorStore(persist_directory=str(tmp_path), backend="faiss")
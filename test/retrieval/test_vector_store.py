@@ -48,4 +48,26 @@ class TestVectorStore:
             assert "metadata" in result
             assert "score" in result
 
+    def test_search_batch(self, vector_store):
+        queries = ["test chunk", "", "another chunk"]
+        searches = vector_store.search_batch(queries, top_k=2)
 
+        assert [search["query"] for search in searches] == queries
+        assert searches[1]["results"] == []
+        assert [result["id"] for result in searches[0]["results"]] == \
+            [result["id"] for result in vector_store.search("test chunk", top_k=2)["results"]]
+
+    def test_search_where(self, vector_store):
+        search = vector_store.search("test chunk", top_k=5, where={"source": "test.txt"})
+        for result in search["results"]:
+            assert result["metadata"]["source"] == "test.txt"
+
+        search = vector_store.search("test chunk", top_k=5, where={"source": "missing"})
+        assert search["results"] == []
+
+    def test_iter_documents(self, vector_store):
+        documents = list(vector_store.iter_documents(page_size=1))
+        assert [doc["id"] for doc in documents] == [doc["id"] for doc in vector_store.get_all_documents()]
+
+        for doc in vector_store.iter_documents(page_size=1, fields=("content",)):
+            assert doc.keys() == {"id", "content"}